@@ -0,0 +1,3 @@
+# Tests import plugin modules from the plugin root, the same way main.py
+# resolves them at runtime. Keeping this conftest here puts the root on
+# sys.path under pytest's default import mode.
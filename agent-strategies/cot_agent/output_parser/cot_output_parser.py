@@ -1,72 +1,340 @@
 import json
 import re
 from collections.abc import Generator
-from typing import Union
+from typing import Optional, Union
 
 from dify_plugin.entities.model.llm import LLMResultChunk
 from dify_plugin.interfaces.agent import AgentScratchpadUnit
 
 
+def parse_action(json_str: str) -> Union[str, AgentScratchpadUnit.Action]:
+    try:
+        action = json.loads(json_str, strict=False)
+        action_name = None
+        action_input = None
+
+        # cohere always returns a list
+        if isinstance(action, list) and len(action) == 1:
+            action = action[0]
+
+        for key, value in action.items():
+            if "input" in key.lower():
+                action_input = value
+            else:
+                action_name = value
+
+        if action_name is not None and action_input is not None:
+            return AgentScratchpadUnit.Action(
+                action_name=action_name,
+                action_input=action_input,
+            )
+        else:
+            return json_str or ""
+    except Exception:
+        return json_str or ""
+
+
+def extra_json_from_code_block(
+    code_block: str,
+) -> Generator[Union[str, AgentScratchpadUnit.Action], None, None]:
+    code_blocks = re.findall(r"```(.*?)```", code_block, re.DOTALL)
+    if not code_blocks:
+        return
+    for block in code_blocks:
+        json_text = re.sub(r"^[a-zA-Z]+\n", "", block.strip(), flags=re.MULTILINE)
+        yield parse_action(json_text)
+
+
+class ReActStreamParser:
+    """
+    Chunk-level state machine for ReAct output.
+
+    Runs of characters that cannot change the parser state (plain text, the
+    body of a code block, the body of a JSON object) are located with a single
+    regex/str.find scan and consumed as one slice. Only the characters that
+    may start or finish a marker (`Action:`, `Thought:`, code fences, braces)
+    go through the per-character transition in `_step`, which mirrors the
+    original character parser exactly. Text produced while feeding one chunk
+    is coalesced into a single span.
+    """
+
+    ACTION_STR = "action:"
+    THOUGHT_STR = "thought:"
+    MARKER_BOUNDARIES = {"\n", " ", ""}
+
+    # plain text stops at fences, braces and a possible `action:`/`thought:`
+    # start, i.e. an a/t right after a space or newline
+    _PLAIN_STOP = re.compile(r"[`{}]|(?<=[ \n])[aAtT]")
+    _JSON_STOP = re.compile(r"[`{}]")
+
+    def __init__(self) -> None:
+        self.code_block_cache = ""
+        self.code_block_delimiter_count = 0
+        self.in_code_block = False
+        self.json_cache = ""
+        self.json_quote_count = 0
+        self.in_json = False
+        self.got_json = False
+
+        self.action_cache = ""
+        self.action_idx = 0
+
+        self.thought_cache = ""
+        self.thought_idx = 0
+
+        self.last_character = ""
+
+        self._outputs: list[Union[str, AgentScratchpadUnit.Action]] = []
+        self._text: list[str] = []
+
+    def feed(self, content: str) -> list[Union[str, AgentScratchpadUnit.Action]]:
+        """
+        Consume one delta and return the spans and actions it completed.
+        """
+        index = 0
+        length = len(content)
+        while index < length:
+            if self.in_code_block:
+                end = content.find("`", index)
+                if end == -1:
+                    end = length
+                if end > index:
+                    self.code_block_cache += content[index:end]
+                    self.code_block_delimiter_count = 0
+                    self.last_character = content[end - 1]
+                    index = end
+                    continue
+            elif (
+                self.code_block_delimiter_count == 0
+                and not self.got_json
+                and not self.in_json
+                and self.action_idx == 0
+                and self.thought_idx == 0
+            ):
+                char = content[index]
+                if not self._is_plain_stop(char):
+                    match = self._PLAIN_STOP.search(content, index + 1)
+                    end = match.start() if match else length
+                    self._emit(content[index:end])
+                    self.last_character = content[end - 1]
+                    index = end
+                    continue
+                if char in "aAtT":
+                    end = self._scan_marker(content, index)
+                    if end is not None:
+                        index = end
+                        continue
+            elif (
+                self.in_json
+                and self.code_block_delimiter_count == 0
+                and not self.got_json
+                and content[index] not in "`{}"
+            ):
+                match = self._JSON_STOP.search(content, index + 1)
+                end = match.start() if match else length
+                self.json_cache += content[index:end]
+                self.last_character = content[end - 1]
+                index = end
+                continue
+
+            self._step(content[index])
+            index += 1
+
+        return self._drain()
+
+    def close(self) -> list[Union[str, AgentScratchpadUnit.Action]]:
+        """
+        Flush whatever is still buffered once the stream has ended.
+        """
+        if self.code_block_cache:
+            self._emit(self.code_block_cache)
+
+        if self.json_cache:
+            self._emit(parse_action(self.json_cache))
+
+        return self._drain()
+
+    def _is_plain_stop(self, char: str) -> bool:
+        if char in "`{}":
+            return True
+        return char in "aAtT" and self.last_character in self.MARKER_BOUNDARIES
+
+    def _scan_marker(self, content: str, index: int) -> Optional[int]:
+        """
+        Resolve an `action:`/`thought:` candidate starting at `index` in one go.
+
+        Returns the index after the consumed slice, or None when the candidate
+        runs past the end of the chunk or breaks off on a fence or brace and
+        has to go through `_step`.
+        """
+        marker = self.ACTION_STR if content[index] in "aA" else self.THOUGHT_STR
+        for offset, expected in enumerate(marker):
+            position = index + offset
+            if position >= len(content):
+                return None
+            char = content[position]
+            if char.lower() != expected:
+                if char in "`{}":
+                    return None
+                # a broken marker is flushed back as plain text
+                self._emit(content[index : position + 1])
+                self.last_character = char
+                return position + 1
+
+        self.last_character = marker[-1]
+        return index + len(marker)
+
+    def _emit(self, item: Union[str, AgentScratchpadUnit.Action]) -> None:
+        if isinstance(item, str):
+            if item:
+                self._text.append(item)
+            return
+        if self._text:
+            self._outputs.append("".join(self._text))
+            self._text = []
+        self._outputs.append(item)
+
+    def _drain(self) -> list[Union[str, AgentScratchpadUnit.Action]]:
+        if self._text:
+            self._outputs.append("".join(self._text))
+            self._text = []
+        outputs, self._outputs = self._outputs, []
+        return outputs
+
+    def _step(self, delta: str) -> None:
+        yield_delta = False
+
+        if delta == "`":
+            self.last_character = delta
+            self.code_block_cache += delta
+            self.code_block_delimiter_count += 1
+        else:
+            if not self.in_code_block:
+                if self.code_block_delimiter_count > 0:
+                    self.last_character = delta
+                    self._emit(self.code_block_cache)
+                self.code_block_cache = ""
+            else:
+                self.last_character = delta
+                self.code_block_cache += delta
+            self.code_block_delimiter_count = 0
+
+        if not self.in_code_block and not self.in_json:
+            action_str = self.ACTION_STR
+            if delta.lower() == action_str[self.action_idx] and self.action_idx == 0:
+                if self.last_character not in self.MARKER_BOUNDARIES:
+                    yield_delta = True
+                else:
+                    self.last_character = delta
+                    self.action_cache += delta
+                    self.action_idx += 1
+                    if self.action_idx == len(action_str):
+                        self.action_cache = ""
+                        self.action_idx = 0
+                    return
+            elif delta.lower() == action_str[self.action_idx] and self.action_idx > 0:
+                self.last_character = delta
+                self.action_cache += delta
+                self.action_idx += 1
+                if self.action_idx == len(action_str):
+                    self.action_cache = ""
+                    self.action_idx = 0
+                return
+            else:
+                if self.action_cache:
+                    self.last_character = delta
+                    self._emit(self.action_cache)
+                    self.action_cache = ""
+                    self.action_idx = 0
+
+            thought_str = self.THOUGHT_STR
+            if (
+                delta.lower() == thought_str[self.thought_idx]
+                and self.thought_idx == 0
+            ):
+                if self.last_character not in self.MARKER_BOUNDARIES:
+                    yield_delta = True
+                else:
+                    self.last_character = delta
+                    self.thought_cache += delta
+                    self.thought_idx += 1
+                    if self.thought_idx == len(thought_str):
+                        self.thought_cache = ""
+                        self.thought_idx = 0
+                    return
+            elif (
+                delta.lower() == thought_str[self.thought_idx]
+                and self.thought_idx > 0
+            ):
+                self.last_character = delta
+                self.thought_cache += delta
+                self.thought_idx += 1
+                if self.thought_idx == len(thought_str):
+                    self.thought_cache = ""
+                    self.thought_idx = 0
+                return
+            else:
+                if self.thought_cache:
+                    self.last_character = delta
+                    self._emit(self.thought_cache)
+                    self.thought_cache = ""
+                    self.thought_idx = 0
+
+            if yield_delta:
+                self.last_character = delta
+                self._emit(delta)
+                return
+
+        if self.code_block_delimiter_count == 3:
+            if self.in_code_block:
+                self.last_character = delta
+                for item in extra_json_from_code_block(self.code_block_cache):
+                    self._emit(item)
+                self.code_block_cache = ""
+
+            self.in_code_block = not self.in_code_block
+            self.code_block_delimiter_count = 0
+
+        if not self.in_code_block:
+            # handle single json
+            if delta == "{":
+                self.json_quote_count += 1
+                self.in_json = True
+                self.last_character = delta
+                self.json_cache += delta
+            elif delta == "}":
+                self.last_character = delta
+                self.json_cache += delta
+                if self.json_quote_count > 0:
+                    self.json_quote_count -= 1
+                    if self.json_quote_count == 0:
+                        self.in_json = False
+                        self.got_json = True
+                        return
+            else:
+                if self.in_json:
+                    self.last_character = delta
+                    self.json_cache += delta
+
+            if self.got_json:
+                self.got_json = False
+                self.last_character = delta
+                self._emit(parse_action(self.json_cache))
+                self.json_cache = ""
+                self.json_quote_count = 0
+                self.in_json = False
+
+        if not self.in_code_block and not self.in_json:
+            self.last_character = delta
+            self._emit(delta.replace("`", ""))
+
+
 class CotAgentOutputParser:
     @classmethod
     def handle_react_stream_output(
         cls, llm_response: Generator[LLMResultChunk, None, None], usage_dict: dict
     ) -> Generator[Union[str, AgentScratchpadUnit.Action], None, None]:
-        def parse_action(json_str):
-            try:
-                action = json.loads(json_str, strict=False)
-                action_name = None
-                action_input = None
-
-                # cohere always returns a list
-                if isinstance(action, list) and len(action) == 1:
-                    action = action[0]
-
-                for key, value in action.items():
-                    if "input" in key.lower():
-                        action_input = value
-                    else:
-                        action_name = value
-
-                if action_name is not None and action_input is not None:
-                    return AgentScratchpadUnit.Action(
-                        action_name=action_name,
-                        action_input=action_input,
-                    )
-                else:
-                    return json_str or ""
-            except Exception:
-                return json_str or ""
-
-        def extra_json_from_code_block(
-            code_block,
-        ) -> Generator[Union[str, AgentScratchpadUnit.Action], None, None]:
-            code_blocks = re.findall(r"```(.*?)```", code_block, re.DOTALL)
-            if not code_blocks:
-                return
-            for block in code_blocks:
-                json_text = re.sub(
-                    r"^[a-zA-Z]+\n", "", block.strip(), flags=re.MULTILINE
-                )
-                yield parse_action(json_text)
-
-        code_block_cache = ""
-        code_block_delimiter_count = 0
-        in_code_block = False
-        json_cache = ""
-        json_quote_count = 0
-        in_json = False
-        got_json = False
-
-        action_cache = ""
-        action_str = "action:"
-        action_idx = 0
-
-        thought_cache = ""
-        thought_str = "thought:"
-        thought_idx = 0
-
-        last_character = ""
+        parser = ReActStreamParser()
 
         for response in llm_response:
             if response.delta.usage:
@@ -75,138 +343,6 @@ class CotAgentOutputParser:
             if not isinstance(response_content, str):
                 continue
 
-            # stream
-            index = 0
-            while index < len(response_content):
-                steps = 1
-                delta = response_content[index : index + steps]
-                yield_delta = False
-
-                if delta == "`":
-                    last_character = delta
-                    code_block_cache += delta
-                    code_block_delimiter_count += 1
-                else:
-                    if not in_code_block:
-                        if code_block_delimiter_count > 0:
-                            last_character = delta
-                            yield code_block_cache
-                        code_block_cache = ""
-                    else:
-                        last_character = delta
-                        code_block_cache += delta
-                    code_block_delimiter_count = 0
-
-                if not in_code_block and not in_json:
-                    if delta.lower() == action_str[action_idx] and action_idx == 0:
-                        if last_character not in {"\n", " ", ""}:
-                            yield_delta = True
-                        else:
-                            last_character = delta
-                            action_cache += delta
-                            action_idx += 1
-                            if action_idx == len(action_str):
-                                action_cache = ""
-                                action_idx = 0
-                            index += steps
-                            continue
-                    elif delta.lower() == action_str[action_idx] and action_idx > 0:
-                        last_character = delta
-                        action_cache += delta
-                        action_idx += 1
-                        if action_idx == len(action_str):
-                            action_cache = ""
-                            action_idx = 0
-                        index += steps
-                        continue
-                    else:
-                        if action_cache:
-                            last_character = delta
-                            yield action_cache
-                            action_cache = ""
-                            action_idx = 0
-
-                    if delta.lower() == thought_str[thought_idx] and thought_idx == 0:
-                        if last_character not in {"\n", " ", ""}:
-                            yield_delta = True
-                        else:
-                            last_character = delta
-                            thought_cache += delta
-                            thought_idx += 1
-                            if thought_idx == len(thought_str):
-                                thought_cache = ""
-                                thought_idx = 0
-                            index += steps
-                            continue
-                    elif delta.lower() == thought_str[thought_idx] and thought_idx > 0:
-                        last_character = delta
-                        thought_cache += delta
-                        thought_idx += 1
-                        if thought_idx == len(thought_str):
-                            thought_cache = ""
-                            thought_idx = 0
-                        index += steps
-                        continue
-                    else:
-                        if thought_cache:
-                            last_character = delta
-                            yield thought_cache
-                            thought_cache = ""
-                            thought_idx = 0
-
-                    if yield_delta:
-                        index += steps
-                        last_character = delta
-                        yield delta
-                        continue
+            yield from parser.feed(response_content)
 
-                if code_block_delimiter_count == 3:
-                    if in_code_block:
-                        last_character = delta
-                        yield from extra_json_from_code_block(code_block_cache)
-                        code_block_cache = ""
-
-                    in_code_block = not in_code_block
-                    code_block_delimiter_count = 0
-
-                if not in_code_block:
-                    # handle single json
-                    if delta == "{":
-                        json_quote_count += 1
-                        in_json = True
-                        last_character = delta
-                        json_cache += delta
-                    elif delta == "}":
-                        last_character = delta
-                        json_cache += delta
-                        if json_quote_count > 0:
-                            json_quote_count -= 1
-                            if json_quote_count == 0:
-                                in_json = False
-                                got_json = True
-                                index += steps
-                                continue
-                    else:
-                        if in_json:
-                            last_character = delta
-                            json_cache += delta
-
-                    if got_json:
-                        got_json = False
-                        last_character = delta
-                        yield parse_action(json_cache)
-                        json_cache = ""
-                        json_quote_count = 0
-                        in_json = False
-
-                if not in_code_block and not in_json:
-                    last_character = delta
-                    yield delta.replace("`", "")
-
-                index += steps
-
-        if code_block_cache:
-            yield code_block_cache
-
-        if json_cache:
-            yield parse_action(json_cache)
+        yield from parser.close()
@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from output_parser.cot_output_parser import CotAgentOutputParser, ReActStreamParser
+from dify_plugin.interfaces.agent import AgentScratchpadUnit
+
+# recorded with the previous character-by-character parser
+CORPUS_PATH = Path(__file__).parent / "testdata" / "react_stream_corpus.jsonl"
+
+
+def _llm_response(chunks: list[str]):
+    for chunk in chunks:
+        yield SimpleNamespace(
+            delta=SimpleNamespace(usage=None, message=SimpleNamespace(content=chunk))
+        )
+
+
+def _normalize(items) -> list:
+    """
+    Merge adjacent text spans, the chunk granularity is not part of the contract.
+    """
+    normalized: list = []
+    for item in items:
+        if isinstance(item, AgentScratchpadUnit.Action):
+            normalized.append(
+                {"action_name": item.action_name, "action_input": item.action_input}
+            )
+        elif normalized and isinstance(normalized[-1], str):
+            normalized[-1] += item
+        elif item:
+            normalized.append(item)
+    return normalized
+
+
+def _load_corpus() -> list[dict]:
+    with CORPUS_PATH.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("case", _load_corpus())
+def test_matches_recorded_corpus(case):
+    outputs = CotAgentOutputParser.handle_react_stream_output(
+        _llm_response(case["chunks"]), {}
+    )
+    assert _normalize(outputs) == case["expected"]
+
+
+def test_coalesces_text_per_chunk():
+    parser = ReActStreamParser()
+    assert parser.feed("Thought: a plain sentence about tools.") == [
+        " a plain sentence about tools."
+    ]
+    assert parser.close() == []
+
+
+def test_usage_is_recorded():
+    usage = object()
+    response = SimpleNamespace(
+        delta=SimpleNamespace(usage=usage, message=SimpleNamespace(content="hi"))
+    )
+    usage_dict: dict = {}
+    assert list(
+        CotAgentOutputParser.handle_react_stream_output(iter([response]), usage_dict)
+    ) == ["hi"]
+    assert usage_dict["usage"] is usage
+
+
+def test_large_transcript_is_parsed_per_chunk():
+    thought = (
+        "Thought: the user asked about the quarterly report, so I should first "
+        "collect the totals and then explain the trend in a short answer.\n"
+    )
+    action = (
+        'Action:\n```json\n{"action": "search", "action_input": {"q": "report"}}\n```\n'
+    )
+    transcript = (thought * 20 + action) * 1600
+    assert len(transcript) > 4 * 1024 * 1024
+    chunks = [transcript[i : i + 24] for i in range(0, len(transcript), 24)]
+
+    outputs = list(
+        CotAgentOutputParser.handle_react_stream_output(_llm_response(chunks), {})
+    )
+
+    cycle_text = thought[len("Thought:") :] * 20 + "\n"
+    action_output = {"action_name": "search", "action_input": {"q": "report"}}
+    assert _normalize(outputs) == (
+        [cycle_text, action_output]
+        + ["\n" + cycle_text, action_output] * 1599
+        + ["\n"]
+    )
+    # at most one text span per chunk, the previous parser yielded every character
+    assert len(outputs) <= len(chunks) + 1600
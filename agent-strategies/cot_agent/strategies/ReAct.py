@@ -1,6 +1,7 @@
 import json
 import time
 from collections.abc import Generator, Mapping
+from copy import deepcopy
 from typing import Any, Optional, cast
 
 import pydantic
@@ -9,6 +10,7 @@ from dify_plugin.entities.model.llm import LLMModelConfig, LLMUsage
 from dify_plugin.entities.model.message import (
     AssistantPromptMessage,
     PromptMessage,
+    PromptMessageTool,
     SystemPromptMessage,
     UserPromptMessage,
 )
@@ -71,12 +73,35 @@ class ReActAgentStrategy(AgentStrategy):
     history_prompt_messages: list[PromptMessage] = Field(default_factory=list)
     prompt_messages_tools: list[ToolEntity] = Field(default_factory=list)
 
+    # memoized system prompt, dropped whenever the tool schemas change
+    _system_prompt_cache: Optional[SystemPromptMessage] = None
+    _prompt_tools: list[PromptMessageTool] = []
+
+    # append-only rendering of the agent scratchpad
+    _scratchpad_text: str = ""
+    _scratchpad_units_rendered: int = 0
+    _scratchpad_source: Optional[list[AgentScratchpadUnit]] = None
+
     @property
     def _user_prompt_message(self) -> UserPromptMessage:
         return UserPromptMessage(content=self.query)
 
+    @property
+    def _prompt_messages_tools(self) -> list[PromptMessageTool]:
+        return self._prompt_tools
+
+    @_prompt_messages_tools.setter
+    def _prompt_messages_tools(self, tools: list[PromptMessageTool]) -> None:
+        self._prompt_tools = tools
+        self._system_prompt_cache = None
+
     @property
     def _system_prompt_message(self) -> SystemPromptMessage:
+        if self._system_prompt_cache is None:
+            self._system_prompt_cache = self._build_system_prompt_message()
+        return self._system_prompt_cache
+
+    def _build_system_prompt_message(self) -> SystemPromptMessage:
         prompt_entity = AgentPromptEntity(
             first_prompt=REACT_PROMPT_TEMPLATES["english"]["chat"]["prompt"],
             next_iteration=REACT_PROMPT_TEMPLATES["english"]["chat"][
@@ -106,6 +131,19 @@ class ReActAgentStrategy(AgentStrategy):
 
         return SystemPromptMessage(content=system_prompt)
 
+    def update_prompt_message_tool(
+        self, tool: ToolEntity, prompt_tool: PromptMessageTool
+    ) -> PromptMessageTool:
+        """
+        update prompt message tool, invalidating the system prompt only if
+        the tool schema actually changed
+        """
+        parameters = deepcopy(prompt_tool.parameters)
+        prompt_tool = super().update_prompt_message_tool(tool, prompt_tool)
+        if prompt_tool.parameters != parameters:
+            self._system_prompt_cache = None
+        return prompt_tool
+
     def _invoke(self, parameters: dict[str, Any]) -> Generator[AgentInvokeMessage]:
         try:
             react_params = ReActParams(**parameters)
@@ -115,6 +153,10 @@ class ReActAgentStrategy(AgentStrategy):
         # Init parameters
         self.query = react_params.query
         self.instruction = react_params.instruction
+        self._system_prompt_cache = None
+        self._scratchpad_text = ""
+        self._scratchpad_units_rendered = 0
+        self._scratchpad_source = None
         agent_scratchpad: list[AgentScratchpadUnit] = []
         iteration_step = 1
         max_iteration_steps = react_params.maximum_iterations
@@ -208,20 +250,23 @@ class ReActAgentStrategy(AgentStrategy):
             )
             yield model_log
 
+            # collect spans and join once, the parser already coalesces text
+            agent_response_parts: list[str] = []
+            thought_parts: list[str] = []
             for chunk in react_chunks:
                 if isinstance(chunk, AgentScratchpadUnit.Action):
                     action = chunk
                     # detect action
-                    assert scratchpad.agent_response is not None
-                    scratchpad.agent_response += json.dumps(chunk.model_dump())
+                    action_str = json.dumps(chunk.model_dump())
+                    agent_response_parts.append(action_str)
 
-                    scratchpad.action_str = json.dumps(chunk.model_dump())
+                    scratchpad.action_str = action_str
                     scratchpad.action = action
                 else:
-                    scratchpad.agent_response = scratchpad.agent_response or ""
-                    scratchpad.thought = scratchpad.thought or ""
-                    scratchpad.agent_response += chunk
-                    scratchpad.thought += chunk
+                    agent_response_parts.append(chunk)
+                    thought_parts.append(chunk)
+            scratchpad.agent_response = "".join(agent_response_parts)
+            scratchpad.thought = "".join(thought_parts)
             scratchpad.thought = (
                 scratchpad.thought.strip()
                 if scratchpad.thought
@@ -428,26 +473,12 @@ class ReActAgentStrategy(AgentStrategy):
         system_message = self._system_prompt_message
 
         # organize current assistant messages
-        agent_scratchpad = agent_scratchpad
         if not agent_scratchpad:
             assistant_messages = []
         else:
-            assistant_message = AssistantPromptMessage(content="")
-            for unit in agent_scratchpad:
-                if unit.is_final():
-                    assert isinstance(assistant_message.content, str)
-                    assistant_message.content += f"Final Answer: {unit.agent_response}"
-                else:
-                    assert isinstance(assistant_message.content, str)
-                    assistant_message.content += f"Thought: {unit.thought}\n\n"
-                    if unit.action_str:
-                        assistant_message.content += f"Action: {unit.action_str}\n\n"
-                    if unit.observation:
-                        assistant_message.content += (
-                            f"Observation: {unit.observation}\n\n"
-                        )
-
-            assistant_messages = [assistant_message]
+            assistant_messages = [
+                AssistantPromptMessage(content=self._render_scratchpad(agent_scratchpad))
+            ]
 
         # query messages
         query_messages = self._organize_user_query(query, [])
@@ -566,21 +597,48 @@ class ReActAgentStrategy(AgentStrategy):
             action_name=action["action"], action_input=action["action_input"]
         )
 
+    def _render_scratchpad(self, agent_scratchpad: list[AgentScratchpadUnit]) -> str:
+        """
+        Render the scratchpad, formatting only the units added since the
+        previous round. Units are complete once a round ends and are only ever
+        appended to the same list, so the rendered prefix never changes.
+        """
+        if (
+            agent_scratchpad is not self._scratchpad_source
+            or len(agent_scratchpad) < self._scratchpad_units_rendered
+        ):
+            # a different or truncated scratchpad, start over
+            self._scratchpad_source = agent_scratchpad
+            self._scratchpad_text = ""
+            self._scratchpad_units_rendered = 0
+
+        new_units = agent_scratchpad[self._scratchpad_units_rendered :]
+        if new_units:
+            self._scratchpad_text = "".join(
+                [self._scratchpad_text]
+                + [self._format_scratchpad_unit(unit) for unit in new_units]
+            )
+            self._scratchpad_units_rendered = len(agent_scratchpad)
+
+        return self._scratchpad_text
+
+    def _format_scratchpad_unit(self, scratchpad: AgentScratchpadUnit) -> str:
+        if scratchpad.is_final():
+            return f"Final Answer: {scratchpad.agent_response}"
+
+        message = f"Thought: {scratchpad.thought}\n\n"
+        if scratchpad.action_str:
+            message += f"Action: {scratchpad.action_str}\n\n"
+        if scratchpad.observation:
+            message += f"Observation: {scratchpad.observation}\n\n"
+        return message
+
     def _format_assistant_message(
         self, agent_scratchpad: list[AgentScratchpadUnit]
     ) -> str:
         """
         format assistant message
         """
-        message = ""
-        for scratchpad in agent_scratchpad:
-            if scratchpad.is_final():
-                message += f"Final Answer: {scratchpad.agent_response}"
-            else:
-                message += f"Thought: {scratchpad.thought}\n\n"
-                if scratchpad.action_str:
-                    message += f"Action: {scratchpad.action_str}\n\n"
-                if scratchpad.observation:
-                    message += f"Observation: {scratchpad.observation}\n\n"
-
-        return message
+        return "".join(
+            self._format_scratchpad_unit(scratchpad) for scratchpad in agent_scratchpad
+        )
@@ -1,7 +1,12 @@
 import json
+import os
+import threading
 import time
 from collections.abc import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from copy import deepcopy
+from enum import Enum
 from typing import Any, Optional, cast
 
 from dify_plugin.entities.agent import AgentInvokeMessage
@@ -39,6 +44,18 @@ class LogMetadata:
     CURRENCY = "currency"
     TOTAL_TOKENS = "total_tokens"
 
+# upper bound of tool calls running at the same time in parallel mode
+MAX_PARALLEL_TOOL_CALLS = 8
+# upper bound of concurrent calls to one tool, e.g. a rate limited search API
+MAX_PARALLEL_CALLS_PER_TOOL = 2
+DEFAULT_TOOL_CALL_TIMEOUT = 60
+
+
+class ToolExecutionMode(str, Enum):
+    SEQUENTIAL = "sequential"
+    PARALLEL = "parallel"
+
+
 class ContextItem(BaseModel):
     content: str
     title: str
@@ -52,6 +69,8 @@ class FunctionCallingParams(BaseModel):
     tools: list[ToolEntity] | None
     maximum_iterations: int = 3
     context: list[ContextItem] | None = None
+    tool_execution_mode: ToolExecutionMode | None = ToolExecutionMode.SEQUENTIAL
+    tool_call_timeout: float | None = DEFAULT_TOOL_CALL_TIMEOUT
 
 
 class FunctionCallingAgentStrategy(AgentStrategy):
@@ -269,8 +288,27 @@ class FunctionCallingAgentStrategy(AgentStrategy):
             final_answer += response + "\n"
 
             # call tools
-            tool_responses = []
-            for tool_call_id, tool_call_name, tool_call_args in tool_calls:
+            if (
+                fc_params.tool_execution_mode == ToolExecutionMode.PARALLEL
+                and len(tool_calls) > 1
+            ):
+                tool_responses = yield from self._execute_tool_calls_concurrently(
+                    tool_calls=tool_calls,
+                    tool_instances=tool_instances,
+                    round_log=round_log,
+                    timeout=fc_params.tool_call_timeout or DEFAULT_TOOL_CALL_TIMEOUT,
+                )
+            else:
+                tool_responses = yield from self._execute_tool_calls(
+                    tool_calls=tool_calls,
+                    tool_instances=tool_instances,
+                    round_log=round_log,
+                )
+
+            # results go back to the prompt in the order the model issued the calls
+            for (tool_call_id, tool_call_name, tool_call_args), tool_response in zip(
+                tool_calls, tool_responses
+            ):
                 current_thoughts.append(
                     AssistantPromptMessage(
                         content="",
@@ -288,152 +326,6 @@ class FunctionCallingAgentStrategy(AgentStrategy):
                         ],
                     )
                 )
-                tool_instance = tool_instances[tool_call_name]
-                tool_call_started_at = time.perf_counter()
-                tool_call_log = self.create_log_message(
-                    label=f"CALL {tool_call_name}",
-                    data={},
-                    metadata={
-                        LogMetadata.STARTED_AT: time.perf_counter(),
-                        LogMetadata.PROVIDER: tool_instance.identity.provider,
-                    },
-                    parent=round_log,
-                    status=ToolInvokeMessage.LogMessage.LogStatus.START,
-                )
-                yield tool_call_log
-                if not tool_instance:
-                    tool_response = {
-                        "tool_call_id": tool_call_id,
-                        "tool_call_name": tool_call_name,
-                        "tool_response": f"there is not a tool named {tool_call_name}",
-                        "meta": ToolInvokeMeta.error_instance(
-                            f"there is not a tool named {tool_call_name}"
-                        ).to_dict(),
-                    }
-                else:
-                    # invoke tool
-                    try:
-                        tool_invoke_responses = self.session.tool.invoke(
-                            provider_type=ToolProviderType(tool_instance.provider_type),
-                            provider=tool_instance.identity.provider,
-                            tool_name=tool_instance.identity.name,
-                            parameters={
-                                **tool_instance.runtime_parameters,
-                                **tool_call_args,
-                            },
-                        )
-                        tool_result = ""
-                        for tool_invoke_response in tool_invoke_responses:
-                            if (
-                                tool_invoke_response.type
-                                == ToolInvokeMessage.MessageType.TEXT
-                            ):
-                                tool_result += cast(
-                                    ToolInvokeMessage.TextMessage,
-                                    tool_invoke_response.message,
-                                ).text
-                            elif (
-                                tool_invoke_response.type
-                                == ToolInvokeMessage.MessageType.LINK
-                            ):
-                                tool_result += (
-                                    "result link: "
-                                    + cast(
-                                        ToolInvokeMessage.TextMessage,
-                                        tool_invoke_response.message,
-                                    ).text
-                                    + "."
-                                    + " please tell user to check it."
-                                )
-                            elif tool_invoke_response.type in {
-                                ToolInvokeMessage.MessageType.IMAGE_LINK,
-                                ToolInvokeMessage.MessageType.IMAGE,
-                            }:
-                                # Extract the file path or URL from the message
-                                if hasattr(tool_invoke_response.message, "text"):
-                                    file_info = cast(
-                                        ToolInvokeMessage.TextMessage,
-                                        tool_invoke_response.message,
-                                    ).text
-                                    # Try to create a blob message with the file content
-                                    try:
-                                        # If it's a local file path, try to read it
-                                        if file_info.startswith("/files/"):
-                                            import os
-
-                                            if os.path.exists(file_info):
-                                                with open(file_info, "rb") as f:
-                                                    file_content = f.read()
-                                                # Create a blob message with the file content
-                                                blob_response = self.create_blob_message(
-                                                    blob=file_content,
-                                                    meta={
-                                                        "mime_type": "image/png",
-                                                        "filename": os.path.basename(
-                                                            file_info
-                                                        ),
-                                                    },
-                                                )
-                                                yield blob_response
-                                    except Exception as e:
-                                        yield self.create_text_message(
-                                            f"Failed to create blob message: {e}"
-                                        )
-                                tool_result += (
-                                    "image has been created and sent to user already, "
-                                    + "you do not need to create it, just tell the user to check it now."
-                                )
-                                # TODO: convert to agent invoke message
-                                yield tool_invoke_response
-                            elif (
-                                tool_invoke_response.type
-                                == ToolInvokeMessage.MessageType.JSON
-                            ):
-                                text = json.dumps(
-                                    cast(
-                                        ToolInvokeMessage.JsonMessage,
-                                        tool_invoke_response.message,
-                                    ).json_object,
-                                    ensure_ascii=False,
-                                )
-                                tool_result += f"tool response: {text}."
-                            elif (
-                                tool_invoke_response.type
-                                == ToolInvokeMessage.MessageType.BLOB
-                            ):
-                                tool_result += "Generated file ... "
-                                # TODO: convert to agent invoke message
-                                yield tool_invoke_response
-                            else:
-                                tool_result += (
-                                    f"tool response: {tool_invoke_response.message!r}."
-                                )
-                    except Exception as e:
-                        tool_result = f"tool invoke error: {e!s}"
-                    tool_response = {
-                        "tool_call_id": tool_call_id,
-                        "tool_call_name": tool_call_name,
-                        "tool_call_input": {
-                            **tool_instance.runtime_parameters,
-                            **tool_call_args,
-                        },
-                        "tool_response": tool_result,
-                    }
-
-                yield self.finish_log_message(
-                    log=tool_call_log,
-                    data={
-                        "output": tool_response,
-                    },
-                    metadata={
-                        LogMetadata.STARTED_AT: tool_call_started_at,
-                        LogMetadata.PROVIDER: tool_instance.identity.provider,
-                        LogMetadata.FINISHED_AT: time.perf_counter(),
-                        LogMetadata.ELAPSED_TIME: time.perf_counter()
-                        - tool_call_started_at,
-                    },
-                )
-                tool_responses.append(tool_response)
                 if tool_response["tool_response"] is not None:
                     current_thoughts.append(
                         ToolPromptMessage(
@@ -524,6 +416,336 @@ class FunctionCallingAgentStrategy(AgentStrategy):
             }
         )
 
+    def _execute_tool_calls(
+        self,
+        tool_calls: list[tuple[str, str, dict[str, Any]]],
+        tool_instances: dict[str, ToolEntity],
+        round_log: AgentInvokeMessage,
+    ) -> Generator[AgentInvokeMessage, None, list[dict[str, Any]]]:
+        """
+        Invoke tool calls one after another
+
+        Returns:
+            list[dict[str, Any]]: tool responses in the order of `tool_calls`
+        """
+        tool_responses = []
+        for tool_call_id, tool_call_name, tool_call_args in tool_calls:
+            tool_instance = tool_instances.get(tool_call_name)
+            tool_call_started_at = time.perf_counter()
+            tool_call_log = self._create_tool_call_log(
+                tool_call_name, tool_instance, round_log
+            )
+            yield tool_call_log
+            if not tool_instance:
+                tool_response = self._tool_not_found_response(
+                    tool_call_id, tool_call_name
+                )
+            else:
+                tool_result = yield from self._invoke_tool(
+                    tool_instance, tool_call_args
+                )
+                tool_response = self._tool_response(
+                    tool_call_id, tool_call_name, tool_call_args, tool_instance, tool_result
+                )
+
+            yield self._finish_tool_call_log(
+                tool_call_log,
+                tool_response,
+                tool_instance,
+                started_at=tool_call_started_at,
+                finished_at=time.perf_counter(),
+            )
+            tool_responses.append(tool_response)
+
+        return tool_responses
+
+    def _execute_tool_calls_concurrently(
+        self,
+        tool_calls: list[tuple[str, str, dict[str, Any]]],
+        tool_instances: dict[str, ToolEntity],
+        round_log: AgentInvokeMessage,
+        timeout: float,
+    ) -> Generator[AgentInvokeMessage, None, list[dict[str, Any]]]:
+        """
+        Invoke tool calls on a bounded thread pool
+
+        All call logs are started up front, then results are collected in call
+        order so logs, messages and responses keep the sequential ordering.
+        Every call gets `timeout` seconds from the moment it holds a slot of its
+        tool, time queued behind other calls does not count. A call that runs
+        longer, or is still queued `timeout` seconds after the calls before it
+        were collected, is reported as an error and its result is discarded.
+
+        Returns:
+            list[dict[str, Any]]: tool responses in the order of `tool_calls`
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=min(MAX_PARALLEL_TOOL_CALLS, len(tool_calls)),
+            thread_name_prefix="agent-tool-call",
+        )
+        tool_semaphores = {
+            tool_call_name: threading.BoundedSemaphore(MAX_PARALLEL_CALLS_PER_TOOL)
+            for _, tool_call_name, _ in tool_calls
+        }
+
+        pending = []
+        for tool_call_id, tool_call_name, tool_call_args in tool_calls:
+            tool_instance = tool_instances.get(tool_call_name)
+            tool_call_started_at = time.perf_counter()
+            tool_call_log = self._create_tool_call_log(
+                tool_call_name, tool_instance, round_log
+            )
+            yield tool_call_log
+            future = None
+            started: Future[float] = Future()
+            if tool_instance:
+                future = executor.submit(
+                    self._invoke_tool_with_limit,
+                    tool_semaphores[tool_call_name],
+                    tool_instance,
+                    tool_call_args,
+                    started,
+                )
+            pending.append((tool_call_log, tool_call_started_at, started, future))
+
+        tool_responses = []
+        try:
+            for (tool_call_id, tool_call_name, tool_call_args), (
+                tool_call_log,
+                tool_call_started_at,
+                started,
+                future,
+            ) in zip(tool_calls, pending):
+                tool_instance = tool_instances.get(tool_call_name)
+                if future is None:
+                    tool_response = self._tool_not_found_response(
+                        tool_call_id, tool_call_name
+                    )
+                    finished_at = time.perf_counter()
+                else:
+                    try:
+                        # the clock starts once the call holds a slot of its tool
+                        tool_call_started_at = started.result(timeout=timeout)
+                    except FuturesTimeoutError:
+                        future.cancel()
+                        tool_result = (
+                            f"tool invoke error: not started after waiting {timeout}s for a free slot"
+                        )
+                        finished_at = time.perf_counter()
+                    else:
+                        remaining = tool_call_started_at + timeout - time.perf_counter()
+                        try:
+                            tool_result, messages, finished_at = future.result(
+                                timeout=max(remaining, 0)
+                            )
+                            yield from messages
+                        except FuturesTimeoutError:
+                            future.cancel()
+                            tool_result = f"tool invoke error: timed out after {timeout}s"
+                            finished_at = time.perf_counter()
+                    tool_response = self._tool_response(
+                        tool_call_id, tool_call_name, tool_call_args, tool_instance, tool_result
+                    )
+
+                yield self._finish_tool_call_log(
+                    tool_call_log,
+                    tool_response,
+                    tool_instance,
+                    started_at=tool_call_started_at,
+                    finished_at=finished_at,
+                )
+                tool_responses.append(tool_response)
+        finally:
+            # do not wait for timed out calls, their results are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return tool_responses
+
+    def _invoke_tool_with_limit(
+        self,
+        semaphore: threading.BoundedSemaphore,
+        tool_instance: ToolEntity,
+        tool_call_args: dict[str, Any],
+        started: Future[float],
+    ) -> tuple[str, list[AgentInvokeMessage], float]:
+        # messages are buffered here and forwarded in call order by the caller
+        messages: list[AgentInvokeMessage] = []
+        with semaphore:
+            started.set_result(time.perf_counter())
+            tool_invocation = self._invoke_tool(tool_instance, tool_call_args)
+            while True:
+                try:
+                    messages.append(next(tool_invocation))
+                except StopIteration as stop:
+                    tool_result = stop.value
+                    break
+        return tool_result, messages, time.perf_counter()
+
+    def _invoke_tool(
+        self, tool_instance: ToolEntity, tool_call_args: dict[str, Any]
+    ) -> Generator[AgentInvokeMessage, None, str]:
+        """
+        Invoke a tool and render its responses into the text fed back to the model,
+        yielding the messages to be forwarded to the user as they arrive
+
+        Returns:
+            str: tool result
+        """
+        try:
+            tool_invoke_responses = self.session.tool.invoke(
+                provider_type=ToolProviderType(tool_instance.provider_type),
+                provider=tool_instance.identity.provider,
+                tool_name=tool_instance.identity.name,
+                parameters={
+                    **tool_instance.runtime_parameters,
+                    **tool_call_args,
+                },
+            )
+            tool_result = ""
+            for tool_invoke_response in tool_invoke_responses:
+                if tool_invoke_response.type == ToolInvokeMessage.MessageType.TEXT:
+                    tool_result += cast(
+                        ToolInvokeMessage.TextMessage,
+                        tool_invoke_response.message,
+                    ).text
+                elif tool_invoke_response.type == ToolInvokeMessage.MessageType.LINK:
+                    tool_result += (
+                        "result link: "
+                        + cast(
+                            ToolInvokeMessage.TextMessage,
+                            tool_invoke_response.message,
+                        ).text
+                        + "."
+                        + " please tell user to check it."
+                    )
+                elif tool_invoke_response.type in {
+                    ToolInvokeMessage.MessageType.IMAGE_LINK,
+                    ToolInvokeMessage.MessageType.IMAGE,
+                }:
+                    # Extract the file path or URL from the message
+                    if hasattr(tool_invoke_response.message, "text"):
+                        file_info = cast(
+                            ToolInvokeMessage.TextMessage,
+                            tool_invoke_response.message,
+                        ).text
+                        # Try to create a blob message with the file content
+                        try:
+                            # If it's a local file path, try to read it
+                            if file_info.startswith("/files/"):
+                                if os.path.exists(file_info):
+                                    with open(file_info, "rb") as f:
+                                        file_content = f.read()
+                                    # Create a blob message with the file content
+                                    blob_response = self.create_blob_message(
+                                        blob=file_content,
+                                        meta={
+                                            "mime_type": "image/png",
+                                            "filename": os.path.basename(file_info),
+                                        },
+                                    )
+                                    yield blob_response
+                        except Exception as e:
+                            yield self.create_text_message(
+                                f"Failed to create blob message: {e}"
+                            )
+                    tool_result += (
+                        "image has been created and sent to user already, "
+                        + "you do not need to create it, just tell the user to check it now."
+                    )
+                    # TODO: convert to agent invoke message
+                    yield tool_invoke_response
+                elif tool_invoke_response.type == ToolInvokeMessage.MessageType.JSON:
+                    text = json.dumps(
+                        cast(
+                            ToolInvokeMessage.JsonMessage,
+                            tool_invoke_response.message,
+                        ).json_object,
+                        ensure_ascii=False,
+                    )
+                    tool_result += f"tool response: {text}."
+                elif tool_invoke_response.type == ToolInvokeMessage.MessageType.BLOB:
+                    tool_result += "Generated file ... "
+                    # TODO: convert to agent invoke message
+                    yield tool_invoke_response
+                else:
+                    tool_result += f"tool response: {tool_invoke_response.message!r}."
+        except Exception as e:
+            tool_result = f"tool invoke error: {e!s}"
+
+        return tool_result
+
+    def _tool_response(
+        self,
+        tool_call_id: str,
+        tool_call_name: str,
+        tool_call_args: dict[str, Any],
+        tool_instance: ToolEntity,
+        tool_result: str,
+    ) -> dict[str, Any]:
+        return {
+            "tool_call_id": tool_call_id,
+            "tool_call_name": tool_call_name,
+            "tool_call_input": {
+                **tool_instance.runtime_parameters,
+                **tool_call_args,
+            },
+            "tool_response": tool_result,
+        }
+
+    def _tool_not_found_response(
+        self, tool_call_id: str, tool_call_name: str
+    ) -> dict[str, Any]:
+        return {
+            "tool_call_id": tool_call_id,
+            "tool_call_name": tool_call_name,
+            "tool_response": f"there is not a tool named {tool_call_name}",
+            "meta": ToolInvokeMeta.error_instance(
+                f"there is not a tool named {tool_call_name}"
+            ).to_dict(),
+        }
+
+    def _create_tool_call_log(
+        self,
+        tool_call_name: str,
+        tool_instance: Optional[ToolEntity],
+        round_log: AgentInvokeMessage,
+    ) -> AgentInvokeMessage:
+        return self.create_log_message(
+            label=f"CALL {tool_call_name}",
+            data={},
+            metadata={
+                LogMetadata.STARTED_AT: time.perf_counter(),
+                LogMetadata.PROVIDER: tool_instance.identity.provider
+                if tool_instance
+                else "",
+            },
+            parent=round_log,
+            status=ToolInvokeMessage.LogMessage.LogStatus.START,
+        )
+
+    def _finish_tool_call_log(
+        self,
+        tool_call_log: AgentInvokeMessage,
+        tool_response: dict[str, Any],
+        tool_instance: Optional[ToolEntity],
+        started_at: float,
+        finished_at: float,
+    ) -> AgentInvokeMessage:
+        return self.finish_log_message(
+            log=tool_call_log,
+            data={
+                "output": tool_response,
+            },
+            metadata={
+                LogMetadata.STARTED_AT: started_at,
+                LogMetadata.PROVIDER: tool_instance.identity.provider
+                if tool_instance
+                else "",
+                LogMetadata.FINISHED_AT: finished_at,
+                LogMetadata.ELAPSED_TIME: finished_at - started_at,
+            },
+        )
+
     def check_tool_calls(self, llm_result_chunk: LLMResultChunk) -> bool:
         """
         Check if there is any tool call in llm result chunk
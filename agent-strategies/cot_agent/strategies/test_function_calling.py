@@ -0,0 +1,217 @@
+import threading
+import time
+
+from dify_plugin.entities import I18nObject
+from dify_plugin.entities.agent import AgentInvokeMessage
+from dify_plugin.entities.tool import ToolInvokeMessage
+from dify_plugin.interfaces.agent import AgentToolIdentity, ToolEntity
+
+from strategies.function_calling import (
+    MAX_PARALLEL_CALLS_PER_TOOL,
+    FunctionCallingAgentStrategy,
+)
+
+
+def _tool(name: str) -> ToolEntity:
+    return ToolEntity(
+        identity=AgentToolIdentity(
+            author="test",
+            name=name,
+            label=I18nObject(en_US=name),
+            provider="test",
+        ),
+        parameters=[],
+    )
+
+
+class FakeToolSession:
+    """Stands in for `session.tool`, answering each call with `handler(tool_name, parameters)`"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def invoke(self, provider_type, provider, tool_name, parameters):
+        self.calls.append(tool_name)
+        return self.handler(tool_name, parameters)
+
+
+def _strategy(handler) -> FunctionCallingAgentStrategy:
+    # __init__ wants a plugin runtime, tool execution only needs the tool session
+    strategy = FunctionCallingAgentStrategy.__new__(FunctionCallingAgentStrategy)
+    strategy.response_type = AgentInvokeMessage
+    strategy.session = type("Session", (), {})()
+    strategy.session.tool = FakeToolSession(handler)
+    return strategy
+
+
+def _text(text: str) -> ToolInvokeMessage:
+    return ToolInvokeMessage(
+        type=ToolInvokeMessage.MessageType.TEXT,
+        message=ToolInvokeMessage.TextMessage(text=text),
+    )
+
+
+def _blob(blob: bytes) -> ToolInvokeMessage:
+    return ToolInvokeMessage(
+        type=ToolInvokeMessage.MessageType.BLOB,
+        message=ToolInvokeMessage.BlobMessage(blob=blob),
+    )
+
+
+def _run(generator):
+    messages = []
+    while True:
+        try:
+            messages.append(next(generator))
+        except StopIteration as stop:
+            return messages, stop.value
+
+
+def _execute_concurrently(strategy, tool_calls, tools, timeout=10):
+    round_log = strategy.create_log_message(label="ROUND 1", data={})
+    return _run(
+        strategy._execute_tool_calls_concurrently(
+            tool_calls=tool_calls,
+            tool_instances={tool.identity.name: tool for tool in tools},
+            round_log=round_log,
+            timeout=timeout,
+        )
+    )
+
+
+def test_concurrent_results_keep_call_order():
+    # every call waits for the calls after it, so they complete in reverse order
+    completed = []
+    condition = threading.Condition()
+
+    def handler(tool_name, parameters):
+        index = parameters["index"]
+        with condition:
+            condition.wait_for(lambda: all(later in completed for later in range(index + 1, 3)), timeout=5)
+            completed.append(index)
+            condition.notify_all()
+        yield _text(f"result {index}")
+
+    strategy = _strategy(handler)
+    tools = [_tool(f"tool_{index}") for index in range(3)]
+    tool_calls = [(f"call_{index}", f"tool_{index}", {"index": index}) for index in range(3)]
+    messages, responses = _execute_concurrently(strategy, tool_calls, tools)
+
+    assert completed == [2, 1, 0]
+    assert [response["tool_call_id"] for response in responses] == ["call_0", "call_1", "call_2"]
+    assert [response["tool_response"] for response in responses] == ["result 0", "result 1", "result 2"]
+    finished_logs = [
+        message.message.label
+        for message in messages
+        if message.message.status == ToolInvokeMessage.LogMessage.LogStatus.SUCCESS
+    ]
+    assert finished_logs == ["CALL tool_0", "CALL tool_1", "CALL tool_2"]
+
+
+def test_concurrent_calls_to_one_tool_are_capped():
+    state = {"started": 0, "active": 0, "max_active": 0}
+    condition = threading.Condition()
+    call_count = 5
+
+    def handler(tool_name, parameters):
+        with condition:
+            state["started"] += 1
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            condition.notify_all()
+            # hold the call until the cap is reached, or no more calls can start
+            condition.wait_for(
+                lambda: state["active"] >= MAX_PARALLEL_CALLS_PER_TOOL or state["started"] == call_count,
+                timeout=5,
+            )
+            state["active"] -= 1
+        yield _text(f"searched {parameters['q']}")
+
+    strategy = _strategy(handler)
+    tool_calls = [(f"call_{index}", "search", {"q": index}) for index in range(call_count)]
+    _, responses = _execute_concurrently(strategy, tool_calls, [_tool("search")])
+
+    assert [response["tool_response"] for response in responses] == [
+        f"searched {index}" for index in range(call_count)
+    ]
+    assert state["max_active"] == MAX_PARALLEL_CALLS_PER_TOOL
+
+
+def test_timed_out_call_is_reported_as_error():
+    release = threading.Event()
+
+    def handler(tool_name, parameters):
+        if tool_name == "slow":
+            release.wait(timeout=5)
+        yield _text(f"{tool_name} done")
+
+    strategy = _strategy(handler)
+    tool_calls = [("call_0", "slow", {}), ("call_1", "fast", {})]
+    try:
+        _, responses = _execute_concurrently(
+            strategy, tool_calls, [_tool("slow"), _tool("fast")], timeout=0.05
+        )
+    finally:
+        release.set()
+
+    assert responses[0]["tool_response"] == "tool invoke error: timed out after 0.05s"
+    assert responses[1]["tool_response"] == "fast done"
+
+
+def test_time_queued_for_a_tool_slot_does_not_count_against_the_timeout():
+    # the third call waits for one of the first two, it runs for less than the timeout
+    # but finishes later than the timeout after dispatch
+    call_count = MAX_PARALLEL_CALLS_PER_TOOL + 1
+
+    def handler(tool_name, parameters):
+        time.sleep(0.5)
+        yield _text(f"searched {parameters['q']}")
+
+    strategy = _strategy(handler)
+    tool_calls = [(f"call_{index}", "search", {"q": index}) for index in range(call_count)]
+    _, responses = _execute_concurrently(strategy, tool_calls, [_tool("search")], timeout=0.8)
+
+    assert [response["tool_response"] for response in responses] == [
+        f"searched {index}" for index in range(call_count)
+    ]
+
+
+def test_unknown_tool_is_not_invoked():
+    def handler(tool_name, parameters):
+        yield _text(f"{tool_name} done")
+
+    strategy = _strategy(handler)
+    tool_calls = [("call_0", "missing", {}), ("call_1", "known", {})]
+    _, responses = _execute_concurrently(strategy, tool_calls, [_tool("known")])
+
+    assert responses[0]["tool_response"] == "there is not a tool named missing"
+    assert responses[0]["meta"]["error"] == "there is not a tool named missing"
+    assert responses[1]["tool_response"] == "known done"
+    assert strategy.session.tool.calls == ["known"]
+
+
+def test_sequential_mode_streams_files_before_the_tool_finishes():
+    state = {"finished": False}
+
+    def handler(tool_name, parameters):
+        yield _blob(b"chart")
+        yield _text("chart rendered")
+        state["finished"] = True
+
+    strategy = _strategy(handler)
+    round_log = strategy.create_log_message(label="ROUND 1", data={})
+    execution = strategy._execute_tool_calls(
+        tool_calls=[("call_0", "chart", {})],
+        tool_instances={"chart": _tool("chart")},
+        round_log=round_log,
+    )
+
+    for message in execution:
+        if message.type == ToolInvokeMessage.MessageType.BLOB:
+            break
+    assert not state["finished"]
+
+    messages, responses = _run(execution)
+    assert state["finished"]
+    assert responses[0]["tool_response"] == "Generated file ... chart rendered"
@@ -0,0 +1,135 @@
+from dify_plugin.entities import I18nObject
+from dify_plugin.entities.tool import ToolParameter
+from dify_plugin.interfaces.agent import (
+    AgentScratchpadUnit,
+    AgentToolIdentity,
+    ToolEntity,
+)
+
+from strategies.ReAct import ReActAgentStrategy
+
+
+def _tool(index: int) -> ToolEntity:
+    return ToolEntity(
+        identity=AgentToolIdentity(
+            author="test",
+            name=f"tool_{index}",
+            label=I18nObject(en_US=f"Tool {index}"),
+            provider="test",
+        ),
+        parameters=[
+            ToolParameter(
+                name=f"param_{param}",
+                label=I18nObject(en_US=f"Param {param}"),
+                human_description=I18nObject(en_US=f"Param {param}"),
+                type=ToolParameter.ToolParameterType.STRING,
+                form=ToolParameter.ToolParameterForm.LLM,
+                llm_description=f"parameter {param} of tool {index}",
+                required=param == 0,
+            )
+            for param in range(4)
+        ],
+    )
+
+
+def _strategy(tools: list[ToolEntity]) -> ReActAgentStrategy:
+    # __init__ wants a plugin runtime, prompt assembly does not need it
+    strategy = ReActAgentStrategy.__new__(ReActAgentStrategy)
+    strategy.query = "what is the weather like in Paris?"
+    strategy.instruction = "You are a helpful assistant."
+    strategy.history_prompt_messages = []
+    strategy._prompt_messages_tools = strategy._init_prompt_tools(tools)
+    return strategy
+
+
+def _scratchpad_unit(index: int) -> AgentScratchpadUnit:
+    return AgentScratchpadUnit(
+        agent_response=f"observation {index} " * 50,
+        thought=f"I should call tool_{index % 50} to learn more. " * 5,
+        action_str=f'{{"action": "tool_{index % 50}", "action_input": {{"q": "{index}"}}}}',
+        observation=f"observation {index} " * 50,
+        action=AgentScratchpadUnit.Action(
+            action_name=f"tool_{index % 50}", action_input={"q": str(index)}
+        ),
+    )
+
+
+def _run_rounds(strategy: ReActAgentStrategy, tools: list[ToolEntity], rounds: int):
+    tool_instances = {tool.identity.name: tool for tool in tools}
+    agent_scratchpad: list[AgentScratchpadUnit] = []
+    messages = []
+    for index in range(rounds):
+        messages = strategy._organize_prompt_messages(agent_scratchpad, strategy.query)
+
+        agent_scratchpad.append(_scratchpad_unit(index))
+        for prompt_tool in strategy._prompt_messages_tools:
+            strategy.update_prompt_message_tool(
+                tool_instances[prompt_tool.name], prompt_tool
+            )
+    return messages, agent_scratchpad
+
+
+def test_incremental_prompt_matches_full_rebuild():
+    tools = [_tool(index) for index in range(50)]
+    strategy = _strategy(tools)
+    messages, agent_scratchpad = _run_rounds(strategy, tools, 20)
+    messages = strategy._organize_prompt_messages(agent_scratchpad, strategy.query)
+
+    assert messages[-2].content == strategy._format_assistant_message(
+        agent_scratchpad
+    )
+    assert (
+        messages[0].content == strategy._build_system_prompt_message().content
+    )
+
+
+def test_system_prompt_rebuilt_only_on_schema_change():
+    tools = [_tool(index) for index in range(3)]
+    strategy = _strategy(tools)
+    first = strategy._system_prompt_message
+    _run_rounds(strategy, tools, 5)
+    assert strategy._system_prompt_message is first
+
+    tools[0].parameters[1].llm_description = "a changed description"
+    strategy.update_prompt_message_tool(tools[0], strategy._prompt_messages_tools[0])
+    rebuilt = strategy._system_prompt_message
+    assert rebuilt is not first
+    assert "a changed description" in rebuilt.content
+
+    strategy._prompt_messages_tools = []
+    assert "tool_0" not in strategy._system_prompt_message.content
+
+
+def _count_calls(monkeypatch, strategy: ReActAgentStrategy, name: str) -> list:
+    calls = []
+    method = getattr(strategy, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return method(*args, **kwargs)
+
+    monkeypatch.setattr(strategy, name, counted)
+    return calls
+
+
+def test_rounds_only_render_new_work(monkeypatch):
+    tools = [_tool(index) for index in range(50)]
+    strategy = _strategy(tools)
+    system_prompt_builds = _count_calls(monkeypatch, strategy, "_build_system_prompt_message")
+    unit_formats = _count_calls(monkeypatch, strategy, "_format_scratchpad_unit")
+    _run_rounds(strategy, tools, 20)
+
+    # the system prompt is built once and every unit is formatted once,
+    # the unit added after the last round is never rendered
+    assert len(system_prompt_builds) == 1
+    assert len(unit_formats) == 19
+
+
+def test_new_scratchpad_is_rendered_from_scratch():
+    strategy = _strategy([_tool(0)])
+    first = [_scratchpad_unit(index) for index in range(3)]
+    assert strategy._render_scratchpad(first) == strategy._format_assistant_message(first)
+
+    # a different list of the same length must not reuse the rendered text
+    second = [_scratchpad_unit(index) for index in range(10, 13)]
+    assert strategy._render_scratchpad(second) == strategy._format_assistant_message(second)
@@ -1,10 +1,10 @@
 import base64
+import io
 import json
 import logging
-import os
-import tempfile
 import time
 from collections.abc import Generator, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Union, Mapping, Any
 
 import requests
@@ -36,10 +36,16 @@ from dify_plugin.interfaces.model.large_language_model import LargeLanguageModel
 from google import genai
 from google.genai import errors, types
 
-from .utils import FileCache
+from .utils import FileCache, content_hash
 
 file_cache = FileCache()
 
+MAX_CONCURRENT_UPLOADS = 4
+# uploaded files are polled from 50 ms on, doubling up to 5 s between polls
+FILE_POLL_INITIAL_INTERVAL = 0.05
+FILE_POLL_MAX_INTERVAL = 5
+FILE_PROCESSING_TIMEOUT = 600
+
 
 class GoogleLargeLanguageModel(LargeLanguageModel):
     is_thinking = None
@@ -261,9 +267,15 @@ class GoogleLargeLanguageModel(LargeLanguageModel):
 
         history = []
         file_server_url_prefix = credentials.get("file_url") or None
+        uploaded_files = self._upload_multimodal_contents(
+            prompt_messages, genai_client=genai_client, file_server_url_prefix=file_server_url_prefix
+        )
         for msg in prompt_messages:  # makes message roles strictly alternating
             content = self._format_message_to_glm_content(
-                msg, genai_client=genai_client, file_server_url_prefix=file_server_url_prefix
+                msg,
+                genai_client=genai_client,
+                file_server_url_prefix=file_server_url_prefix,
+                uploaded_files=uploaded_files,
             )
             if history and history[-1].role == content.role:
                 history[-1].parts.extend(content.parts)
@@ -338,13 +350,16 @@ class GoogleLargeLanguageModel(LargeLanguageModel):
         message: PromptMessage,
         genai_client: genai.Client,
         file_server_url_prefix: str | None = None,
+        uploaded_files: Mapping[int, tuple[str, str]] | None = None,
     ) -> types.Content:
         """
         Format a single message into glm.Content for Google API
 
         :param message: one PromptMessage
+        :param uploaded_files: files uploaded ahead, by id of the content
         :return: glm Content representation of message
         """
+        uploaded_files = uploaded_files or {}
         if isinstance(message, UserPromptMessage):
             glm_content = types.Content(role="user", parts=[])
             if isinstance(message.content, str):
@@ -354,11 +369,14 @@ class GoogleLargeLanguageModel(LargeLanguageModel):
                     if c.type == PromptMessageContentType.TEXT:
                         glm_content.parts.append(types.Part.from_text(text=c.data))
                     else:
-                        uri, mime_type = self._upload_file_content_to_google(
-                            message_content=c,
-                            genai_client=genai_client,
-                            file_server_url_prefix=file_server_url_prefix,
-                        )
+                        if id(c) in uploaded_files:
+                            uri, mime_type = uploaded_files[id(c)]
+                        else:
+                            uri, mime_type = self._upload_file_content_to_google(
+                                message_content=c,
+                                genai_client=genai_client,
+                                file_server_url_prefix=file_server_url_prefix,
+                            )
                         glm_content.parts.append(
                             types.Part.from_uri(file_uri=uri, mime_type=mime_type)
                         )
@@ -390,50 +408,119 @@ class GoogleLargeLanguageModel(LargeLanguageModel):
         else:
             raise ValueError(f"Got unknown type {message}")
 
+    def _upload_multimodal_contents(
+        self,
+        prompt_messages: Sequence[PromptMessage],
+        genai_client: genai.Client,
+        file_server_url_prefix: str | None = None,
+    ) -> dict[int, tuple[str, str]]:
+        """
+        Upload the files of all user messages concurrently
+
+        :param prompt_messages: prompt messages
+        :return: uri and mime type of each uploaded content, by id of the content
+        """
+        contents = [
+            c
+            for message in prompt_messages
+            if isinstance(message, UserPromptMessage) and isinstance(message.content, list)
+            for c in message.content
+            if c.type != PromptMessageContentType.TEXT
+        ]
+        if len(contents) < 2:
+            return {}
+
+        # identical files are uploaded once
+        unique_contents: dict[str, MultiModalPromptMessageContent] = {}
+        for c in contents:
+            unique_contents.setdefault(self._file_cache_key(c), c)
+
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_CONCURRENT_UPLOADS, len(unique_contents))
+        ) as executor:
+            futures = {
+                key: executor.submit(
+                    self._upload_file_content_to_google,
+                    message_content=c,
+                    genai_client=genai_client,
+                    file_server_url_prefix=file_server_url_prefix,
+                )
+                for key, c in unique_contents.items()
+            }
+            return {id(c): futures[self._file_cache_key(c)].result() for c in contents}
+
+    @staticmethod
+    def _file_cache_key(message_content: MultiModalPromptMessageContent) -> str:
+        return f"{message_content.type.value}:{content_hash(message_content.data)}"
+
     def _upload_file_content_to_google(
         self,
         message_content: MultiModalPromptMessageContent,
         genai_client: genai.Client,
         file_server_url_prefix: str | None = None,
-    ) -> types.File:
+    ) -> tuple[str, str]:
 
-        key = f"{message_content.type.value}:{hash(message_content.data)}"
-        if file_cache.exists(key):
-            value = file_cache.get(key).split(";")
+        key = self._file_cache_key(message_content)
+        cached = file_cache.get(key)
+        if cached is not None:
+            value = cached.split(";")
             return value[0], value[1]
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            if message_content.base64_data:
-                file_content = base64.b64decode(message_content.base64_data)
-                temp_file.write(file_content)
-            else:
-                try:
-                    file_url = message_content.url
-                    if file_server_url_prefix:
-                        file_url = f"{file_server_url_prefix.rstrip('/')}/files{message_content.url.split('/files')[-1]}"
-                    if not file_url.startswith("https://") and not file_url.startswith("http://"):
-                        raise ValueError("Set FILES_URL env first!")
-                    response: requests.Response = requests.get(file_url)
-                    response.raise_for_status()
-                    temp_file.write(response.content)
-                except Exception as ex:
-                    raise ValueError(f"Failed to fetch data from url {file_url} {ex}")
-            temp_file.flush()
+
+        if message_content.base64_data:
+            file_content = base64.b64decode(message_content.base64_data)
+        else:
+            try:
+                file_url = message_content.url
+                if file_server_url_prefix:
+                    file_url = f"{file_server_url_prefix.rstrip('/')}/files{message_content.url.split('/files')[-1]}"
+                if not file_url.startswith("https://") and not file_url.startswith("http://"):
+                    raise ValueError("Set FILES_URL env first!")
+                response: requests.Response = requests.get(file_url)
+                response.raise_for_status()
+                file_content = response.content
+            except Exception as ex:
+                raise ValueError(f"Failed to fetch data from url {file_url} {ex}")
+
+        started_at = time.perf_counter()
         file = genai_client.files.upload(
-            file=temp_file.name, config={"mime_type": message_content.mime_type}
+            file=io.BytesIO(file_content), config={"mime_type": message_content.mime_type}
         )
-        while file.state.name == "PROCESSING":
-            time.sleep(5)
-            file = genai_client.files.get(name=file.name)
+        uploaded_at = time.perf_counter()
+        file = self._wait_for_file_processing(genai_client, file)
+        logging.info(
+            f"Uploaded {message_content.type.value} file {file.name} "
+            f"({len(file_content)} bytes): upload {(uploaded_at - started_at) * 1000:.0f}ms, "
+            f"processing {(time.perf_counter() - uploaded_at) * 1000:.0f}ms"
+        )
+
         # google will delete your upload files in 2 days.
         file_cache.setex(key, 47 * 60 * 60, f"{file.uri};{file.mime_type}")
 
-        try:
-            os.unlink(temp_file.name)
-        except PermissionError:
-            # windows may raise permission error
-            pass
         return file.uri, file.mime_type
 
+    @staticmethod
+    def _wait_for_file_processing(genai_client: genai.Client, file: types.File) -> types.File:
+        """
+        Poll an uploaded file until google has processed it, backing off exponentially
+
+        :param genai_client: genai client
+        :param file: uploaded file
+        :return: processed file
+        """
+        interval = FILE_POLL_INITIAL_INTERVAL
+        deadline = time.monotonic() + FILE_PROCESSING_TIMEOUT
+        while file.state.name == "PROCESSING":
+            if time.monotonic() >= deadline:
+                raise InvokeServerUnavailableError(
+                    f"File {file.name} is still processing after {FILE_PROCESSING_TIMEOUT}s"
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, FILE_POLL_MAX_INTERVAL)
+            file = genai_client.files.get(name=file.name)
+        if file.state.name == "FAILED":
+            raise InvokeBadRequestError(f"Google failed to process file {file.name}: {file.error}")
+        return file
+
     def _handle_generate_response(
         self,
         model: str,
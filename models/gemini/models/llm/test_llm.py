@@ -1,9 +1,14 @@
 import base64
 import dataclasses
+import threading
+import time
+from types import SimpleNamespace
 
 import pytest
 
+from . import llm as llm_module
 from .llm import _content_to_part, GoogleLargeLanguageModel
+from .utils import FileCache, content_hash
 from dify_plugin.entities.model.message import (
     PromptMessage,
     UserPromptMessage,
@@ -166,3 +171,69 @@ def test_file_url():
         f"{credentials["file_url"].rstrip('/')}/files{message_content.url.split("/files")[-1]}"
     )
     assert file_url == "http://127.0.0.1/static/files/foo/bar.png"
+
+
+class FakeFiles:
+    """
+    Stand-in for genai_client.files: uploads wait until all of them are in flight,
+    processing takes 3 polls
+    """
+
+    def __init__(self, concurrent_uploads: int):
+        self.uploads = 0
+        self.polls: dict[str, int] = {}
+        self.barrier = threading.Barrier(concurrent_uploads, timeout=5)
+
+    def upload(self, file, config):
+        self.barrier.wait()
+        self.uploads += 1
+        name = f"files/{content_hash(file.read())[:8]}"
+        self.polls[name] = 0
+        return types.File(
+            name=name,
+            uri=f"https://example.com/{name}",
+            mime_type=config["mime_type"],
+            state=types.FileState.PROCESSING,
+        )
+
+    def get(self, name):
+        self.polls[name] += 1
+        state = types.FileState.ACTIVE if self.polls[name] >= 3 else types.FileState.PROCESSING
+        return types.File(
+            name=name, uri=f"https://example.com/{name}", mime_type="video/mp4", state=state
+        )
+
+
+def test_upload_multimodal_contents_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_module, "file_cache", FileCache(str(tmp_path / "cache.db")))
+    sleeps = []
+    fake_time = SimpleNamespace(
+        sleep=sleeps.append, monotonic=time.monotonic, perf_counter=time.perf_counter
+    )
+    monkeypatch.setattr(llm_module, "time", fake_time)
+    genai_client = SimpleNamespace(files=FakeFiles(concurrent_uploads=4))
+    videos = [
+        VideoPromptMessageContent(
+            format="mp4", base64_data=base64.b64encode(f"video {index}".encode()).decode(),
+            mime_type="video/mp4",
+        )
+        for index in range(4)
+    ]
+    # the last video is sent twice
+    prompt_messages = [
+        UserPromptMessage(content=[TextPromptMessageContent(data="compare"), *videos[:2]]),
+        UserPromptMessage(content=[*videos[2:], videos[3].model_copy()]),
+    ]
+
+    instance = GoogleLargeLanguageModel([])
+    uploaded = instance._upload_multimodal_contents(prompt_messages, genai_client)
+
+    assert genai_client.files.uploads == 4
+    assert len(uploaded) == 5
+    assert all(mime_type == "video/mp4" for _, mime_type in uploaded.values())
+    # each file is polled 3 times, backing off from the initial interval
+    assert sorted(sleeps) == [0.05] * 4 + [0.1] * 4 + [0.2] * 4
+
+    # a second prompt with the same files is served from the cache
+    instance._upload_multimodal_contents(prompt_messages, genai_client)
+    assert genai_client.files.uploads == 4
@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+
+from .utils import FileCache, content_hash
+
+
+def _write_entries(cache_file: str, start: int) -> None:
+    cache = FileCache(cache_file)
+    for index in range(start, start + 50):
+        cache.setex(f"key-{index}", 60, f"value-{index}")
+
+
+class TestFileCache:
+    def test_content_hash_is_stable(self):
+        assert content_hash("data") == content_hash(b"data")
+        assert content_hash("data") == (
+            "3a6eb0790f39ac87c94f3856b2dd2c5d110e6811602261a9a923d3bb23adc8b7"
+        )
+
+    def test_get_and_expiry(self, tmp_path):
+        cache = FileCache(str(tmp_path / "cache.db"))
+        cache.setex("key", 60, "uri;mime")
+        cache.setex("expired", 0.05, "uri;mime")
+        assert cache.get("key") == "uri;mime"
+        assert cache.exists("expired")
+
+        time.sleep(0.1)
+        assert not cache.exists("expired")
+        assert cache.get("missing") is None
+
+    def test_entries_survive_restart(self, tmp_path):
+        FileCache(str(tmp_path / "cache.db")).setex("key", 60, "value")
+        assert FileCache(str(tmp_path / "cache.db")).get("key") == "value"
+
+    def test_evicts_oldest_entries(self, tmp_path):
+        cache = FileCache(str(tmp_path / "cache.db"), max_entries=3)
+        for index in range(5):
+            cache.setex(f"key-{index}", 60 + index, "value")
+        restarted = FileCache(str(tmp_path / "cache.db"))
+        assert [restarted.exists(f"key-{index}") for index in range(5)] == [
+            False,
+            False,
+            True,
+            True,
+            True,
+        ]
+
+    def test_concurrent_processes(self, tmp_path):
+        cache_file = str(tmp_path / "cache.db")
+        processes = [
+            multiprocessing.get_context("spawn").Process(
+                target=_write_entries, args=(cache_file, start)
+            )
+            for start in (0, 50, 100, 150)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+
+        cache = FileCache(cache_file)
+        assert all(cache.get(f"key-{index}") == f"value-{index}" for index in range(200))
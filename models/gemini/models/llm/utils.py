@@ -1,12 +1,34 @@
+import hashlib
 import os
-import json
 import pathlib
-import time
+import sqlite3
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data: str | bytes) -> str:
+    """
+    Stable hash of file content, unlike hash() it is the same across processes and restarts
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
 
 
 class FileCache:
-    def __init__(self, cache_file="file_cache.json"):
+    """
+    Expiring key-value cache backed by sqlite.
+
+    Reads are served from an in-memory index and fall back to the database, so
+    entries written by other processes are found too. Writes are single
+    sqlite transactions, which makes them atomic and safe across threads and
+    processes. Expired entries are dropped, and the oldest entries are evicted
+    once there are more than `max_entries`.
+    """
+
+    def __init__(self, cache_file="file_cache.db", max_entries=10000):
         dir = os.path.dirname(cache_file)
         try:
             # try to check if the cache file is writable
@@ -15,37 +37,83 @@ class FileCache:
         except Exception:
             self.cache_file = str(pathlib.Path(tempfile.gettempdir()) / cache_file)
 
+        self.max_entries = max_entries
+        self._index: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
         self._ensure_cache_file()
 
-    def _ensure_cache_file(self):
-        if not os.path.exists(self.cache_file):
-            with open(self.cache_file, "w") as f:
-                json.dump({}, f)
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.cache_file, timeout=10, isolation_level=None)
+            self._local.connection = connection
+        return connection
 
-    def _load_cache(self):
-        try:
-            with open(self.cache_file, "r") as f:
-                cache = json.load(f)
-            return cache
-        except Exception:
-            return {}
+    def _ensure_cache_file(self):
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS file_cache_expires_at ON file_cache (expires_at)"
+        )
 
-    def _save_cache(self, cache):
-        cleaned_cache = {k: v for k, v in cache.items() if v.get("expires_at", 0) > time.time()}
-        with open(self.cache_file, "w") as f:
-            json.dump(cleaned_cache, f)
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._index[key] = (value, expires_at)
+            self._index.move_to_end(key)
+            while len(self._index) > self.max_entries:
+                self._index.popitem(last=False)
 
     def exists(self, key):
-        cache = self._load_cache()
-        return key in cache and cache[key].get("expires_at", 0) > time.time()
+        return self.get(key) is not None
 
     def get(self, key):
-        cache = self._load_cache()
-        if key in cache and cache[key].get("expires_at", 0) > time.time():
-            return cache[key]["value"]
-        return None
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._index.move_to_end(key)
+                    return entry[0]
+                del self._index[key]
+
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, expires_at FROM file_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
 
     def setex(self, key, expires_in_seconds, value):
-        cache = self._load_cache()
-        cache[key] = {"value": value, "expires_at": time.time() + expires_in_seconds}
-        self._save_cache(cache)
+        now = time.time()
+        expires_at = now + expires_in_seconds
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO file_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            connection.execute("DELETE FROM file_cache WHERE expires_at <= ?", (now,))
+            connection.execute(
+                "DELETE FROM file_cache WHERE key IN (SELECT key FROM file_cache "
+                "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._remember(key, value, expires_at)
@@ -1,6 +1,12 @@
-from threading import Lock
-from time import time
-from typing import Optional
+import json
+import random
+from collections import OrderedDict, deque
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b, sha256
+from threading import Lock, Thread
+from time import sleep, time
+from typing import Any, Optional
 
 import httpx
 from requests.adapters import HTTPAdapter
@@ -8,6 +14,67 @@ from requests.exceptions import ConnectionError, MissingSchema, Timeout
 from requests.sessions import Session
 from yarl import URL
 
+MAX_CONCURRENT_REQUESTS = 4
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8
+
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Client shared by all invocations, so that connections to the server are kept alive.
+    It is created on first use, after gevent has patched socket and threading, under a lock
+    so that the first concurrent batches do not each create a pool of their own.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+        return _http_client
+
+
+def text_hash(text: str) -> bytes:
+    return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class TokenCountCache:
+    """
+    Bounded, thread-safe LRU map of token counts, keyed by tokenizer and text hash.
+    """
+
+    def __init__(self, max_size: int = 100000) -> None:
+        self.max_size = max_size
+        self._data: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: tuple) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+
+token_count_cache = TokenCountCache()
+
 
 class TeiModelExtraParameter:
     model_type: str
@@ -25,8 +92,137 @@ class TeiModelExtraParameter:
         self.max_client_batch_size = max_client_batch_size
 
 
-cache = {}
-cache_lock = Lock()
+class ModelMetadataCache:
+    """
+    TTL cache for model metadata fetched from a model server.
+
+    Lookups of different keys never wait on each other: the shared lock only
+    guards the dicts, and a fetch holds the lock of its own key, so concurrent
+    misses of one key make a single request. Entries close to expiry are
+    refreshed in the background, and when a refresh fails the stale value is
+    served for up to another ttl. After a failure the key is not reloaded for
+    `failure_backoff` seconds, so a down server is not asked on every lookup.
+    """
+
+    def __init__(self, ttl: float = 300, refresh_ahead: float = 60, failure_backoff: float = 30) -> None:
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.failure_backoff = failure_backoff
+        self._entries: dict[tuple, dict] = {}
+        self._key_locks: dict[tuple, Lock] = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refresh_failures = 0
+        self.refresh_latencies: deque[float] = deque(maxlen=1000)
+
+    def get(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        now = time()
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and now < entry["expires"]
+            if fresh:
+                self.hits += 1
+                if (
+                    entry["expires"] - now < self.refresh_ahead
+                    and not entry["refreshing"]
+                    and now >= entry["retry_at"]
+                ):
+                    entry["refreshing"] = refresh = True
+            else:
+                key_lock = self._key_locks.setdefault(key, Lock())
+        if fresh:
+            if refresh:
+                Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+            return entry["value"]
+
+        with key_lock:
+            now = time()
+            with self._lock:
+                # another thread may have loaded it while we waited
+                entry = self._entries.get(key)
+                if entry is not None and now < entry["expires"]:
+                    self.hits += 1
+                    return entry["value"]
+                if entry is not None and entry["expires"] + self.ttl <= now:
+                    # too old to be served even as a fallback
+                    entry = None
+                if entry is not None and now < entry["retry_at"]:
+                    # the last load failed recently, do not ask the server again yet
+                    self.stale_hits += 1
+                    return entry["value"]
+                self.misses += 1
+            try:
+                return self._load(key, loader)
+            except Exception:
+                if entry is None:
+                    raise
+                with self._lock:
+                    self.stale_hits += 1
+                    entry["retry_at"] = time() + self.failure_backoff
+                return entry["value"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self.refresh_latencies)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "refresh_failures": self.refresh_failures,
+                "refreshes": len(latencies),
+                "refresh_latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "refresh_latency_max": max(latencies, default=0.0),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+    def _refresh(self, key: tuple, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        with key_lock:
+            try:
+                self._load(key, loader)
+            except Exception:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        entry["refreshing"] = False
+                        entry["retry_at"] = time() + self.failure_backoff
+
+    def _load(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        started_at = time()
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self.refresh_failures += 1
+            raise
+        now = time()
+        with self._lock:
+            self.refresh_latencies.append(now - started_at)
+            self._entries[key] = {
+                "value": value,
+                "expires": now + self.ttl,
+                "refreshing": False,
+                "retry_at": 0.0,
+            }
+            # stale entries are kept for one more ttl as a fallback
+            for expired_key in [
+                k for k, v in self._entries.items() if v["expires"] + self.ttl < now
+            ]:
+                del self._entries[expired_key]
+                self._key_locks.pop(expired_key, None)
+        return value
+
+
+metadata_cache = ModelMetadataCache()
 
 
 class TeiHelper:
@@ -34,28 +230,11 @@ class TeiHelper:
     def get_tei_extra_parameter(
         server_url: str, model_name: str, headers: Optional[dict] = None
     ) -> TeiModelExtraParameter:
-        TeiHelper._clean_cache()
-        with cache_lock:
-            if model_name not in cache:
-                cache[model_name] = {
-                    "expires": time() + 300,
-                    "value": TeiHelper._get_tei_extra_parameter(server_url, headers),
-                }
-            return cache[model_name]["value"]
-
-    @staticmethod
-    def _clean_cache() -> None:
-        try:
-            with cache_lock:
-                expired_keys = [
-                    model_uid
-                    for model_uid, model in cache.items()
-                    if model["expires"] < time()
-                ]
-                for model_uid in expired_keys:
-                    del cache[model_uid]
-        except RuntimeError:
-            pass
+        credentials_hash = sha256(json.dumps(headers or {}, sort_keys=True).encode()).hexdigest()
+        return metadata_cache.get(
+            (server_url, model_name, credentials_hash),
+            lambda: TeiHelper._get_tei_extra_parameter(server_url, headers),
+        )
 
     @staticmethod
     def _get_tei_extra_parameter(
@@ -67,7 +246,7 @@ class TeiHelper:
 
         url = str(URL(server_url) / "info")
 
-        # this method is surrounded by a lock, and default requests may hang forever,
+        # lookups of this model wait for this request, and default requests may hang forever,
         # so we just set a Adapter with max_retries=3
         session = Session()
         session.mount("http://", HTTPAdapter(max_retries=3))
@@ -102,6 +281,27 @@ class TeiHelper:
             max_client_batch_size=max_client_batch_size,
         )
 
+    @staticmethod
+    def _post(
+        url: str, json_data: dict, headers: Optional[dict], invoke_timeout: int, max_retries: int
+    ) -> Any:
+        """
+        POST over the pooled client, retrying connection errors, 429 and 5xx
+        with jittered exponential backoff
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                resp = get_http_client().post(url, json=json_data, headers=headers, timeout=invoke_timeout)
+                resp.raise_for_status()
+                return resp.json()
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.RequestError) or e.response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= max_retries:
+                    raise
+                backoff = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2**attempt))
+                print(f"Request failed, retry {attempt+1}/{max_retries} in {backoff:.2f}s... ({e})")
+                sleep(backoff)
+
     @staticmethod
     def invoke_tokenize(
         server_url: str, texts: list[str], headers: Optional[dict] = None, invoke_timeout: int = 60, max_retries: int = 3
@@ -138,17 +338,7 @@ class TeiHelper:
         url = f"{server_url}/tokenize"
         json_data = {"inputs": texts}
 
-        for attempt in range(max_retries + 1):
-            try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
-                resp.raise_for_status()
-                break
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                if attempt >= max_retries:
-                    raise
-                print(f"Request failed, retry {attempt+1}/{max_retries}... ({e})")
-
-        return resp.json()
+        return TeiHelper._post(url, json_data, headers, invoke_timeout, max_retries)
 
     @staticmethod
     def invoke_embeddings(
@@ -183,17 +373,7 @@ class TeiHelper:
         url = f"{server_url}/v1/embeddings"
         json_data = {"input": texts}
 
-        for attempt in range(max_retries + 1):
-            try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
-                resp.raise_for_status()
-                break
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                if attempt >= max_retries:
-                    raise
-                print(f"Request failed, retry {attempt+1}/{max_retries}... ({e})")
-
-        return resp.json()
+        return TeiHelper._post(url, json_data, headers, invoke_timeout, max_retries)
 
     @staticmethod
     def invoke_rerank(
@@ -219,14 +399,129 @@ class TeiHelper:
         json_data = {"query": query, "texts": docs, "return_text": True}
         url = f"{server_url}/rerank"
 
-        for attempt in range(max_retries + 1):
-            try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
-                resp.raise_for_status()
-                break
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                if attempt >= max_retries:
-                    raise
-                print(f"Request failed, retry {attempt+1}/{max_retries}... ({e})")
+        return TeiHelper._post(url, json_data, headers, invoke_timeout, max_retries)
+
+    @staticmethod
+    def invoke_embeddings_batched(
+        server_url: str,
+        texts: list[str],
+        batch_size: int,
+        headers: Optional[dict] = None,
+        invoke_timeout: int = 60,
+        max_retries: int = 3,
+    ) -> tuple[list[list[float]], int]:
+        """
+        Embed texts in batches of at most batch_size, MAX_CONCURRENT_REQUESTS at a time
+
+        :param server_url: server url
+        :param texts: texts to embed
+        :param batch_size: max texts per request, the server's max_client_batch_size
+        :return: embeddings in input order, and prompt tokens reported by the server
+        """
+        batch_size = max(1, batch_size)
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        embeddings: list[list[float]] = []
+        prompt_tokens = 0
+        for results in TeiHelper._map_concurrently(
+            lambda batch: TeiHelper.invoke_embeddings(server_url, batch, headers, invoke_timeout, max_retries),
+            batches,
+        ):
+            embeddings.extend(data["embedding"] for data in sorted(results["data"], key=lambda d: d["index"]))
+            prompt_tokens += results.get("usage", {}).get("prompt_tokens", 0)
+        return embeddings, prompt_tokens
 
-        return resp.json()
+    @staticmethod
+    def invoke_rerank_sharded(
+        server_url: str,
+        query: str,
+        docs: list[str],
+        shard_size: int,
+        headers: Optional[dict] = None,
+        invoke_timeout: int = 60,
+        max_retries: int = 3,
+    ) -> list[dict]:
+        """
+        Rerank docs in shards of at most shard_size, MAX_CONCURRENT_REQUESTS at a time
+
+        :param server_url: server url
+        :param query: search query
+        :param docs: docs for reranking
+        :param shard_size: max docs per request, the server's max_client_batch_size
+        :return: results of all shards with indices into docs, by descending score
+        """
+        shard_size = max(1, shard_size)
+        offsets = range(0, len(docs), shard_size)
+        shards = TeiHelper._map_concurrently(
+            lambda offset: TeiHelper.invoke_rerank(
+                server_url, query, docs[offset : offset + shard_size], headers, invoke_timeout, max_retries
+            ),
+            offsets,
+        )
+        results = [
+            {**result, "index": result["index"] + offset}
+            for offset, shard in zip(offsets, shards)
+            for result in shard
+        ]
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results
+
+    @staticmethod
+    def tokenize_for_truncation(
+        server_url: str,
+        texts: list[str],
+        max_tokens: int,
+        batch_size: int,
+        headers: Optional[dict] = None,
+        invoke_timeout: int = 60,
+        max_retries: int = 3,
+    ) -> list[tuple[int, Optional[int]]]:
+        """
+        Count tokens with the server's tokenizer, cached per text hash
+
+        :param server_url: server url
+        :param texts: texts to count
+        :param max_tokens: token budget of one input, including special tokens
+        :param batch_size: max texts per request, the server's max_client_batch_size
+        :return: for each text its number of tokens, and the utf-8 byte offset to
+            cut it at to fit max_tokens, or None when it fits
+        """
+        keys = [(server_url, max_tokens, text_hash(text)) for text in texts]
+        results = [token_count_cache.get(key) for key in keys]
+        missing = {key: text for key, text, result in zip(keys, texts, results) if result is None}
+        if missing:
+            missing_keys = list(missing)
+            missing_texts = [missing[key] for key in missing_keys]
+            batch_size = max(1, batch_size)
+            batches = [missing_texts[i : i + batch_size] for i in range(0, len(missing_texts), batch_size)]
+            tokenized = [
+                tokens
+                for batch in TeiHelper._map_concurrently(
+                    lambda batch: TeiHelper.invoke_tokenize(server_url, batch, headers, invoke_timeout, max_retries),
+                    batches,
+                )
+                for tokens in batch
+            ]
+            counted = {
+                key: TeiHelper._truncation_point(tokens, max_tokens)
+                for key, tokens in zip(missing_keys, tokenized)
+            }
+            for key, value in counted.items():
+                token_count_cache.put(key, value)
+            results = [result if result is not None else counted[key] for key, result in zip(keys, results)]
+        return results
+
+    @staticmethod
+    def _truncation_point(tokens: list[dict], max_tokens: int) -> tuple[int, Optional[int]]:
+        if len(tokens) <= max_tokens:
+            return len(tokens), None
+        content_tokens = [token for token in tokens if not token["special"]]
+        keep = max(0, max_tokens - (len(tokens) - len(content_tokens)))
+        # offsets returned by the server are utf-8 byte offsets
+        return len(tokens), content_tokens[keep - 1]["stop"] if keep else 0
+
+    @staticmethod
+    def _map_concurrently(func: Callable[[Any], Any], items: Sequence[Any]) -> list[Any]:
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(items))) as executor:
+            return list(executor.map(func, items))
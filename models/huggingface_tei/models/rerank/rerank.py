@@ -62,7 +62,14 @@ class HuggingfaceTeiRerankModel(RerankModel):
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
         try:
-            results = TeiHelper.invoke_rerank(server_url, query, docs, headers, invoke_timeout, max_retries)
+            # the server rejects requests with more texts than its max_client_batch_size
+            shard_size = TeiHelper.get_tei_extra_parameter(server_url, model, headers).max_client_batch_size
+        except RuntimeError:
+            shard_size = len(docs)
+        try:
+            results = TeiHelper.invoke_rerank_sharded(
+                server_url, query, docs, shard_size or len(docs), headers, invoke_timeout, max_retries
+            )
             rerank_documents = []
             for result in results:
                 rerank_document = RerankDocument(
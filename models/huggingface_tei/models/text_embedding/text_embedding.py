@@ -23,7 +23,7 @@ from dify_plugin.errors.model import (
     InvokeServerUnavailableError,
 )
 from dify_plugin.interfaces.model.text_embedding_model import TextEmbeddingModel
-from models.helper import TeiHelper
+from models.helper import TeiHelper, text_hash, token_count_cache
 
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_INVOKE_TIMEOUT = 60
@@ -69,30 +69,33 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
         context_size = self._get_context_size(model, credentials)
         max_chunks = self._get_max_chunks(model, credentials)
         inputs = []
-        indices = []
         used_tokens = 0
-        
-        # Use GPT2 tokenizer instead of server's /tokenize endpoint
-        for i, text in enumerate(texts):
-            num_tokens = self._get_num_tokens_by_gpt2(text)
-            if num_tokens >= context_size:
-                # If text is too long, truncate it based on character length ratio
-                cutoff = int(len(text) * (context_size / num_tokens))
-                inputs.append(text[0:cutoff])
-            else:
+
+        if credentials.get("server_side_tokenization") == "true":
+            # count and truncate with the model's own tokenizer
+            token_counts = TeiHelper.tokenize_for_truncation(
+                server_url, texts, context_size, max_chunks, headers, invoke_timeout, max_retries
+            )
+            for text, (num_tokens, cutoff) in zip(texts, token_counts):
+                if cutoff is not None:
+                    text = text.encode("utf-8")[:cutoff].decode("utf-8", errors="ignore")
                 inputs.append(text)
-            indices += [i]
-            used_tokens += num_tokens
-            
-        batched_embeddings = []
-        _iter = range(0, len(inputs), max_chunks)
+                used_tokens += min(num_tokens, context_size)
+        else:
+            # Use GPT2 tokenizer instead of server's /tokenize endpoint
+            for text, num_tokens in zip(texts, self.get_num_tokens(model, credentials, texts)):
+                if num_tokens >= context_size:
+                    # If text is too long, truncate it based on character length ratio
+                    cutoff = int(len(text) * (context_size / num_tokens))
+                    inputs.append(text[0:cutoff])
+                else:
+                    inputs.append(text)
+                used_tokens += num_tokens
+
         try:
-            for i in _iter:
-                iter_texts = inputs[i : i + max_chunks]
-                results = TeiHelper.invoke_embeddings(server_url, iter_texts, headers, invoke_timeout, max_retries)
-                embeddings = results["data"]
-                embeddings = [embedding["embedding"] for embedding in embeddings]
-                batched_embeddings.extend(embeddings)
+            batched_embeddings, _ = TeiHelper.invoke_embeddings_batched(
+                server_url, inputs, max_chunks, headers, invoke_timeout, max_retries
+            )
         except RuntimeError as e:
             raise InvokeServerUnavailableError(str(e))
         usage = self._calc_response_usage(
@@ -105,17 +108,36 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
 
     def get_num_tokens(self, model: str, credentials: dict, texts: list[str]) -> list[int]:
         """
-        Get number of tokens for given prompt messages using GPT2 tokenizer
+        Get number of tokens for given prompt messages using GPT2 tokenizer,
+        or the server's tokenizer when server side tokenization is enabled
 
         :param model: model name
         :param credentials: model credentials
         :param texts: texts to embed
         :return: list of token counts
         """
-        tokens = []
-        for text in texts:
-            tokens.append(self._get_num_tokens_by_gpt2(text))
-        return tokens
+        if credentials.get("server_side_tokenization") == "true":
+            headers = {"Content-Type": "application/json"}
+            api_key = credentials.get("api_key")
+            if api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+            token_counts = TeiHelper.tokenize_for_truncation(
+                credentials["server_url"].removesuffix("/"),
+                texts,
+                self._get_context_size(model, credentials),
+                self._get_max_chunks(model, credentials),
+                headers,
+                int(credentials.get("invoke_timeout") or DEFAULT_INVOKE_TIMEOUT),
+                int(credentials.get("max_retries") or DEFAULT_MAX_RETRIES),
+            )
+            return [num_tokens for num_tokens, _ in token_counts]
+
+        return [
+            token_count_cache.get_or_compute(
+                ("gpt2", text_hash(text)), lambda: self._get_num_tokens_by_gpt2(text)
+            )
+            for text in texts
+        ]
 
     def validate_credentials(self, model: str, credentials: dict) -> None:
         """
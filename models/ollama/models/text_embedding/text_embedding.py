@@ -1,7 +1,10 @@
 import json
 import logging
 import time
+from collections import OrderedDict
 from decimal import Decimal
+from hashlib import blake2b
+from threading import Lock
 from typing import Optional
 from urllib.parse import urljoin
 from dify_plugin import TextEmbeddingModel
@@ -34,6 +37,39 @@ from dify_plugin.errors.model import (
 logger = logging.getLogger(__name__)
 
 
+def text_hash(text: str) -> bytes:
+    return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class TokenCountCache:
+    """
+    Bounded, thread-safe LRU map of GPT2 token counts, keyed by text hash.
+    Model instances are created per request, so the cache lives in the module.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self._data: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: bytes, value: int) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+token_count_cache = TokenCountCache()
+
+
 class OllamaEmbeddingModel(TextEmbeddingModel):
     """
     Model class for an Ollama text embedding model.
@@ -63,24 +99,34 @@ class OllamaEmbeddingModel(TextEmbeddingModel):
             endpoint_url += "/"
         endpoint_url = urljoin(endpoint_url, "api/embed")
         context_size = self._get_context_size(model, credentials)
+        server_side_tokenization = credentials.get("server_side_tokenization") == "true"
         inputs = []
         used_tokens = 0
-        for text in texts:
-            num_tokens = self._get_num_tokens_by_gpt2(text)
-            if num_tokens >= context_size:
-                cutoff = int(np.floor(len(text) * (context_size / num_tokens)))
-                inputs.append(text[0:cutoff])
-            else:
+        if server_side_tokenization:
+            # ollama truncates to the context length and reports the tokens it evaluated
+            inputs = texts
+        else:
+            for text, num_tokens in zip(texts, self.get_num_tokens(model, credentials, texts)):
+                if num_tokens >= context_size:
+                    cutoff = int(np.floor(len(text) * (context_size / num_tokens)))
+                    text = text[0:cutoff]
+                    # only truncated inputs need counting again
+                    num_tokens = self.get_num_tokens(model, credentials, [text])[0]
                 inputs.append(text)
+                used_tokens += num_tokens
         payload = {"input": inputs, "model": model, "options": {"use_mmap": True}}
+        if server_side_tokenization:
+            payload["truncate"] = True
         response = requests.post(
             endpoint_url, headers=headers, data=json.dumps(payload), timeout=(10, 300)
         )
         response.raise_for_status()
         response_data = response.json()
         embeddings = response_data["embeddings"]
-        embedding_used_tokens = self.get_num_tokens(model, credentials, inputs)
-        used_tokens += sum(embedding_used_tokens)
+        if server_side_tokenization:
+            used_tokens = response_data.get("prompt_eval_count") or sum(
+                self.get_num_tokens(model, credentials, inputs)
+            )
         usage = self._calc_response_usage(
             model=model, credentials=credentials, tokens=used_tokens
         )
@@ -97,7 +143,16 @@ class OllamaEmbeddingModel(TextEmbeddingModel):
         :param texts: texts to embed
         :return:
         """
-        return [self._get_num_tokens_by_gpt2(text) for text in texts]
+        return [self._cached_num_tokens_by_gpt2(text) for text in texts]
+
+    def _cached_num_tokens_by_gpt2(self, text: str) -> int:
+        # bulk ingestion re-counts the same chunks, keep the counts of recent texts
+        key = text_hash(text)
+        num_tokens = token_count_cache.get(key)
+        if num_tokens is None:
+            num_tokens = self._get_num_tokens_by_gpt2(text)
+            token_count_cache.put(key, num_tokens)
+        return num_tokens
 
     def validate_credentials(self, model: str, credentials: dict) -> None:
         """
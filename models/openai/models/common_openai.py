@@ -1,11 +1,81 @@
+import threading
+from collections import OrderedDict
 from collections.abc import Mapping
+from typing import Optional
 
 import openai
-from httpx import Timeout
+from httpx import Limits, Timeout
+from openai import DefaultHttpxClient, OpenAI
 
 from dify_plugin.errors.model import InvokeAuthorizationError, InvokeBadRequestError, InvokeConnectionError, InvokeError, InvokeRateLimitError, InvokeServerUnavailableError
 
 
+class _OpenAIClientRegistry:
+    """
+    Process-wide registry of OpenAI clients.
+
+    Clients are keyed by the credential tuple (base url, api key, organization,
+    timeout, retries) and evicted in LRU order. All of them share one httpx
+    client, so TLS sessions and keep-alive connections survive across
+    invocations, threads and credential sets.
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._clients: OrderedDict[tuple, OpenAI] = OrderedDict()
+        self._lock = threading.Lock()
+        self._http_client: Optional[DefaultHttpxClient] = None
+
+    @staticmethod
+    def _key(credentials_kwargs: Mapping) -> tuple:
+        timeout = credentials_kwargs.get("timeout")
+        if isinstance(timeout, Timeout):
+            timeout = (timeout.connect, timeout.read, timeout.write, timeout.pool)
+        return (
+            credentials_kwargs.get("base_url"),
+            credentials_kwargs.get("api_key"),
+            credentials_kwargs.get("organization"),
+            timeout,
+            credentials_kwargs.get("max_retries"),
+        )
+
+    def _shared_http_client(self) -> DefaultHttpxClient:
+        if self._http_client is None:
+            self._http_client = DefaultHttpxClient(
+                limits=Limits(
+                    max_connections=1000,
+                    max_keepalive_connections=100,
+                    keepalive_expiry=60.0,
+                )
+            )
+        return self._http_client
+
+    def get(self, credentials_kwargs: Mapping) -> OpenAI:
+        key = self._key(credentials_kwargs)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = OpenAI(**credentials_kwargs, http_client=self._shared_http_client())
+            self._clients[key] = client
+            # evicted clients are only dropped, closing them would close the shared pool
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+            return client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+
+openai_client_registry = _OpenAIClientRegistry()
+
+
 class _CommonOpenAI:
     def _to_credential_kwargs(self, credentials: Mapping) -> dict:
         """
@@ -29,6 +99,15 @@ class _CommonOpenAI:
 
         return credentials_kwargs
 
+    def _get_client(self, credentials: Mapping) -> OpenAI:
+        """
+        Get a pooled client for the credentials
+
+        :param credentials:
+        :return:
+        """
+        return openai_client_registry.get(self._to_credential_kwargs(credentials))
+
     @property
     def _invoke_error_mapping(self) -> dict[type[InvokeError], list[type[Exception]]]:
         """
@@ -20,6 +20,12 @@ from openai.types.chat.chat_completion_chunk import (
 from openai.types.chat.chat_completion_message import FunctionCall
 
 from ..common_openai import _CommonOpenAI
+from ..token_counter import (
+    get_encoding,
+    num_tokens as count_tokens,
+    num_tokens_for_message,
+    num_tokens_for_tool,
+)
 
 from dify_plugin import LargeLanguageModel
 from dify_plugin.entities import I18nObject
@@ -465,11 +471,8 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         :param user: unique user id
         :return: full response or stream response chunk generator result
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-
-        # init model client
-        client = OpenAI(**credentials_kwargs)
+        # get pooled model client
+        client = self._get_client(credentials)
 
         extra_model_kwargs = {}
 
@@ -666,11 +669,8 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         :param user: unique user id
         :return: full response or stream response chunk generator result
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-
-        # init model client
-        client = OpenAI(**credentials_kwargs)
+        # get pooled model client
+        client = self._get_client(credentials)
 
         response_format = model_parameters.get("response_format")
         if response_format:
@@ -1330,12 +1330,9 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         :param tools: tools for tool calling
         :return: number of tokens
         """
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            encoding = tiktoken.get_encoding("cl100k_base")
+        encoding = get_encoding(model)
 
-        num_tokens = len(encoding.encode(text))
+        num_tokens = count_tokens(encoding, text)
 
         if tools:
             num_tokens += self._num_tokens_for_tools(encoding, tools)
@@ -1359,12 +1356,7 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         if model == "chatgpt-4o-latest" or model.startswith(("o1", "o3", "o4", "gpt-4.1", "gpt-4.5")):
             model = "gpt-4o"
 
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            logger.warning("Warning: model not found. Using cl100k_base encoding.")
-            encoding_name = "cl100k_base"
-            encoding = tiktoken.get_encoding(encoding_name)
+        encoding = get_encoding(model)
 
         if model.startswith("gpt-3.5-turbo-0301"):
             # every message follows <im_start>{role/name}\n{content}<im_end>\n
@@ -1389,36 +1381,7 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         messages_dict = [self._convert_prompt_message_to_dict(m) for m in messages]
         for message in messages_dict:
             num_tokens += tokens_per_message
-            for key, value in message.items():
-                # Cast str(value) in case the message value is not a string
-                # This occurs with function messages
-                # TODO: The current token calculation method for the image type is not implemented,
-                #  which need to download the image and then get the resolution for calculation,
-                #  and will increase the request delay
-                if isinstance(value, list):
-                    text = ""
-                    for item in value:
-                        if isinstance(item, dict) and item["type"] == "text":
-                            text += item["text"]
-
-                    value = text
-
-                if key == "tool_calls":
-                    for tool_call in value:
-                        for t_key, t_value in tool_call.items():  # type: ignore
-                            num_tokens += len(encoding.encode(t_key))
-                            if t_key == "function":
-                                for f_key, f_value in t_value.items():
-                                    num_tokens += len(encoding.encode(f_key))
-                                    num_tokens += len(encoding.encode(f_value))
-                            else:
-                                num_tokens += len(encoding.encode(t_key))
-                                num_tokens += len(encoding.encode(t_value))
-                else:
-                    num_tokens += len(encoding.encode(str(value)))
-
-                if key == "name":
-                    num_tokens += tokens_per_name
+            num_tokens += num_tokens_for_message(encoding, message, tokens_per_name)
 
         # every reply is primed with <im_start>assistant
         num_tokens += 3
@@ -1438,43 +1401,17 @@ class OpenAILargeLanguageModel(_CommonOpenAI, LargeLanguageModel):
         :param tools: tools for tool calling
         :return: number of tokens
         """
-        num_tokens = 0
-        for tool in tools:
-            num_tokens += len(encoding.encode("type"))
-            num_tokens += len(encoding.encode("function"))
-
-            # calculate num tokens for function object
-            num_tokens += len(encoding.encode("name"))
-            num_tokens += len(encoding.encode(tool.name))
-            num_tokens += len(encoding.encode("description"))
-            num_tokens += len(encoding.encode(tool.description))
-            parameters = tool.parameters
-            num_tokens += len(encoding.encode("parameters"))
-            if "title" in parameters:
-                num_tokens += len(encoding.encode("title"))
-                num_tokens += len(encoding.encode(parameters.get("title")))  # type: ignore
-            num_tokens += len(encoding.encode("type"))
-            num_tokens += len(encoding.encode(parameters.get("type")))  # type: ignore
-            if "properties" in parameters:
-                num_tokens += len(encoding.encode("properties"))
-                for key, value in parameters.get("properties").items():  # type: ignore
-                    num_tokens += len(encoding.encode(key))
-                    for field_key, field_value in value.items():
-                        num_tokens += len(encoding.encode(field_key))
-                        if field_key == "enum":
-                            for enum_field in field_value:
-                                num_tokens += 3
-                                num_tokens += len(encoding.encode(enum_field))
-                        else:
-                            num_tokens += len(encoding.encode(field_key))
-                            num_tokens += len(encoding.encode(str(field_value)))
-            if "required" in parameters:
-                num_tokens += len(encoding.encode("required"))
-                for required_field in parameters["required"]:
-                    num_tokens += 3
-                    num_tokens += len(encoding.encode(required_field))
-
-        return num_tokens
+        return sum(
+            num_tokens_for_tool(
+                encoding,
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.parameters,
+                },
+            )
+            for tool in tools
+        )
 
     def get_customizable_model_schema(
         self, model: str, credentials: dict
@@ -25,11 +25,8 @@ class OpenAIModerationModel(_CommonOpenAI, ModerationModel):
         :param user: unique user id
         :return: false if text is safe, true otherwise
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-
-        # init model client
-        client = OpenAI(**credentials_kwargs)
+        # get pooled model client
+        client = self._get_client(credentials)
 
         # chars per chunk
         length = self._get_max_characters_per_chunk(model, credentials)
@@ -1,11 +1,42 @@
+import concurrent.futures
+import logging
+import os
+import re
+import subprocess
+import wave
+from collections.abc import Generator
+from io import BytesIO
 from typing import IO, Optional
 
-from openai import OpenAI
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+from pydub.silence import detect_silence
+from pydub.utils import audioop
 
 from dify_plugin import Speech2TextModel
 from dify_plugin.errors.model import CredentialsValidateFailedError
 from ..common_openai import _CommonOpenAI
 
+logger = logging.getLogger(__name__)
+
+# files above this size are transcribed in segments, the API rejects uploads over 25 MB
+LONG_AUDIO_MIN_BYTES = 8 * 1024 * 1024
+# long audio is decoded to 16 kHz mono 16 bit, what the transcription models work on
+LONG_AUDIO_FRAME_RATE = 16000
+# frames of a wav file converted at a time
+WAV_READ_FRAMES = 64 * 1024
+# target segment length, a 16 kHz mono wav of this length is about 9.6 MB
+LONG_AUDIO_SEGMENT_MS = 5 * 60 * 1000
+# audio shared by two neighbouring segments, the duplicated words are stitched away
+LONG_AUDIO_OVERLAP_MS = 1500
+# how far before the target cut to look for a pause
+SILENCE_SEARCH_MS = 30 * 1000
+SILENCE_MIN_MS = 300
+MAX_CONCURRENT_SEGMENTS = 4
+# longest run of words that is checked for duplication across a segment boundary
+MAX_OVERLAP_WORDS = 30
+
+
 class OpenAISpeech2TextModel(_CommonOpenAI, Speech2TextModel):
     """
     Model class for OpenAI Speech to text model.
@@ -23,7 +54,7 @@ class OpenAISpeech2TextModel(_CommonOpenAI, Speech2TextModel):
         :param user: unique user id
         :return: text for given audio file
         """
-        return self._speech2text_invoke(model, credentials, file)
+        return "".join(self._speech2text_invoke_streaming(model, credentials, file))
 
     def validate_credentials(self, model: str, credentials: dict) -> None:
         """
@@ -50,12 +81,242 @@ class OpenAISpeech2TextModel(_CommonOpenAI, Speech2TextModel):
         :param file: audio file
         :return: text for given audio file
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-
-        # init model client
-        client = OpenAI(**credentials_kwargs)
+        # get pooled model client
+        client = self._get_client(credentials)
 
         response = client.audio.transcriptions.create(model=model, file=file)
 
         return response.text
+
+    def _speech2text_invoke_streaming(
+        self, model: str, credentials: dict, file: IO[bytes]
+    ) -> Generator[str, None, None]:
+        """
+        Invoke speech2text model, transcribing long audio in concurrent segments
+
+        Short files are sent in a single request. Long files are decoded, cut at
+        pauses into overlapping segments and transcribed on a bounded pool; the
+        text of each segment is yielded in order as soon as it and all segments
+        before it have finished, with the words repeated in the overlap removed.
+
+        :param model: model name
+        :param credentials: model credentials
+        :param file: audio file
+        :return: text pieces for given audio file, in order
+        """
+        if self._get_file_size(file) <= LONG_AUDIO_MIN_BYTES:
+            yield self._speech2text_invoke(model, credentials, file)
+            return
+
+        try:
+            audio = self._load_audio(file)
+        except Exception as ex:
+            logger.warning(f"Failed to decode long audio, sending it as a whole: {ex}")
+            file.seek(0)
+            yield self._speech2text_invoke(model, credentials, file)
+            return
+
+        boundaries = self._split_audio(audio)
+        if len(boundaries) == 1:
+            file.seek(0)
+            yield self._speech2text_invoke(model, credentials, file)
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(MAX_CONCURRENT_SEGMENTS, len(boundaries))
+        )
+        try:
+            futures = {
+                executor.submit(
+                    self._transcribe_segment, model, credentials, audio, start, end, index
+                ): index
+                for index, (start, end) in enumerate(boundaries)
+            }
+            finished: dict[int, str] = {}
+            next_index = 0
+            previous_text = ""
+            for future in concurrent.futures.as_completed(futures):
+                finished[futures[future]] = future.result()
+                while next_index in finished:
+                    text = self._strip_overlap(previous_text, finished.pop(next_index))
+                    if text:
+                        yield text if not previous_text else " " + text
+                        previous_text = text
+                    next_index += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _transcribe_segment(
+        self, model: str, credentials: dict, audio: AudioSegment, start: int, end: int, index: int
+    ) -> str:
+        """
+        Transcribe one segment of a long audio file
+
+        The segment is cut from the decoded audio here, so that only the
+        segments being transcribed are copied out of it at a time.
+
+        :param model: model name
+        :param credentials: model credentials
+        :param audio: decoded audio of the whole file
+        :param start: start of the segment in milliseconds
+        :param end: end of the segment in milliseconds
+        :param index: position of the segment, used as file name
+        :return: text of the segment
+        """
+        buffer = BytesIO()
+        audio[start:end].export(buffer, format="wav")
+
+        client = self._get_client(credentials)
+        response = client.audio.transcriptions.create(
+            model=model, file=(f"segment_{index}.wav", buffer.getvalue(), "audio/wav")
+        )
+
+        return response.text.strip()
+
+    @staticmethod
+    def _get_file_size(file: IO[bytes]) -> int:
+        if not file.seekable():
+            return 0
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+        return size - position
+
+    @staticmethod
+    def _load_audio(file: IO[bytes]) -> AudioSegment:
+        """
+        Decode the audio to 16 kHz mono, which is what the transcription models
+        work on and keeps wav segments below the upload limit. The audio is
+        downmixed while it is decoded, the full rate samples are never held at once.
+        """
+        position = file.tell()
+        header = file.read(12)
+        file.seek(position)
+        # wav is read directly, everything else goes through ffmpeg
+        if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+            try:
+                return OpenAISpeech2TextModel._read_wav(file)
+            except (wave.Error, EOFError):
+                # sample formats the wave module does not read, such as float
+                file.seek(position)
+
+        return OpenAISpeech2TextModel._decode_with_ffmpeg(file)
+
+    @staticmethod
+    def _read_wav(file: IO[bytes]) -> AudioSegment:
+        """
+        Read a pcm wav file block by block, converting each block to 16 kHz mono 16 bit
+        """
+        blocks = []
+        rate_state = None
+        with wave.open(file) as wav_file:
+            channels = wav_file.getnchannels()
+            sample_width = wav_file.getsampwidth()
+            frame_rate = wav_file.getframerate()
+            while frames := wav_file.readframes(WAV_READ_FRAMES):
+                if sample_width == 1:
+                    # 8 bit wav samples are unsigned
+                    frames = audioop.bias(frames, 1, -128)
+                if sample_width != 2:
+                    frames = audioop.lin2lin(frames, sample_width, 2)
+                if channels != 1:
+                    frames = AudioSegment(
+                        data=frames, sample_width=2, frame_rate=frame_rate, channels=channels
+                    ).set_channels(1).raw_data
+                if frame_rate != LONG_AUDIO_FRAME_RATE:
+                    # the converter state carries over, blocks join without clicks
+                    frames, rate_state = audioop.ratecv(
+                        frames, 2, 1, frame_rate, LONG_AUDIO_FRAME_RATE, rate_state
+                    )
+                blocks.append(frames)
+
+        return AudioSegment(
+            data=b"".join(blocks), sample_width=2, frame_rate=LONG_AUDIO_FRAME_RATE, channels=1
+        )
+
+    @staticmethod
+    def _decode_with_ffmpeg(file: IO[bytes]) -> AudioSegment:
+        """
+        Decode any format ffmpeg reads, letting ffmpeg resample and downmix to 16 kHz mono 16 bit
+        """
+        conversion_command = [
+            AudioSegment.converter,
+            "-nostdin",
+            # cached so that containers with their index at the end can be read from a pipe
+            "-i", "cache:pipe:0",
+            "-vn",
+            "-ac", "1",
+            "-ar", str(LONG_AUDIO_FRAME_RATE),
+            "-f", "s16le",
+            "-",
+        ]
+        process = subprocess.run(conversion_command, input=file.read(), capture_output=True)
+        if process.returncode != 0 or not process.stdout:
+            raise CouldntDecodeError(
+                f"Decoding failed. ffmpeg returned error code: {process.returncode}\n\n"
+                f"{process.stderr.decode(errors='ignore')}"
+            )
+
+        return AudioSegment(
+            data=process.stdout, sample_width=2, frame_rate=LONG_AUDIO_FRAME_RATE, channels=1
+        )
+
+    @staticmethod
+    def _split_audio(audio: AudioSegment) -> list[tuple[int, int]]:
+        """
+        Cut the audio into segments of at most LONG_AUDIO_SEGMENT_MS, preferring
+        the last pause before each target cut
+
+        :param audio: decoded audio
+        :return: (start, end) of each segment in milliseconds, overlapping by
+            LONG_AUDIO_OVERLAP_MS
+        """
+        duration = len(audio)
+        silence_threshold = audio.dBFS - 16
+        boundaries = []
+        start = 0
+        while True:
+            target = start + LONG_AUDIO_SEGMENT_MS
+            if target >= duration:
+                boundaries.append((start, duration))
+                return boundaries
+
+            window_start = max(start + LONG_AUDIO_SEGMENT_MS // 2, target - SILENCE_SEARCH_MS)
+            silences = detect_silence(
+                audio[window_start:target],
+                min_silence_len=SILENCE_MIN_MS,
+                silence_thresh=silence_threshold,
+                seek_step=10,
+            )
+            if silences:
+                silence_start, silence_end = silences[-1]
+                end = window_start + (silence_start + silence_end) // 2
+            else:
+                end = target
+
+            boundaries.append((start, end))
+            start = max(end - LONG_AUDIO_OVERLAP_MS, start + 1)
+
+    @staticmethod
+    def _strip_overlap(previous_text: str, text: str) -> str:
+        """
+        Drop the leading words of a segment that repeat the end of the previous one
+
+        :param previous_text: text of the previous segment
+        :param text: text of the current segment
+        :return: text of the current segment without the repeated words
+        """
+        words = text.split()
+        if not previous_text or not words:
+            return text
+
+        def normalize(word: str) -> str:
+            return re.sub(r"[^\w]", "", word.lower())
+
+        previous_words = [normalize(word) for word in previous_text.split()[-MAX_OVERLAP_WORDS:]]
+        current_words = [normalize(word) for word in words[:MAX_OVERLAP_WORDS]]
+        for size in range(min(len(previous_words), len(current_words)), 0, -1):
+            if previous_words[-size:] == current_words[:size]:
+                return " ".join(words[size:])
+
+        return text
@@ -1,9 +1,11 @@
 import base64
+import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Union
 
 import numpy as np
-import tiktoken
 from dify_plugin import TextEmbeddingModel
 from dify_plugin.entities.model import EmbeddingInputType, PriceType
 from dify_plugin.entities.model.text_embedding import (
@@ -14,6 +16,10 @@ from dify_plugin.errors.model import CredentialsValidateFailedError
 from openai import OpenAI
 
 from ..common_openai import _CommonOpenAI
+from ..token_counter import get_encoding, num_tokens
+
+# upper bound of embedding requests in flight for one invocation
+MAX_CONCURRENT_BATCHES = 4
 
 
 class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
@@ -38,10 +44,8 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
         :param user: unique user id
         :return: embeddings result
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-        # init model client
-        client = OpenAI(**credentials_kwargs)
+        # get pooled model client
+        client = self._get_client(credentials)
 
         extra_model_kwargs = {}
         if user:
@@ -53,15 +57,10 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
         context_size = self._get_context_size(model, credentials)
         max_chunks = self._get_max_chunks(model, credentials)
 
-        embeddings: list[list[float]] = [[] for _ in range(len(texts))]
         tokens = []
         indices = []
-        used_tokens = 0
 
-        try:
-            enc = tiktoken.encoding_for_model(model)
-        except KeyError:
-            enc = tiktoken.get_encoding("cl100k_base")
+        enc = get_encoding(model)
 
         for i, text in enumerate(texts):
             token = enc.encode(text)
@@ -69,45 +68,50 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
                 tokens += [token[j : j + context_size]]
                 indices += [i]
 
-        batched_embeddings = []
-        _iter = range(0, len(tokens), max_chunks)
+        # one row per chunk, filled in place as batches complete
+        batched_embeddings, used_tokens = self._embedding_invoke_batches(
+            model=model,
+            client=client,
+            tokens=tokens,
+            max_chunks=max_chunks,
+            extra_model_kwargs=extra_model_kwargs,
+        )
 
-        for i in _iter:
-            # call embedding model
+        # token-weighted average of the chunks of each text
+        averages = None
+        if tokens:
+            chunk_indices = np.asarray(indices)
+            weights = np.fromiter((len(token) for token in tokens), dtype=np.float64)
+            # chunks of one text are contiguous, so every text is one reduceat segment
+            starts = np.flatnonzero(np.r_[True, chunk_indices[1:] != chunk_indices[:-1]])
+            sums = np.add.reduceat(batched_embeddings * weights[:, None], starts, axis=0)
+            sums /= np.add.reduceat(weights, starts)[:, None]
+            averages = np.empty((len(texts), sums.shape[1]), dtype=np.float64)
+            averages[chunk_indices[starts]] = sums
+
+        empty_texts = sorted(set(range(len(texts))) - set(indices))
+        if empty_texts:
+            # texts without tokens all get the embedding of the empty string
             embeddings_batch, embedding_used_tokens = self._embedding_invoke(
                 model=model,
                 client=client,
-                texts=tokens[i : i + max_chunks],
+                texts="",
                 extra_model_kwargs=extra_model_kwargs,
             )
-
             used_tokens += embedding_used_tokens
-            batched_embeddings += embeddings_batch
-
-        results: list[list[list[float]]] = [[] for _ in range(len(texts))]
-        num_tokens_in_batch: list[list[int]] = [[] for _ in range(len(texts))]
-        for i in range(len(indices)):
-            results[indices[i]].append(batched_embeddings[i])
-            num_tokens_in_batch[indices[i]].append(len(tokens[i]))
-
-        for i in range(len(texts)):
-            _result = results[i]
-            if len(_result) == 0:
-                embeddings_batch, embedding_used_tokens = self._embedding_invoke(
-                    model=model,
-                    client=client,
-                    texts="",
-                    extra_model_kwargs=extra_model_kwargs,
+            if averages is None:
+                averages = np.empty(
+                    (len(texts), embeddings_batch.shape[1]), dtype=np.float64
                 )
+            averages[empty_texts] = embeddings_batch[0]
 
-                used_tokens += embedding_used_tokens
-                average = embeddings_batch[0]
-            else:
-                average = np.average(_result, axis=0, weights=num_tokens_in_batch[i])
-            embedding = (average / np.linalg.norm(average)).tolist()  # type: ignore
-            if np.isnan(embedding).any():
+        if averages is None:
+            embeddings: list[list[float]] = []
+        else:
+            normalized = averages / np.linalg.norm(averages, axis=1, keepdims=True)
+            if np.isnan(normalized).any():
                 raise ValueError("Normalized embedding is nan please try again")
-            embeddings[i] = embedding
+            embeddings = normalized.tolist()
 
         # calc usage
         usage = self._calc_response_usage(
@@ -130,16 +134,12 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
         if len(texts) == 0:
             return []
 
-        try:
-            enc = tiktoken.encoding_for_model(model)
-        except KeyError:
-            enc = tiktoken.get_encoding("cl100k_base")
+        enc = get_encoding(model)
 
         total_num_tokens = []
         for text in texts:
             # calculate the number of tokens in the encoded text
-            tokenized_text = enc.encode(text)
-            total_num_tokens.append(len(tokenized_text))
+            total_num_tokens.append(num_tokens(enc, text))
 
         return total_num_tokens
 
@@ -163,13 +163,80 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
         except Exception as ex:
             raise CredentialsValidateFailedError(str(ex))
 
+    def _embedding_invoke_batches(
+        self,
+        model: str,
+        client: OpenAI,
+        tokens: list[list[int]],
+        max_chunks: int,
+        extra_model_kwargs: dict,
+    ) -> tuple[np.ndarray, int]:
+        """
+        Invoke embedding model for all chunks, up to MAX_CONCURRENT_BATCHES
+        batches in flight at a time
+
+        :param model: model name
+        :param client: model client
+        :param tokens: token chunks to embed
+        :param max_chunks: max chunks per request
+        :param extra_model_kwargs: extra model kwargs
+        :return: float32 matrix with one row per chunk and used tokens
+        """
+        if not tokens:
+            return np.empty((0, 0), dtype=np.float32), 0
+
+        batch_starts = range(0, len(tokens), max_chunks)
+        matrix: Optional[np.ndarray] = None
+        matrix_lock = threading.Lock()
+        used_tokens = 0
+
+        def _invoke_batch(start: int) -> int:
+            batch = tokens[start : start + max_chunks]
+
+            def _rows(dimensions: int) -> np.ndarray:
+                # the matrix is sized by the first response to arrive
+                nonlocal matrix
+                with matrix_lock:
+                    if matrix is None:
+                        matrix = np.empty((len(tokens), dimensions), dtype=np.float32)
+                return matrix[start : start + len(batch)]
+
+            _, embedding_used_tokens = self._embedding_invoke(
+                model=model,
+                client=client,
+                texts=batch,
+                extra_model_kwargs=extra_model_kwargs,
+                allocate=_rows,
+            )
+            return embedding_used_tokens
+
+        if len(batch_starts) == 1:
+            results = iter([_invoke_batch(0)])
+            executor = None
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=min(MAX_CONCURRENT_BATCHES, len(batch_starts))
+            )
+            futures = [executor.submit(_invoke_batch, start) for start in batch_starts]
+            results = (future.result() for future in as_completed(futures))
+
+        try:
+            for embedding_used_tokens in results:
+                used_tokens += embedding_used_tokens
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return matrix, used_tokens
+
     def _embedding_invoke(
         self,
         model: str,
         client: OpenAI,
-        texts: Union[list[str], str],
+        texts: Union[list[str], list[list[int]], str],
         extra_model_kwargs: dict,
-    ) -> tuple[list[list[float]], int]:
+        allocate: Optional[Callable[[int], np.ndarray]] = None,
+    ) -> tuple[np.ndarray, int]:
         """
         Invoke embedding model
 
@@ -177,7 +244,9 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
         :param client: model client
         :param texts: texts to embed
         :param extra_model_kwargs: extra model kwargs
-        :return: embeddings and used tokens
+        :param allocate: returns the float32 rows to decode into, given the
+            embedding dimensions; defaults to a new matrix
+        :return: float32 embeddings, one row per input, and used tokens
         """
         # call embedding model
         response = client.embeddings.create(
@@ -186,22 +255,25 @@ class OpenAITextEmbeddingModel(_CommonOpenAI, TextEmbeddingModel):
             **extra_model_kwargs,
         )
 
-        if (
-            "encoding_format" in extra_model_kwargs
-            and extra_model_kwargs["encoding_format"] == "base64"
-        ):
-            # decode base64 embedding
-            return (
-                [
-                    list(
-                        np.frombuffer(base64.b64decode(data.embedding), dtype="float32")
-                    )
-                    for data in response.data
-                ],  # type: ignore
-                response.usage.total_tokens,
-            )
+        base64_encoded = extra_model_kwargs.get("encoding_format") == "base64"
+        rows: Optional[np.ndarray] = None
+        for i, data in enumerate(response.data):
+            if base64_encoded:
+                # decode base64 embedding without going through python floats
+                embedding = np.frombuffer(base64.b64decode(data.embedding), dtype=np.float32)
+            else:
+                embedding = np.asarray(data.embedding, dtype=np.float32)
+            if rows is None:
+                rows = (
+                    allocate(len(embedding))
+                    if allocate
+                    else np.empty((len(response.data), len(embedding)), dtype=np.float32)
+                )
+            rows[i] = embedding
 
-        return [data.embedding for data in response.data], response.usage.total_tokens
+        if rows is None:
+            rows = np.empty((0, 0), dtype=np.float32)
+        return rows, response.usage.total_tokens
 
     def _calc_response_usage(
         self, model: str, credentials: dict, tokens: int
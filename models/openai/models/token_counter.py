@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from functools import lru_cache
+from typing import Any
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# keys of the tool schema that are counted for every tool
+_TOOL_SCHEMA_KEYS = (
+    "type",
+    "function",
+    "name",
+    "description",
+    "parameters",
+    "title",
+    "properties",
+    "required",
+)
+
+
+class _LRUCache:
+    """
+    Bounded, thread-safe LRU map from content hash to token count.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._data: OrderedDict[tuple, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], int]) -> int:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                return value
+
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_message_token_cache = _LRUCache()
+_tool_token_cache = _LRUCache()
+_text_token_cache = _LRUCache()
+
+# texts shorter than this are counted directly, hashing would cost about as much
+_MIN_MEMOIZED_TEXT_LENGTH = 256
+
+
+def _content_hash(payload: Any) -> bytes:
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Resolve the tiktoken encoding of a model once, falling back to cl100k_base.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning(f"Model {model} not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=None)
+def constant_token_counts(encoding_name: str) -> Mapping[str, int]:
+    """
+    Token counts of the fixed tool schema keys for an encoding.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    return {key: len(encoding.encode(key)) for key in _TOOL_SCHEMA_KEYS}
+
+
+def num_tokens(encoding: tiktoken.Encoding, text: str) -> int:
+    """
+    Count the tokens of a text, memoizing long texts by content hash.
+    """
+    if len(text) < _MIN_MEMOIZED_TEXT_LENGTH:
+        return len(encoding.encode(text))
+    return _text_token_cache.get_or_compute(
+        (encoding.name, _content_hash(text)), lambda: len(encoding.encode(text))
+    )
+
+
+def num_tokens_for_message(
+    encoding: tiktoken.Encoding, message: Mapping[str, Any], tokens_per_name: int
+) -> int:
+    """
+    Count the tokens of one message dict, excluding the per-message overhead.
+    """
+
+    def compute() -> int:
+        count = 0
+        for key, value in message.items():
+            # Cast str(value) in case the message value is not a string
+            # This occurs with function messages
+            # TODO: The current token calculation method for the image type is not implemented,
+            #  which need to download the image and then get the resolution for calculation,
+            #  and will increase the request delay
+            if isinstance(value, list):
+                text = ""
+                for item in value:
+                    if isinstance(item, dict) and item["type"] == "text":
+                        text += item["text"]
+
+                value = text
+
+            if key == "tool_calls":
+                for tool_call in value:
+                    for t_key, t_value in tool_call.items():  # type: ignore
+                        count += len(encoding.encode(t_key))
+                        if t_key == "function":
+                            for f_key, f_value in t_value.items():
+                                count += len(encoding.encode(f_key))
+                                count += len(encoding.encode(f_value))
+                        else:
+                            count += len(encoding.encode(t_key))
+                            count += len(encoding.encode(t_value))
+            else:
+                count += len(encoding.encode(str(value)))
+
+            if key == "name":
+                count += tokens_per_name
+        return count
+
+    return _message_token_cache.get_or_compute(
+        (encoding.name, tokens_per_name, _content_hash(message)), compute
+    )
+
+
+def num_tokens_for_tool(encoding: tiktoken.Encoding, tool: Mapping[str, Any]) -> int:
+    """
+    Count the tokens of one tool schema, given as a dict with name,
+    description and parameters.
+    """
+
+    def compute() -> int:
+        constants = constant_token_counts(encoding.name)
+        count = constants["type"] + constants["function"]
+
+        # calculate num tokens for function object
+        count += constants["name"]
+        count += len(encoding.encode(tool["name"]))
+        count += constants["description"]
+        count += len(encoding.encode(tool["description"]))
+        parameters = tool["parameters"]
+        count += constants["parameters"]
+        if "title" in parameters:
+            count += constants["title"]
+            count += len(encoding.encode(parameters.get("title")))  # type: ignore
+        count += constants["type"]
+        count += len(encoding.encode(parameters.get("type")))  # type: ignore
+        if "properties" in parameters:
+            count += constants["properties"]
+            for key, value in parameters.get("properties").items():  # type: ignore
+                count += len(encoding.encode(key))
+                for field_key, field_value in value.items():
+                    count += len(encoding.encode(field_key))
+                    if field_key == "enum":
+                        for enum_field in field_value:
+                            count += 3
+                            count += len(encoding.encode(enum_field))
+                    else:
+                        count += len(encoding.encode(field_key))
+                        count += len(encoding.encode(str(field_value)))
+        if "required" in parameters:
+            count += constants["required"]
+            for required_field in parameters["required"]:
+                count += 3
+                count += len(encoding.encode(required_field))
+        return count
+
+    return _tool_token_cache.get_or_compute(
+        (encoding.name, _content_hash(tool)), compute
+    )
@@ -1,11 +1,11 @@
-from collections.abc import Generator
+from collections import deque
+from collections.abc import Generator, Iterable, Iterator
 import concurrent.futures
-from functools import reduce
-from io import BytesIO
+import queue
+import threading
 from typing import Optional
 
 from openai import OpenAI
-from pydub import AudioSegment
 
 from dify_plugin import TTSModel
 from dify_plugin.errors.model import (
@@ -14,6 +14,9 @@ from dify_plugin.errors.model import (
 )
 from ..common_openai import _CommonOpenAI
 
+# sentence requests in flight while streaming, the head one plus the prefetched ones
+STREAMING_WINDOW = 3
+
 
 class OpenAIText2SpeechModel(_CommonOpenAI, TTSModel):
     """
@@ -86,52 +89,25 @@ class OpenAIText2SpeechModel(_CommonOpenAI, TTSModel):
         :param voice: model timbre
         :return: text translated to audio file
         """
-        audio_type = self._get_model_audio_type(model, credentials)
         word_limit = self._get_model_word_limit(model, credentials) or 500
-        max_workers = self._get_model_workers_limit(model, credentials)
+        max_workers = self._get_model_workers_limit(model, credentials) or 1
         try:
-            sentences = list(
-                self._split_text_into_sentences(
-                    org_text=content_text, max_length=word_limit
+            sentences = self._split_text_into_sentences(
+                org_text=content_text, max_length=word_limit
+            )
+            audio_bytes = b"".join(
+                self._iter_sentences_audio(
+                    model=model,
+                    credentials=credentials,
+                    sentences=sentences,
+                    voice=voice,
+                    window=max_workers,
                 )
             )
-            audio_bytes_list = []
-
-            # Create a thread pool and map the function to the list of sentences
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=max_workers
-            ) as executor:
-                futures = [
-                    executor.submit(
-                        self._process_sentence,
-                        sentence=sentence,
-                        model=model,
-                        voice=voice,
-                        credentials=credentials,
-                    )
-                    for sentence in sentences
-                ]
-                for future in futures:
-                    try:
-                        if future.result():
-                            audio_bytes_list.append(future.result())
-                    except Exception as ex:
-                        raise InvokeBadRequestError(str(ex))
-
-            if len(audio_bytes_list) > 0:
-                audio_segments = [
-                    AudioSegment.from_file(BytesIO(audio_bytes), format=audio_type)
-                    for audio_bytes in audio_bytes_list
-                    if audio_bytes
-                ]
-                combined_segment = reduce(lambda x, y: x + y, audio_segments)
-                buffer: BytesIO = BytesIO()
-                combined_segment.export(buffer, format=audio_type)
-                buffer.seek(0)
-
-                return buffer.read()
-            else:
+            if not audio_bytes:
                 raise InvokeBadRequestError("No audio bytes found")
+
+            return audio_bytes
         except Exception as ex:
             raise InvokeBadRequestError(str(ex))
 
@@ -149,14 +125,11 @@ class OpenAIText2SpeechModel(_CommonOpenAI, TTSModel):
         """
         try:
             # doc: https://platform.openai.com/docs/guides/text-to-speech
-            credentials_kwargs = self._to_credential_kwargs(credentials)
-            client = OpenAI(**credentials_kwargs)
-
             voices = self.get_tts_model_voices(model=model, credentials=credentials)
             if not voices:
                 raise InvokeBadRequestError("No voices found for the model")
 
-            if not voice or voice not in voices:
+            if not voice or voice not in [d["value"] for d in voices]:
                 voice = self._get_model_default_voice(model, credentials)
 
             word_limit = self._get_model_word_limit(model, credentials) or 500
@@ -164,49 +137,147 @@ class OpenAIText2SpeechModel(_CommonOpenAI, TTSModel):
                 sentences = self._split_text_into_sentences(
                     content_text, max_length=word_limit
                 )
-                executor = concurrent.futures.ThreadPoolExecutor(
-                    max_workers=min(3, len(sentences))
-                )
-                futures = [
-                    executor.submit(
-                        client.audio.speech.with_streaming_response.create,
-                        model=model,
-                        response_format="mp3",
-                        input=sentences[i],
-                        voice=voice,  # type: ignore
-                    )
-                    for i in range(len(sentences))
-                ]
-                for index, future in enumerate(futures):
-                    yield from future.result().__enter__().iter_bytes(1024)
-
             else:
-                response = client.audio.speech.with_streaming_response.create(
-                    model=model,
-                    voice=voice,  # type: ignore
-                    response_format="mp3",
-                    input=content_text.strip(),
-                )
+                sentences = [content_text]
 
-                yield from response.__enter__().iter_bytes(1024)
+            yield from self._iter_sentences_audio(
+                model=model,
+                credentials=credentials,
+                sentences=sentences,
+                voice=voice,
+                window=STREAMING_WINDOW,
+            )
         except Exception as ex:
             raise InvokeBadRequestError(str(ex))
 
-    def _process_sentence(self, sentence: str, model: str, voice, credentials: dict):
+    def _iter_sentences_audio(
+        self,
+        model: str,
+        credentials: dict,
+        sentences: Iterable[str],
+        voice: str,
+        window: int,
+    ) -> Generator[bytes, None, None]:
         """
-        _tts_invoke openai text2speech model api
+        Synthesize sentences with a sliding window of in-flight requests
+
+        At most `window` sentences are requested at a time: the head sentence is
+        forwarded chunk by chunk as it arrives while the following ones are
+        prefetched, so the first bytes and the buffered audio do not depend on
+        the length of the text. The MP3 streams are concatenated frame-wise,
+        dropping the ID3 tag of every sentence but the first.
 
         :param model: model name
         :param credentials: model credentials
+        :param sentences: text split into sentences
         :param voice: model timbre
-        :param sentence: text content to be translated
-        :return: text translated to audio file
+        :param window: maximum number of in-flight sentence requests
+        :return: mp3 audio, in sentence order
         """
-        # transform credentials to kwargs for model instance
-        credentials_kwargs = self._to_credential_kwargs(credentials)
-        client = OpenAI(**credentials_kwargs)
-        response = client.audio.speech.create(
-            model=model, voice=voice, input=sentence.strip()
-        )
-        if isinstance(response.read(), bytes):
-            return response.read()
+        # get pooled model client, shared by all sentences
+        client = self._get_client(credentials)
+        sentences = iter([sentence.strip() for sentence in sentences if sentence.strip()])
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, window))
+        cancelled = threading.Event()
+        pending: deque[queue.Queue] = deque()
+
+        def submit_next() -> None:
+            sentence = next(sentences, None)
+            if sentence is None:
+                return
+            chunks: queue.Queue = queue.Queue()
+            executor.submit(
+                self._fetch_sentence_audio,
+                client,
+                model,
+                voice,
+                sentence,
+                chunks,
+                cancelled,
+            )
+            pending.append(chunks)
+
+        try:
+            for _ in range(max(1, window)):
+                submit_next()
+
+            first = True
+            while pending:
+                chunks = pending.popleft()
+                submit_next()
+
+                audio = self._iter_queue(chunks)
+                yield from audio if first else self._strip_id3_tag(audio)
+                first = False
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _fetch_sentence_audio(
+        client: OpenAI,
+        model: str,
+        voice: str,
+        sentence: str,
+        chunks: queue.Queue,
+        cancelled: threading.Event,
+    ) -> None:
+        """
+        Stream the audio of one sentence into a queue, ended by None
+        """
+        try:
+            with client.audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,  # type: ignore
+                response_format="mp3",
+                input=sentence,
+            ) as response:
+                for chunk in response.iter_bytes(1024):
+                    if cancelled.is_set():
+                        return
+                    chunks.put(chunk)
+        except Exception as ex:
+            chunks.put(ex)
+        finally:
+            chunks.put(None)
+
+    @staticmethod
+    def _iter_queue(chunks: queue.Queue) -> Generator[bytes, None, None]:
+        while (chunk := chunks.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    @staticmethod
+    def _strip_id3_tag(
+        chunks: Iterator[bytes],
+    ) -> Generator[bytes, None, None]:
+        """
+        Drop a leading ID3v2 tag from an mp3 stream, so that it can be appended
+        to another one frame by frame
+        """
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 10:
+                break
+
+        skip = 0
+        if head[:3] == b"ID3" and len(head) >= 10:
+            # the tag size is stored as a 28 bit syncsafe integer
+            size = 0
+            for byte in head[6:10]:
+                size = (size << 7) | (byte & 0x7F)
+            # plus header and, when flagged, footer
+            skip = size + (20 if head[5] & 0x10 else 10)
+
+        while len(head) < skip:
+            skip -= len(head)
+            head = next(chunks, b"")
+            if not head:
+                return
+
+        if head[skip:]:
+            yield head[skip:]
+        yield from chunks
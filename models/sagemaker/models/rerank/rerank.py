@@ -3,8 +3,6 @@ import logging
 import operator
 from typing import Any, Optional
 
-import boto3  # type: ignore
-
 from dify_plugin import RerankModel
 from dify_plugin.entities.model import AIModelEntity, FetchFrom, I18nObject, ModelType
 from dify_plugin.entities.model.rerank import RerankDocument, RerankResult
@@ -17,6 +15,7 @@ from dify_plugin.errors.model import (
     InvokeRateLimitError,
     InvokeServerUnavailableError,
 )
+from provider.sagemaker import get_sagemaker_runtime_client
 
 logger = logging.getLogger(__name__)
 
@@ -68,22 +67,7 @@ class SageMakerRerankModel(RerankModel):
                 return RerankResult(model=model, docs=docs)
 
             line = 1
-            if not self.sagemaker_client:
-                access_key = credentials.get("aws_access_key_id")
-                secret_key = credentials.get("aws_secret_access_key")
-                aws_region = credentials.get("aws_region")
-                if aws_region:
-                    if access_key and secret_key:
-                        self.sagemaker_client = boto3.client(
-                            "sagemaker-runtime",
-                            aws_access_key_id=access_key,
-                            aws_secret_access_key=secret_key,
-                            region_name=aws_region,
-                        )
-                    else:
-                        self.sagemaker_client = boto3.client("sagemaker-runtime", region_name=aws_region)
-                else:
-                    self.sagemaker_client = boto3.client("sagemaker-runtime")
+            self.sagemaker_client = get_sagemaker_runtime_client(credentials)
 
             line = 2
 
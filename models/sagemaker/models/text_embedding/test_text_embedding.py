@@ -0,0 +1,120 @@
+import io
+import json
+import threading
+from decimal import Decimal
+
+import pytest
+from dify_plugin.entities.model import ModelPropertyKey
+from dify_plugin.entities.model.text_embedding import EmbeddingUsage
+
+import provider.sagemaker as provider_module
+from . import text_embedding as text_embedding_module
+from .text_embedding import BATCH_SIZE, MAX_CONCURRENT_BATCHES, SageMakerEmbeddingModel
+
+CREDENTIALS = {
+    "aws_region": "us-east-1",
+    "aws_access_key_id": "AKIDEXAMPLE",
+    "aws_secret_access_key": "secret",
+    "sagemaker_endpoint": "embedding-endpoint",
+}
+
+
+def text_vector(text: str) -> list[float]:
+    # 0.1 and its neighbours are not representable in float32
+    index = int(text.split()[-1])
+    return [0.1 + index, 1 / 3, -0.7]
+
+
+class FakeRuntimeClient:
+    """
+    Stand-in for a sagemaker-runtime client. Every call waits until `concurrent_calls`
+    calls are in flight, and the call with the first text answers last.
+    """
+
+    def __init__(self, concurrent_calls: int):
+        self.barrier = threading.Barrier(concurrent_calls, timeout=5)
+        self.condition = threading.Condition()
+        self.answered: list[int] = []
+        self.batches: list[list[str]] = []
+
+    def invoke_endpoint(self, EndpointName, Body, ContentType):
+        inputs = json.loads(Body)["inputs"]
+        first = int(inputs[0].split()[-1])
+        with self.condition:
+            self.batches.append(inputs)
+        self.barrier.wait()
+        with self.condition:
+            # answer in reverse batch order
+            self.condition.wait_for(
+                lambda: all(later in self.answered for later in self._later_batches(first)), timeout=5
+            )
+            self.answered.append(first)
+            self.condition.notify_all()
+        body = json.dumps({"embeddings": [text_vector(text) for text in inputs]}).encode()
+        return {"Body": io.BytesIO(body)}
+
+    def _later_batches(self, first: int) -> list[int]:
+        firsts = [int(batch[0].split()[-1]) for batch in self.batches]
+        return [batch_first for batch_first in firsts if batch_first > first]
+
+
+@pytest.fixture
+def model() -> SageMakerEmbeddingModel:
+    model = SageMakerEmbeddingModel.__new__(SageMakerEmbeddingModel)
+    model._calc_response_usage = lambda model, credentials, tokens: EmbeddingUsage(
+        tokens=tokens,
+        total_tokens=tokens,
+        unit_price=Decimal(0),
+        price_unit=Decimal(0),
+        total_price=Decimal(0),
+        currency="USD",
+        latency=0,
+    )
+    return model
+
+
+def test_concurrent_batches_keep_text_order(model, monkeypatch):
+    client = FakeRuntimeClient(concurrent_calls=MAX_CONCURRENT_BATCHES)
+    requested = []
+    monkeypatch.setattr(
+        text_embedding_module,
+        "get_sagemaker_runtime_client",
+        lambda credentials: requested.append(credentials) or client,
+    )
+    texts = [f"text {index}" for index in range(BATCH_SIZE * MAX_CONCURRENT_BATCHES)]
+
+    result = model._invoke("embedding", CREDENTIALS, texts)
+
+    assert requested == [CREDENTIALS]
+    assert sorted(len(batch) for batch in client.batches) == [BATCH_SIZE] * MAX_CONCURRENT_BATCHES
+    # the batch with the first texts was answered last
+    assert client.answered[-1] == 0
+    # values are passed through as parsed, without a float32 round trip
+    assert result.embeddings == [text_vector(text) for text in texts]
+
+
+def test_max_chunks_spans_the_concurrent_batches(model):
+    schema = model.get_customizable_model_schema("embedding", CREDENTIALS)
+    assert schema.model_properties[ModelPropertyKey.MAX_CHUNKS] == 80
+
+
+def test_runtime_clients_are_shared_per_region_and_keys(monkeypatch):
+    created = []
+    monkeypatch.setattr(provider_module, "_clients", {})
+    monkeypatch.setattr(
+        provider_module.boto3,
+        "client",
+        lambda service, **kwargs: created.append(kwargs) or object(),
+    )
+    get_client = provider_module.get_sagemaker_runtime_client
+
+    client = get_client(CREDENTIALS)
+    assert get_client(dict(CREDENTIALS)) is client
+    assert get_client({**CREDENTIALS, "sagemaker_endpoint": "other-endpoint"}) is client
+    assert get_client({**CREDENTIALS, "aws_secret_access_key": "rotated"}) is not client
+    assert get_client({**CREDENTIALS, "aws_region": "eu-west-1"}) is not client
+    # without a region the keys are not used, the default credential chain applies
+    without_region = get_client({**CREDENTIALS, "aws_region": ""})
+    assert get_client({"aws_region": ""}) is without_region
+    assert created[-1]["aws_access_key_id"] is None
+    assert len(created) == 4
@@ -1,10 +1,10 @@
+import concurrent.futures
 import itertools
 import json
 import logging
 import time
 from typing import Any, Optional
 
-import boto3  # type: ignore
 from dify_plugin.entities.model import (
     AIModelEntity,
     EmbeddingInputType,
@@ -25,9 +25,12 @@ from dify_plugin.errors.model import (
     InvokeServerUnavailableError,
 )
 from dify_plugin.interfaces.model.text_embedding_model import TextEmbeddingModel
+from provider.sagemaker import get_sagemaker_runtime_client
 
 BATCH_SIZE = 20
 CONTEXT_SIZE = 8192
+# batches of one invocation sent to the endpoint at the same time
+MAX_CONCURRENT_BATCHES = 4
 
 logger = logging.getLogger(__name__)
 
@@ -47,15 +50,25 @@ class SageMakerEmbeddingModel(TextEmbeddingModel):
 
     sagemaker_client: Any = None
 
-    def _sagemaker_embedding(self, sm_client, endpoint_name, content_list: list[str]):
+    def _sagemaker_embedding(self, sm_client, endpoint_name, content_list: list[str]) -> list[list[float]]:
         response_model = sm_client.invoke_endpoint(
             EndpointName=endpoint_name,
             Body=json.dumps({"inputs": content_list, "parameters": {}, "is_query": False, "instruction": ""}),
             ContentType="application/json",
         )
-        json_str = response_model["Body"].read().decode("utf8")
-        json_obj = json.loads(json_str)
-        embeddings = json_obj["embeddings"]
+        # parse from the streaming body, without an intermediate decoded copy of the payload
+        json_obj = json.load(response_model["Body"])
+        return json_obj["embeddings"]
+
+    def _timed_sagemaker_embedding(
+        self, sm_client, endpoint_name, index: int, content_list: list[str]
+    ) -> list[list[float]]:
+        started_at = time.perf_counter()
+        embeddings = self._sagemaker_embedding(sm_client, endpoint_name, content_list)
+        logger.info(
+            f"Embedding batch {index} of {len(content_list)} texts from {endpoint_name} "
+            f"took {time.perf_counter() - started_at:.3f}s"
+        )
         return embeddings
 
     def _invoke(
@@ -79,22 +92,7 @@ class SageMakerEmbeddingModel(TextEmbeddingModel):
         # get model properties
         try:
             line = 1
-            if not self.sagemaker_client:
-                access_key = credentials.get("aws_access_key_id")
-                secret_key = credentials.get("aws_secret_access_key")
-                aws_region = credentials.get("aws_region")
-                if aws_region:
-                    if access_key and secret_key:
-                        self.sagemaker_client = boto3.client(
-                            "sagemaker-runtime",
-                            aws_access_key_id=access_key,
-                            aws_secret_access_key=secret_key,
-                            region_name=aws_region,
-                        )
-                    else:
-                        self.sagemaker_client = boto3.client("sagemaker-runtime", region_name=aws_region)
-                else:
-                    self.sagemaker_client = boto3.client("sagemaker-runtime")
+            self.sagemaker_client = get_sagemaker_runtime_client(credentials)
 
             line = 2
             sagemaker_endpoint = credentials.get("sagemaker_endpoint")
@@ -102,13 +100,28 @@ class SageMakerEmbeddingModel(TextEmbeddingModel):
             line = 3
             truncated_texts = [item[:CONTEXT_SIZE] for item in texts]
 
-            batches = batch_generator((text for text in truncated_texts), batch_size=BATCH_SIZE)
-            all_embeddings = []
+            batches = list(batch_generator((text for text in truncated_texts), batch_size=BATCH_SIZE))
 
             line = 4
-            for batch in batches:
-                embeddings = self._sagemaker_embedding(self.sagemaker_client, sagemaker_endpoint, batch)
-                all_embeddings.extend(embeddings)
+            if len(batches) <= 1:
+                results = [
+                    self._timed_sagemaker_embedding(self.sagemaker_client, sagemaker_endpoint, index, batch)
+                    for index, batch in enumerate(batches)
+                ]
+            else:
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(MAX_CONCURRENT_BATCHES, len(batches))
+                ) as executor:
+                    # map keeps the results in batch order
+                    results = list(
+                        executor.map(
+                            lambda item: self._timed_sagemaker_embedding(
+                                self.sagemaker_client, sagemaker_endpoint, *item
+                            ),
+                            enumerate(batches),
+                        )
+                    )
+            all_embeddings = [row for embeddings in results for row in embeddings]
 
             line = 5
             # calc usage
@@ -198,7 +211,8 @@ class SageMakerEmbeddingModel(TextEmbeddingModel):
             model_type=ModelType.TEXT_EMBEDDING,
             model_properties={
                 ModelPropertyKey.CONTEXT_SIZE: CONTEXT_SIZE,
-                ModelPropertyKey.MAX_CHUNKS: BATCH_SIZE,
+                # one invocation spans several concurrent batches
+                ModelPropertyKey.MAX_CHUNKS: BATCH_SIZE * MAX_CONCURRENT_BATCHES,
             },
             parameter_rules=[],
         )
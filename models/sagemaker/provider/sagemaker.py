@@ -1,14 +1,58 @@
+import hashlib
 import logging
+import threading
 import uuid
 from collections.abc import Mapping
 from typing import IO, Any
 
+import boto3  # type: ignore
+from botocore.config import Config  # type: ignore
 from dify_plugin import ModelProvider
 from dify_plugin.entities.model import ModelType
 from dify_plugin.errors.model import CredentialsValidateFailedError
 
 logger = logging.getLogger(__name__)
 
+# connections kept per client, enough for the concurrent batches of several invocations
+MAX_POOL_CONNECTIONS = 32
+
+_clients: dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_sagemaker_runtime_client(credentials: dict) -> Any:
+    """
+    Return the sagemaker-runtime client for the region and keys in credentials.
+
+    boto3 clients are thread safe and expensive to create, so one client, and its
+    connection pool, is shared by all model instances using the same credentials.
+    """
+    access_key = credentials.get("aws_access_key_id")
+    secret_key = credentials.get("aws_secret_access_key")
+    aws_region = credentials.get("aws_region")
+    if not (aws_region and access_key and secret_key):
+        # keys are only used together with a region, otherwise the default chain applies
+        access_key = secret_key = None
+    key = (
+        "sagemaker-runtime",
+        aws_region,
+        access_key,
+        hashlib.sha256(secret_key.encode("utf-8")).hexdigest() if secret_key else None,
+    )
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.client(
+                "sagemaker-runtime",
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=aws_region or None,
+                config=Config(max_pool_connections=MAX_POOL_CONNECTIONS, retries={"mode": "standard"}),
+            )
+            _clients[key] = client
+        return client
+
+
 class SageMakerProvider(ModelProvider):
     def validate_provider_credentials(self, credentials: dict) -> None:
         """
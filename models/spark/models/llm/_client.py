@@ -2,8 +2,10 @@ import base64
 import hashlib
 import hmac
 import json
-import queue
 import ssl
+import threading
+import time
+from collections.abc import Generator
 from datetime import datetime
 from time import mktime
 from typing import Optional
@@ -12,6 +14,141 @@ from wsgiref.handlers import format_date_time
 
 import websocket
 
+# the server rejects signatures whose date is more than 300 seconds off, re-sign well before that
+SIGNED_URL_TTL = 240
+# idle connections kept per endpoint and credentials
+MAX_IDLE_CONNECTIONS = 8
+# idle connections older than this are closed instead of being reused
+IDLE_CONNECTION_TIMEOUT = 60
+CONNECT_TIMEOUT = 10
+
+
+class SparkConnectionPool:
+    """
+    Pool of authenticated websocket connections, keyed by endpoint and credentials.
+
+    The protocol carries one conversation at a time per connection, so concurrent
+    requests use separate connections; a connection is returned to the pool once its
+    answer is complete. If the server turns out to close connections after each answer,
+    the key is marked as not reusable and later requests connect directly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[tuple[websocket.WebSocket, float]]] = {}
+        self._not_reusable: set[tuple] = set()
+        self._signed_urls: dict[tuple, tuple[str, float]] = {}
+        self.connects = 0
+
+    def signed_url(self, api_base: str, api_key: str, api_secret: str) -> str:
+        key = (api_base, api_key, hashlib.sha256(api_secret.encode("utf-8")).hexdigest())
+        now = time.monotonic()
+        with self._lock:
+            cached = self._signed_urls.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        url = create_url(api_base, api_key, api_secret)
+        with self._lock:
+            self._signed_urls[key] = (url, now + SIGNED_URL_TTL)
+        return url
+
+    def acquire(self, key: tuple, url: str) -> tuple[websocket.WebSocket, bool]:
+        """
+        :return: a connection and whether it was reused from the pool
+        """
+        now = time.monotonic()
+        stale = []
+        connection = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, idle_since = idle.pop()
+                if now - idle_since < IDLE_CONNECTION_TIMEOUT and candidate.connected:
+                    connection = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self.discard(candidate)
+        if connection is not None:
+            return connection, True
+
+        connection = websocket.create_connection(
+            url, timeout=CONNECT_TIMEOUT, sslopt={"cert_reqs": ssl.CERT_NONE}, enable_multithread=False
+        )
+        # answers may take long to start, only the handshake is bounded
+        connection.settimeout(None)
+        with self._lock:
+            self.connects += 1
+        return connection, False
+
+    def release(self, key: tuple, connection: websocket.WebSocket) -> None:
+        with self._lock:
+            if key not in self._not_reusable and connection.connected:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < MAX_IDLE_CONNECTIONS:
+                    idle.append((connection, time.monotonic()))
+                    return
+        self.discard(connection)
+
+    def mark_not_reusable(self, key: tuple) -> None:
+        with self._lock:
+            self._not_reusable.add(key)
+            idle = self._idle.pop(key, [])
+        for connection, _ in idle:
+            self.discard(connection)
+
+    @staticmethod
+    def discard(connection: websocket.WebSocket) -> None:
+        try:
+            connection.close(timeout=1)
+        except Exception:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            idle = [connection for connections in self._idle.values() for connection, _ in connections]
+            self._idle.clear()
+            self._not_reusable.clear()
+            self._signed_urls.clear()
+            self.connects = 0
+        for connection in idle:
+            self.discard(connection)
+
+
+def create_url(api_base: str, api_key: str, api_secret: str) -> str:
+    host = urlparse(api_base).netloc
+    path = urlparse(api_base).path
+
+    # generate timestamp by RFC1123
+    now = datetime.now()
+    date = format_date_time(mktime(now.timetuple()))
+
+    signature_origin = "host: " + host + "\n"
+    signature_origin += "date: " + date + "\n"
+    signature_origin += "GET " + path + " HTTP/1.1"
+
+    # encrypt using hmac-sha256
+    signature_sha = hmac.new(
+        api_secret.encode("utf-8"), signature_origin.encode("utf-8"), digestmod=hashlib.sha256
+    ).digest()
+
+    signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding="utf-8")
+
+    authorization_origin = (
+        f'api_key="{api_key}", algorithm="hmac-sha256", headers="host date request-line",'
+        f' signature="{signature_sha_base64}"'
+    )
+
+    authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode(encoding="utf-8")
+
+    v = {"authorization": authorization, "date": date, "host": host}
+    # generate url
+    url = api_base + "?" + urlencode(v)
+    return url
+
+
+connection_pool = SparkConnectionPool()
+
 
 class SparkLLMClient:
     def __init__(self, model: str, app_id: str, api_key: str, api_secret: str, api_domain: Optional[str] = None):
@@ -39,87 +176,85 @@ class SparkLLMClient:
             self.api_base = f"wss://{domain}/{api_version}/{endpoint}"
 
         self.app_id = app_id
-        self.ws_url = self.create_url(
-            urlparse(self.api_base).netloc, urlparse(self.api_base).path, self.api_base, api_key, api_secret
-        )
-
-        self.queue = queue.Queue()
-        self.blocking_message = ""
+        self.api_key = api_key
+        self.api_secret = api_secret
 
-    def create_url(self, host: str, path: str, api_base: str, api_key: str, api_secret: str) -> str:
-        # generate timestamp by RFC1123
-        now = datetime.now()
-        date = format_date_time(mktime(now.timetuple()))
+    def chat(
+        self, messages: list, user_id: str, model_kwargs: Optional[dict] = None
+    ) -> Generator[str, None, None]:
+        """
+        Send one conversation over a pooled connection and yield the content deltas as they arrive
+        """
+        key = (self.api_base, self.app_id, self.api_key, hashlib.sha256(self.api_secret.encode("utf-8")).hexdigest())
+        data = json.dumps(self.gen_params(messages=messages, user_id=user_id, model_kwargs=model_kwargs))
 
-        signature_origin = "host: " + host + "\n"
-        signature_origin += "date: " + date + "\n"
-        signature_origin += "GET " + path + " HTTP/1.1"
+        try:
+            url = connection_pool.signed_url(self.api_base, self.api_key, self.api_secret)
+            connection, reused = connection_pool.acquire(key, url)
+        except websocket.WebSocketBadStatusException as ex:
+            raise self._status_error(ex.status_code, ex.resp_body)
 
-        # encrypt using hmac-sha256
-        signature_sha = hmac.new(
-            api_secret.encode("utf-8"), signature_origin.encode("utf-8"), digestmod=hashlib.sha256
-        ).digest()
+        received = False
+        complete = False
+        try:
+            while True:
+                try:
+                    if not received:
+                        connection.send(data)
+                    message = connection.recv()
+                    if not message:
+                        raise websocket.WebSocketConnectionClosedException("Connection closed by server")
+                except (websocket.WebSocketConnectionClosedException, ConnectionError):
+                    if not reused or received:
+                        raise
+                    # the server closed the idle connection, it will not keep connections between answers
+                    connection_pool.mark_not_reusable(key)
+                    connection_pool.discard(connection)
+                    connection, reused = connection_pool.acquire(key, url)
+                    continue
 
-        signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding="utf-8")
-
-        authorization_origin = (
-            f'api_key="{api_key}", algorithm="hmac-sha256", headers="host date request-line",'
-            f' signature="{signature_sha_base64}"'
-        )
-
-        authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode(encoding="utf-8")
-
-        v = {"authorization": authorization, "date": date, "host": host}
-        # generate url
-        url = api_base + "?" + urlencode(v)
-        return url
-
-    def run(self, messages: list, user_id: str, model_kwargs: Optional[dict] = None, streaming: bool = False):
-        websocket.enableTrace(False)
-        ws = websocket.WebSocketApp(
-            self.ws_url,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close,
-            on_open=self.on_open,
-        )
-        ws.messages = messages
-        ws.user_id = user_id
-        ws.model_kwargs = model_kwargs
-        ws.streaming = streaming
-        ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
-
-    def on_error(self, ws, error):
-        self.queue.put({"status_code": error.status_code, "error": error.resp_body.decode("utf-8")})
-        ws.close()
-
-    def on_close(self, ws, close_status_code, close_reason):
-        self.queue.put({"done": True})
-
-    def on_open(self, ws):
-        self.blocking_message = ""
-        data = json.dumps(self.gen_params(messages=ws.messages, user_id=ws.user_id, model_kwargs=ws.model_kwargs))
-        ws.send(data)
+                received = True
+                content, complete = self._parse_message(message)
+                if content:
+                    yield content
+                if complete:
+                    return
+        except websocket.WebSocketBadStatusException as ex:
+            raise self._status_error(ex.status_code, ex.resp_body)
+        finally:
+            if complete:
+                connection_pool.release(key, connection)
+            else:
+                # errors and abandoned streams leave the connection in the middle of an answer
+                connection_pool.discard(connection)
 
-    def on_message(self, ws, message):
+    def _parse_message(self, message: str) -> tuple[str, bool]:
+        """
+        :return: content of the message and whether it is the last one of the answer
+        """
         data = json.loads(message)
         code = data["header"]["code"]
         if code != 0:
-            self.queue.put({"status_code": 400, "error": f"Code: {code}, Error: {data['header']['message']}"})
-            ws.close()
-        else:
-            choices = data["payload"]["choices"]
-            status = choices["status"]
-            content = choices["text"][0]["content"]
-            if ws.streaming:
-                self.queue.put({"data": content})
-            else:
-                self.blocking_message += content
+            raise self._status_error(400, f"Code: {code}, Error: {data['header']['message']}")
 
-            if status == 2:
-                if not ws.streaming:
-                    self.queue.put({"data": self.blocking_message})
-                ws.close()
+        choices = data["payload"]["choices"]
+        return choices["text"][0]["content"], choices["status"] == 2
+
+    @staticmethod
+    def _status_error(status_code: int, error) -> "SparkError":
+        if status_code == 401:
+            return SparkError(
+                "[Spark] The credentials you provided are incorrect. "
+                "Please double-check and fill them in again."
+            )
+        elif status_code == 403:
+            return SparkError(
+                "[Spark] Sorry, the credentials you provided are access denied. "
+                "Please try again after obtaining the necessary permissions."
+            )
+        if isinstance(error, bytes):
+            error = error.decode("utf-8")
+        return SparkError(f"[Spark] code: {status_code}, error: {error}")
 
     def gen_params(self, messages: list, user_id: str, model_kwargs: Optional[dict] = None) -> dict:
         data = {
@@ -137,27 +272,6 @@ class SparkLLMClient:
 
         return data
 
-    def subscribe(self):
-        while True:
-            content = self.queue.get()
-            if "error" in content:
-                if content["status_code"] == 401:
-                    raise SparkError(
-                        "[Spark] The credentials you provided are incorrect. "
-                        "Please double-check and fill them in again."
-                    )
-                elif content["status_code"] == 403:
-                    raise SparkError(
-                        "[Spark] Sorry, the credentials you provided are access denied. "
-                        "Please try again after obtaining the necessary permissions."
-                    )
-                else:
-                    raise SparkError(f"[Spark] code: {content['status_code']}, error: {content['error']}")
-
-            if "data" not in content:
-                break
-            yield content
-
 
 class SparkError(Exception):
     pass
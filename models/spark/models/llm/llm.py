@@ -1,4 +1,3 @@
-import threading
 from collections.abc import Generator
 from typing import Optional, Union
 
@@ -126,31 +125,25 @@ class SparkLargeLanguageModel(LargeLanguageModel):
             **credentials_kwargs,
         )
 
-        thread = threading.Thread(
-            target=client.run,
-            args=(
-                [
-                    {"role": prompt_message.role.value, "content": prompt_message.content}
-                    for prompt_message in prompt_messages
-                ],
-                user,
-                model_parameters,
-                stream,
-            ),
+        response = client.chat(
+            [
+                {"role": prompt_message.role.value, "content": prompt_message.content}
+                for prompt_message in prompt_messages
+            ],
+            user,
+            model_parameters,
         )
-        thread.start()
 
         if stream:
-            return self._handle_generate_stream_response(thread, model, credentials, client, prompt_messages)
+            return self._handle_generate_stream_response(model, credentials, response, prompt_messages)
 
-        return self._handle_generate_response(thread, model, credentials, client, prompt_messages)
+        return self._handle_generate_response(model, credentials, response, prompt_messages)
 
     def _handle_generate_response(
         self,
-        thread: threading.Thread,
         model: str,
         credentials: dict,
-        client: SparkLLMClient,
+        response: Generator[str, None, None],
         prompt_messages: list[PromptMessage],
     ) -> LLMResult:
         """
@@ -161,17 +154,8 @@ class SparkLargeLanguageModel(LargeLanguageModel):
         :param prompt_messages: prompt messages
         :return: llm response
         """
-        completion = ""
-
-        for content in client.subscribe():
-            if isinstance(content, dict):
-                delta = content["data"]
-            else:
-                delta = content
-
-            completion += delta
+        completion = "".join(response)
 
-        thread.join()
         # transform assistant message to prompt message
         assistant_prompt_message = AssistantPromptMessage(content=completion)
 
@@ -194,28 +178,23 @@ class SparkLargeLanguageModel(LargeLanguageModel):
 
     def _handle_generate_stream_response(
         self,
-        thread: threading.Thread,
         model: str,
         credentials: dict,
-        client: SparkLLMClient,
+        response: Generator[str, None, None],
         prompt_messages: list[PromptMessage],
     ) -> Generator:
         """
         Handle llm stream response
 
-        :param thread: thread
         :param model: model name
         :param credentials: credentials
-        :param response: response
+        :param response: content deltas
         :param prompt_messages: prompt messages
         :return: llm response chunk generator result
         """
         completion = ""
-        for index, content in enumerate(client.subscribe()):
-            if isinstance(content, dict):
-                delta = content["data"]
-            else:
-                delta = content
+        prompt_tokens = self.get_num_tokens(model, credentials, prompt_messages)
+        for index, delta in enumerate(response):
             completion += delta
             assistant_prompt_message = AssistantPromptMessage(
                 content=delta or "",
@@ -223,7 +202,6 @@ class SparkLargeLanguageModel(LargeLanguageModel):
             temp_assistant_prompt_message = AssistantPromptMessage(
                 content=completion,
             )
-            prompt_tokens = self.get_num_tokens(model, credentials, prompt_messages)
             completion_tokens = self.get_num_tokens(model, credentials, [temp_assistant_prompt_message])
 
             # transform usage
@@ -234,8 +212,6 @@ class SparkLargeLanguageModel(LargeLanguageModel):
                 delta=LLMResultChunkDelta(index=index, message=assistant_prompt_message, usage=usage),
             )
 
-        thread.join()
-
     def _to_credential_kwargs(self, credentials: dict) -> dict:
         """
         Transform credentials to kwargs for model instance
@@ -1,5 +1,9 @@
+import json
 from collections.abc import Generator
+from threading import Lock
 from typing import Optional
+
+import httpx
 from dify_plugin.entities.model import (
     AIModelEntity,
     FetchFrom,
@@ -27,10 +31,30 @@ from dify_plugin.errors.model import (
     InvokeServerUnavailableError,
 )
 from dify_plugin.interfaces.model.large_language_model import LargeLanguageModel
-from httpx import Response, post
+from httpx import Response
 from yarl import URL
 
 
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Client shared by all invocations, so that connections to the server are kept alive.
+    It is created on first use, after gevent has patched socket and threading, under a lock
+    so that concurrent first invocations do not each create a pool of their own.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(120, connect=10),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return _http_client
+
+
 class TritonInferenceAILargeLanguageModel(LargeLanguageModel):
     def _invoke(
         self,
@@ -185,17 +209,21 @@ class TritonInferenceAILargeLanguageModel(LargeLanguageModel):
                 parameters["presence_penalty"] = model_parameters["presence_penalty"]
             if "frequency_penalty" in model_parameters:
                 parameters["frequency_penalty"] = model_parameters["frequency_penalty"]
-            response = post(
-                str(URL(credentials["server_url"]) / "v2" / "models" / model / "generate"),
+            endpoint = "generate_stream" if stream else "generate"
+            request = get_http_client().build_request(
+                "POST",
+                str(URL(credentials["server_url"]) / "v2" / "models" / model / endpoint),
                 json={
                     "text_input": self._convert_prompt_message_to_text(prompt_messages),
                     "max_tokens": model_parameters.get("max_tokens", 512),
-                    "parameters": {"stream": False, **parameters},
+                    "parameters": {"stream": stream, **parameters},
                 },
-                timeout=(10, 120),
             )
-            response.raise_for_status()
+            # only the headers are read here, the body of a stream is consumed by the generator
+            response = get_http_client().send(request, stream=stream)
             if response.status_code != 200:
+                response.read()
+                response.close()
                 raise InvokeBadRequestError(f"Invoke failed with status code {response.status_code}, {response.text}")
             if stream:
                 return self._handle_chat_stream_response(
@@ -235,16 +263,44 @@ class TritonInferenceAILargeLanguageModel(LargeLanguageModel):
         resp: Response,
     ) -> Generator:
         """
-        handle normal chat generate response
+        handle stream chat generate response
+
+        Triton's generate_stream endpoint sends one server-sent event per decode step, each
+        carrying the text generated since the previous event in `text_output`.
         """
-        text = resp.json()["text_output"]
+        completion_tokens = 0
+        index = 0
+        try:
+            for line in resp.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:") :])
+                if "error" in event:
+                    raise InvokeServerUnavailableError(f"Stream failed: {event['error']}")
+                text = event.get("text_output", "")
+                if not text:
+                    continue
+                completion_tokens += self._get_num_tokens_by_gpt2(text)
+                yield LLMResultChunk(
+                    model=model,
+                    prompt_messages=prompt_messages,
+                    delta=LLMResultChunkDelta(index=index, message=AssistantPromptMessage(content=text)),
+                )
+                index += 1
+        except httpx.HTTPError as ex:
+            raise InvokeConnectionError(f"An error occurred during streaming: {str(ex)}")
+        finally:
+            resp.close()
+
         usage = LLMUsage.empty_usage()
         usage.prompt_tokens = self.get_num_tokens(model, credentials, prompt_messages)
-        usage.completion_tokens = self._get_num_tokens_by_gpt2(text)
+        usage.completion_tokens = completion_tokens
         yield LLMResultChunk(
             model=model,
             prompt_messages=prompt_messages,
-            delta=LLMResultChunkDelta(index=0, message=AssistantPromptMessage(content=text), usage=usage),
+            delta=LLMResultChunkDelta(
+                index=index, message=AssistantPromptMessage(content=""), finish_reason="stop", usage=usage
+            ),
         )
 
     @property
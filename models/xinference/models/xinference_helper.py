@@ -1,6 +1,9 @@
-from threading import Lock
+from collections import deque
+from collections.abc import Callable
+from hashlib import sha256
+from threading import Lock, Thread
 from time import time
-from typing import Optional
+from typing import Any, Optional
 
 from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, MissingSchema, Timeout
@@ -39,8 +42,137 @@ class XinferenceModelExtraParameter:
         self.model_family = model_family
 
 
-cache = {}
-cache_lock = Lock()
+class ModelMetadataCache:
+    """
+    TTL cache for model metadata fetched from a model server.
+
+    Lookups of different keys never wait on each other: the shared lock only
+    guards the dicts, and a fetch holds the lock of its own key, so concurrent
+    misses of one key make a single request. Entries close to expiry are
+    refreshed in the background, and when a refresh fails the stale value is
+    served for up to another ttl. After a failure the key is not reloaded for
+    `failure_backoff` seconds, so a down server is not asked on every lookup.
+    """
+
+    def __init__(self, ttl: float = 300, refresh_ahead: float = 60, failure_backoff: float = 30) -> None:
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.failure_backoff = failure_backoff
+        self._entries: dict[tuple, dict] = {}
+        self._key_locks: dict[tuple, Lock] = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refresh_failures = 0
+        self.refresh_latencies: deque[float] = deque(maxlen=1000)
+
+    def get(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        now = time()
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and now < entry["expires"]
+            if fresh:
+                self.hits += 1
+                if (
+                    entry["expires"] - now < self.refresh_ahead
+                    and not entry["refreshing"]
+                    and now >= entry["retry_at"]
+                ):
+                    entry["refreshing"] = refresh = True
+            else:
+                key_lock = self._key_locks.setdefault(key, Lock())
+        if fresh:
+            if refresh:
+                Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+            return entry["value"]
+
+        with key_lock:
+            now = time()
+            with self._lock:
+                # another thread may have loaded it while we waited
+                entry = self._entries.get(key)
+                if entry is not None and now < entry["expires"]:
+                    self.hits += 1
+                    return entry["value"]
+                if entry is not None and entry["expires"] + self.ttl <= now:
+                    # too old to be served even as a fallback
+                    entry = None
+                if entry is not None and now < entry["retry_at"]:
+                    # the last load failed recently, do not ask the server again yet
+                    self.stale_hits += 1
+                    return entry["value"]
+                self.misses += 1
+            try:
+                return self._load(key, loader)
+            except Exception:
+                if entry is None:
+                    raise
+                with self._lock:
+                    self.stale_hits += 1
+                    entry["retry_at"] = time() + self.failure_backoff
+                return entry["value"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self.refresh_latencies)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "refresh_failures": self.refresh_failures,
+                "refreshes": len(latencies),
+                "refresh_latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "refresh_latency_max": max(latencies, default=0.0),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+    def _refresh(self, key: tuple, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        with key_lock:
+            try:
+                self._load(key, loader)
+            except Exception:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        entry["refreshing"] = False
+                        entry["retry_at"] = time() + self.failure_backoff
+
+    def _load(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        started_at = time()
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self.refresh_failures += 1
+            raise
+        now = time()
+        with self._lock:
+            self.refresh_latencies.append(now - started_at)
+            self._entries[key] = {
+                "value": value,
+                "expires": now + self.ttl,
+                "refreshing": False,
+                "retry_at": 0.0,
+            }
+            # stale entries are kept for one more ttl as a fallback
+            for expired_key in [
+                k for k, v in self._entries.items() if v["expires"] + self.ttl < now
+            ]:
+                del self._entries[expired_key]
+                self._key_locks.pop(expired_key, None)
+        return value
+
+
+metadata_cache = ModelMetadataCache()
 
 
 class XinferenceHelper:
@@ -48,30 +180,13 @@ class XinferenceHelper:
     def get_xinference_extra_parameter(
         server_url: str, model_uid: str, api_key: str
     ) -> XinferenceModelExtraParameter:
-        XinferenceHelper._clean_cache()
-        with cache_lock:
-            if model_uid not in cache:
-                cache[model_uid] = {
-                    "expires": time() + 300,
-                    "value": XinferenceHelper._get_xinference_extra_parameter(
-                        server_url, model_uid, api_key
-                    ),
-                }
-            return cache[model_uid]["value"]
-
-    @staticmethod
-    def _clean_cache() -> None:
-        try:
-            with cache_lock:
-                expired_keys = [
-                    model_uid
-                    for model_uid, model in cache.items()
-                    if model["expires"] < time()
-                ]
-                for model_uid in expired_keys:
-                    del cache[model_uid]
-        except RuntimeError as e:
-            pass
+        credentials_hash = sha256((api_key or "").encode()).hexdigest()
+        return metadata_cache.get(
+            (server_url, model_uid, credentials_hash),
+            lambda: XinferenceHelper._get_xinference_extra_parameter(
+                server_url, model_uid, api_key
+            ),
+        )
 
     @staticmethod
     def _get_xinference_extra_parameter(
@@ -91,7 +206,7 @@ class XinferenceHelper:
 
         url = str(URL(server_url) / "v1" / "models" / model_uid)
 
-        # this method is surrounded by a lock, and default requests may hang forever,
+        # lookups of this model wait for this request, and default requests may hang forever,
         # so we just set a Adapter with max_retries=3
         session = Session()
         session.mount("http://", HTTPAdapter(max_retries=3))
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEI_MOCK_SERVER_PORT = 12347
+
+
+def text_vector(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode()).digest()
+    return [byte / 255 for byte in digest[:8]]
+
+
+def text_score(query: str, text: str) -> float:
+    return int.from_bytes(hashlib.sha256(f"{query}|{text}".encode()).digest()[:4]) / 2**32
+
+
+def tokenize(text: str) -> list[dict]:
+    """
+    One token per word. Like TEI, start and stop are utf-8 byte offsets into the input
+    """
+    data = text.encode("utf-8")
+    tokens = [{"id": 0, "text": "<s>", "special": True, "start": None, "stop": None}]
+    position = 0
+    for word in text.split():
+        encoded = word.encode("utf-8")
+        start = data.index(encoded, position)
+        position = start + len(encoded)
+        tokens.append(
+            {"id": len(word), "text": word, "special": False, "start": start, "stop": position}
+        )
+    tokens.append({"id": 2, "text": "</s>", "special": True, "start": None, "stop": None})
+    return tokens
+
+
+class _TeiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.sockets.append(self.request)
+
+    def do_GET(self):
+        if self.path == "/info":
+            self._send(
+                200,
+                {
+                    "model_id": "fake-tei",
+                    "model_type": {self.server.model_type: {}},
+                    "max_input_length": 512,
+                    "max_client_batch_size": self.server.max_client_batch_size,
+                },
+            )
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.barrier is not None:
+            self.server.barrier.wait()
+        time.sleep(self.server.latency)
+
+        if self.path == "/v1/embeddings":
+            texts = body["input"]
+            if len(texts) > self.server.max_client_batch_size:
+                return self._batch_too_large(len(texts))
+            self._send(
+                200,
+                {
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "embedding": text_vector(text), "index": index}
+                        for index, text in enumerate(texts)
+                    ],
+                    "model": "fake-tei",
+                    "usage": {
+                        "prompt_tokens": sum(len(tokenize(text)) for text in texts),
+                        "total_tokens": sum(len(tokenize(text)) for text in texts),
+                    },
+                },
+            )
+        elif self.path == "/rerank":
+            texts = body["texts"]
+            if len(texts) > self.server.max_client_batch_size:
+                return self._batch_too_large(len(texts))
+            results = [
+                {"index": index, "text": text, "score": text_score(body["query"], text)}
+                for index, text in enumerate(texts)
+            ]
+            results.sort(key=lambda result: result["score"], reverse=True)
+            self._send(200, results)
+        elif self.path == "/tokenize":
+            inputs = body["inputs"]
+            with self.server.lock:
+                self.server.tokenized_texts += len(inputs)
+            self._send(200, [tokenize(text) for text in inputs])
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _batch_too_large(self, size: int):
+        self._send(
+            413,
+            {
+                "error": f"batch size {size} > maximum allowed batch size "
+                f"{self.server.max_client_batch_size}",
+                "error_type": "validation",
+            },
+        )
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TeiMockServer:
+    """
+    In-process text-embeddings-inference stand-in with keep-alive, a batch size
+    limit and a fixed latency per request. With concurrent_requests, every request
+    waits until that many requests are in flight.
+    """
+
+    def __init__(
+        self,
+        port: int = TEI_MOCK_SERVER_PORT,
+        max_client_batch_size: int = 32,
+        latency: float = 0.02,
+        model_type: str = "embedding",
+        concurrent_requests: int = 0,
+    ):
+        self.url = f"http://localhost:{port}"
+        self.server = ThreadingHTTPServer(("localhost", port), _TeiHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.max_client_batch_size = max_client_batch_size
+        self.server.latency = latency
+        self.server.model_type = model_type
+        self.server.barrier = threading.Barrier(concurrent_requests, timeout=5) if concurrent_requests else None
+        self.server.connections = 0
+        self.server.requests = 0
+        self.server.tokenized_texts = 0
+        self.server.sockets = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def connections(self) -> int:
+        return self.server.connections
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    @property
+    def tokenized_texts(self) -> int:
+        return self.server.tokenized_texts
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        # drop kept-alive connections, so that pooled clients cannot reach a stopped server
+        for sock in self.server.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server.server_close()
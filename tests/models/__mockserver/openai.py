@@ -1,7 +1,16 @@
+import array
+import base64
+import io
 import json
+import re
+import socket
+import struct
 import subprocess
 import sys
+import threading
 import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import flask.cli
 from flask import Flask, Response, jsonify, request
 
@@ -10,6 +19,109 @@ OPENAI_MOCK_SERVER_PORT = 12345
 flask.cli.show_server_banner = lambda *args: None
 app = Flask(__name__)
 
+def embedding_vector(item) -> list[float]:
+    """
+    The fake embedding of one input: its first token (or character) and its length
+    """
+    first = item[0] if isinstance(item, list) else ord(item[0]) if item else 0
+    return [float(first), float(len(item)), 1.0, 0.5]
+
+
+def embeddings_response(request_body: dict) -> dict:
+    inputs = request_body["input"]
+    if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    data = []
+    for index, item in enumerate(inputs):
+        vector = embedding_vector(item)
+        if request_body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(struct.pack("<4f", *vector)).decode()
+        else:
+            embedding = vector
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    return {
+        "object": "list",
+        "data": data,
+        "model": request_body["model"],
+        "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+    }
+
+
+@app.post("/v1/embeddings")
+def openai_embeddings_mock():
+    return jsonify(embeddings_response(request.get_json(force=True)))
+
+
+def tone_words(wav_bytes: bytes) -> list[str]:
+    """
+    "Transcribe" a 16-bit mono wav made of sine tones separated by silence:
+    every tone is one word, named after its frequency (w0 = 200 Hz, w1 = 220 Hz, ...)
+    """
+    with wave.open(io.BytesIO(wav_bytes)) as wav_file:
+        frame_rate = wav_file.getframerate()
+        samples = array.array("h", wav_file.readframes(wav_file.getnframes()))
+
+    words = []
+    tone_start = None
+    quiet = 0
+    for position, sample in enumerate(samples):
+        if abs(sample) > 500:
+            if tone_start is None:
+                tone_start = position
+            quiet = 0
+        elif tone_start is not None:
+            quiet += 1
+            # a tone ends after 20 ms without signal
+            if quiet > frame_rate // 50 or position == len(samples) - 1:
+                tone = samples[tone_start : position - quiet]
+                tone_start = None
+                if len(tone) < frame_rate // 10:
+                    continue
+                crossings = sum(
+                    1 for a, b in zip(tone, tone[1:]) if (a < 0) != (b < 0)
+                )
+                frequency = crossings * frame_rate / len(tone) / 2
+                words.append(f"w{round((frequency - 200) / 20)}")
+    return words
+
+
+@app.post("/v1/audio/transcriptions")
+def openai_transcriptions_mock():
+    words = tone_words(request.files["file"].read())
+    return jsonify({"text": " ".join(words) + "."})
+
+
+# MPEG-1 layer III, 128 kbit/s, 44.1 kHz: 417 byte frames
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_SIZE = 417
+ID3_TAG = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+
+
+def speech_frames(text: str) -> list[bytes]:
+    """
+    Fake mp3 frames for a text, one per 10 characters, with the first number
+    in the text as payload so that the order of sentences can be checked
+    """
+    numbers = re.findall(r"\d+", text)
+    payload = bytes([int(numbers[0]) % 256 if numbers else 0])
+    frame = MP3_FRAME_HEADER + payload * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    return [frame] * max(1, len(text) // 10)
+
+
+@app.post("/v1/audio/speech")
+def openai_speech_mock():
+    request_body = request.get_json(force=True)
+
+    def stream_response():
+        # time to first byte of the synthesis
+        time.sleep(0.1)
+        yield ID3_TAG
+        for frame in speech_frames(request_body["input"]):
+            time.sleep(0.005)
+            yield frame
+
+    return Response(stream_response(), mimetype="audio/mpeg")
+
 
 @app.post("/v1/chat/completions")
 def openai_server_mock():
@@ -70,3 +182,83 @@ class OpenAIMockServer:
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.process.terminate()
+
+
+OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT = 12346
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    # the flask dev server closes every connection, this one keeps them open
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.sockets.append(self.request)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/embeddings"):
+            request_body = json.loads(body)
+            with self.server.lock:
+                self.server.requests.append(request_body["input"])
+            if self.server.embedding_delay:
+                time.sleep(self.server.embedding_delay(request_body))
+            payload = json.dumps(embeddings_response(request_body)).encode()
+            self.send_response(200)
+        else:
+            payload = b"{}"
+            self.send_response(404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OpenAIKeepAliveMockServer:
+    """
+    In-process OpenAI stand-in with HTTP keep-alive that counts TCP connections
+    and records embedding inputs. `embedding_delay` maps a request body to the
+    seconds to wait before answering it.
+    """
+
+    def __init__(self, port: int = OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT, embedding_delay=None):
+        self.server = ThreadingHTTPServer(("localhost", port), _KeepAliveHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.sockets = []
+        self.server.embedding_delay = embedding_delay
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def connections(self) -> int:
+        return self.server.connections
+
+    @property
+    def requests(self) -> list:
+        return self.server.requests
+
+    def reset(self) -> None:
+        with self.server.lock:
+            self.server.connections = 0
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        # close kept-alive connections, so pooled clients do not talk to a stopped server
+        for sock in self.server.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server.server_close()
@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+SPARK_MOCK_SERVER_PORT = 12349
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def answer_pieces(messages: list[dict]) -> list[str]:
+    """
+    The fake model answers by echoing the words of the last message, one word per frame
+    """
+    return [f"{word} " for word in messages[-1]["content"].split()]
+
+
+class _SparkHandler(StreamRequestHandler):
+    """
+    Minimal websocket endpoint: the handshake, unfragmented client text frames and
+    server text frames, enough for the Spark chat protocol
+    """
+
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        request_line = self.rfile.readline().decode()
+        headers = {}
+        for line in iter(self.rfile.readline, b"\r\n"):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "authorization=" not in request_line:
+            self.wfile.write(b"HTTP/1.1 401 Unauthorized\r\nContent-Length: 12\r\n\r\nunauthorized")
+            return
+
+        accept = base64.b64encode(
+            hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        self.wfile.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.sockets.append(self.request)
+
+        while True:
+            message = self._read_frame()
+            if message is None:
+                return
+            with self.server.lock:
+                self.server.requests += 1
+            request = json.loads(message)
+            pieces = answer_pieces(request["payload"]["message"]["text"])
+            for index, piece in enumerate(pieces):
+                self._send_frame(
+                    json.dumps(
+                        {
+                            "header": {"code": 0, "message": "Success", "sid": "fake"},
+                            "payload": {
+                                "choices": {
+                                    "status": 2 if index == len(pieces) - 1 else 1,
+                                    "text": [{"content": piece, "role": "assistant", "index": 0}],
+                                }
+                            },
+                        }
+                    )
+                )
+            if self.server.close_after_answer:
+                return
+
+    def _read_frame(self) -> str | None:
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4)
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(self.rfile.read(length)))
+        if opcode == 0x8:
+            return None
+        return payload.decode()
+
+    def _send_frame(self, text: str):
+        payload = text.encode()
+        if len(payload) < 126:
+            header = struct.pack(">BB", 0x81, len(payload))
+        else:
+            header = struct.pack(">BBH", 0x81, 126, len(payload))
+        self.wfile.write(header + payload)
+
+
+class SparkMockServer:
+    """
+    In-process Spark websocket stand-in that counts handshakes. With `close_after_answer`,
+    it closes each connection after one answer like a server without connection reuse.
+    """
+
+    def __init__(self, port: int = SPARK_MOCK_SERVER_PORT, close_after_answer: bool = False):
+        self.api_base = f"ws://localhost:{port}/v1.1/chat"
+        ThreadingTCPServer.allow_reuse_address = True
+        self.server = ThreadingTCPServer(("localhost", port), _SparkHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.close_after_answer = close_after_answer
+        self.server.connections = 0
+        self.server.requests = 0
+        self.server.sockets = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def connections(self) -> int:
+        return self.server.connections
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        for sock in self.server.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server.server_close()
@@ -0,0 +1,117 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRITON_MOCK_SERVER_PORT = 12348
+
+
+def completion_tokens(text_input: str, max_tokens: int) -> list[str]:
+    """
+    The fake model answers by echoing the words of the prompt, one word per decode step
+    """
+    return [f"{word} " for word in text_input.split()][:max_tokens]
+
+
+class _TritonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.sockets.append(self.request)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.server.lock:
+            self.server.requests += 1
+        tokens = completion_tokens(body["text_input"], body.get("max_tokens", 512))
+
+        if self.path.endswith("/generate"):
+            self._send(200, {"model_name": "fake-llm", "text_output": "".join(tokens)})
+        elif self.path.endswith("/generate_stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index, token in enumerate(tokens):
+                self._send_event({"model_name": "fake-llm", "text_output": token})
+                self.server.sent_events += 1
+                # hold the rest of the generation until the client has seen the first token
+                if index == 0 and self.server.hold_after_first_token is not None:
+                    self.server.hold_after_first_token.wait(5)
+            if self.server.stream_error:
+                self._send_event({"error": self.server.stream_error})
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send(400, {"error": "unknown endpoint"})
+
+    def _send_event(self, payload: dict):
+        data = f"data: {json.dumps(payload)}\n\n".encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TritonMockServer:
+    """
+    In-process Triton Inference Server stand-in for the generate and generate_stream
+    endpoints, with keep-alive. With `hold_after_first_token` set, a stream pauses after
+    its first event until the event is set.
+    """
+
+    def __init__(
+        self,
+        port: int = TRITON_MOCK_SERVER_PORT,
+        hold_after_first_token: threading.Event | None = None,
+        stream_error: str | None = None,
+    ):
+        self.url = f"http://localhost:{port}"
+        self.server = ThreadingHTTPServer(("localhost", port), _TritonHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.hold_after_first_token = hold_after_first_token
+        self.server.stream_error = stream_error
+        self.server.connections = 0
+        self.server.requests = 0
+        self.server.sent_events = 0
+        self.server.sockets = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def connections(self) -> int:
+        return self.server.connections
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    @property
+    def sent_events(self) -> int:
+        return self.server.sent_events
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        # drop kept-alive connections, so that pooled clients cannot reach a stopped server
+        for sock in self.server.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server.server_close()
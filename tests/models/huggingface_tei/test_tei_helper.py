@@ -0,0 +1,50 @@
+import httpx
+import pytest
+
+from models.huggingface_tei.models import helper
+from models.huggingface_tei.models.helper import TeiHelper
+from tests.models.__mockserver.huggingface_tei import TeiMockServer, text_score, text_vector
+
+TEXTS = [f"document number {index}" for index in range(512)]
+
+
+def test_batched_embeddings_keep_input_order():
+    with TeiMockServer(max_client_batch_size=32) as server:
+        embeddings, prompt_tokens = TeiHelper.invoke_embeddings_batched(server.url, TEXTS, 32)
+
+    assert embeddings == [text_vector(text) for text in TEXTS]
+    assert prompt_tokens == 5 * len(TEXTS)
+    assert server.requests == 16
+    # the pooled client keeps one connection per concurrent request
+    assert server.connections <= helper.MAX_CONCURRENT_REQUESTS
+
+
+def test_sharded_rerank_returns_global_top_n():
+    query = "which document"
+    with TeiMockServer(max_client_batch_size=16, model_type="reranker") as server:
+        results = TeiHelper.invoke_rerank_sharded(server.url, query, TEXTS[:100], 16)
+
+    assert len(results) == 100
+    expected = sorted(range(100), key=lambda index: text_score(query, TEXTS[index]), reverse=True)
+    assert [result["index"] for result in results] == expected
+    assert all(result["text"] == TEXTS[result["index"]] for result in results)
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(helper, "RETRY_BACKOFF_BASE", 0.01)
+    with TeiMockServer(max_client_batch_size=4) as server:
+        with pytest.raises(httpx.HTTPStatusError):
+            TeiHelper.invoke_embeddings(server.url, TEXTS[:8])
+        assert server.requests == 1
+
+
+def test_batches_are_sent_concurrently():
+    # every request waits until MAX_CONCURRENT_REQUESTS are in flight, sending them one by one fails
+    with TeiMockServer(
+        max_client_batch_size=32, latency=0, concurrent_requests=helper.MAX_CONCURRENT_REQUESTS
+    ) as server:
+        embeddings, _ = TeiHelper.invoke_embeddings_batched(server.url, TEXTS, 32, max_retries=0)
+
+    assert embeddings == [text_vector(text) for text in TEXTS]
+    assert server.requests == 16
+    assert server.connections == helper.MAX_CONCURRENT_REQUESTS
@@ -0,0 +1,35 @@
+import pytest
+
+from models.huggingface_tei.models import helper
+from models.huggingface_tei.models.helper import TeiHelper
+from tests.models.__mockserver.huggingface_tei import TeiMockServer, tokenize
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(helper, "token_count_cache", helper.TokenCountCache())
+
+
+def test_server_tokenization_truncates_at_token_boundary():
+    text = "ünïcode words " * 10
+    with TeiMockServer() as server:
+        [(num_tokens, cutoff)] = TeiHelper.tokenize_for_truncation(server.url, [text], 6, 32)
+        assert TeiHelper.tokenize_for_truncation(server.url, [text], 6, 32) == [
+            (num_tokens, cutoff)
+        ]
+        assert server.tokenized_texts == 1
+
+    assert num_tokens == len(tokenize(text))
+    # 4 words fit next to the two special tokens
+    assert text.encode()[:cutoff].decode() == "ünïcode words ünïcode words"
+
+
+def test_server_tokenization_counts_each_text_once():
+    texts = [f"chunk {index % 50} of a document" for index in range(200)]
+    with TeiMockServer(max_client_batch_size=16) as server:
+        counts = TeiHelper.tokenize_for_truncation(server.url, texts, 512, 16)
+        TeiHelper.tokenize_for_truncation(server.url, texts, 512, 16)
+        assert server.tokenized_texts == 50
+
+    assert counts == [(len(tokenize(text)), None) for text in texts]
+
@@ -0,0 +1,41 @@
+import pytest
+
+from models.ollama.models.text_embedding import text_embedding
+from models.ollama.models.text_embedding.text_embedding import OllamaEmbeddingModel
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(text_embedding, "token_count_cache", text_embedding.TokenCountCache())
+
+
+def test_gpt2_counts_are_cached_across_model_instances(monkeypatch):
+    counted = []
+    monkeypatch.setattr(
+        OllamaEmbeddingModel,
+        "_get_num_tokens_by_gpt2",
+        lambda self, text: counted.append(text) or len(text.split()),
+    )
+    texts = ["first text", "second text here", "first text"]
+
+    # the plugin creates a model instance per request
+    first = OllamaEmbeddingModel.__new__(OllamaEmbeddingModel)
+    assert first.get_num_tokens("nomic-embed-text", {}, texts) == [2, 3, 2]
+    assert counted == ["first text", "second text here"]
+
+    second = OllamaEmbeddingModel.__new__(OllamaEmbeddingModel)
+    assert second.get_num_tokens("nomic-embed-text", {}, texts) == [2, 3, 2]
+    assert counted == ["first text", "second text here"]
+
+
+def test_gpt2_count_cache_evicts_least_recently_used():
+    cache = text_embedding.TokenCountCache(max_size=2)
+    keys = [text_embedding.text_hash(text) for text in ("a", "b", "c")]
+    cache.put(keys[0], 1)
+    cache.put(keys[1], 2)
+    assert cache.get(keys[0]) == 1
+    cache.put(keys[2], 3)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 1
+    assert cache.get(keys[2]) == 3
@@ -0,0 +1,53 @@
+from openai import OpenAI
+
+from models.openai.models.common_openai import _CommonOpenAI, openai_client_registry
+from tests.models.__mockserver.openai import (
+    OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT,
+    OpenAIKeepAliveMockServer,
+)
+
+CREDENTIALS = {
+    "openai_api_base": f"http://localhost:{OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT}",
+    "openai_api_key": "test",
+}
+REQUESTS = 200
+
+
+def _run(server: OpenAIKeepAliveMockServer, get_client) -> tuple[list[list[float]], int]:
+    server.reset()
+    embeddings = []
+    for _ in range(REQUESTS):
+        response = get_client().embeddings.create(input=["ping"], model="text-embedding-3-small")
+        embeddings.append(response.data[0].embedding)
+    return embeddings, server.connections
+
+
+def test_registry_reuses_clients():
+    common = _CommonOpenAI()
+    client = common._get_client(CREDENTIALS)
+    assert common._get_client(dict(CREDENTIALS)) is client
+    assert common._get_client({**CREDENTIALS, "openai_api_key": "other"}) is not client
+
+
+def test_registry_evicts_least_recently_used():
+    common = _CommonOpenAI()
+    first = common._get_client({**CREDENTIALS, "openai_api_key": "key-0"})
+    for index in range(1, openai_client_registry.max_size + 1):
+        common._get_client({**CREDENTIALS, "openai_api_key": f"key-{index}"})
+    assert common._get_client({**CREDENTIALS, "openai_api_key": "key-0"}) is not first
+
+
+def test_pooled_client_keeps_one_connection():
+    common = _CommonOpenAI()
+    with OpenAIKeepAliveMockServer() as server:
+        fresh_embeddings, fresh_connections = _run(
+            server, lambda: OpenAI(**common._to_credential_kwargs(CREDENTIALS))
+        )
+        pooled_embeddings, pooled_connections = _run(
+            server, lambda: common._get_client(CREDENTIALS)
+        )
+
+    assert len(pooled_embeddings) == REQUESTS
+    assert pooled_embeddings == fresh_embeddings
+    assert fresh_connections == REQUESTS
+    assert pooled_connections <= 1
@@ -0,0 +1,81 @@
+import array
+import io
+import math
+import re
+import wave
+
+import pytest
+
+from models.openai.models.speech2text import speech2text
+from models.openai.models.speech2text.speech2text import OpenAISpeech2TextModel
+from tests.models.__mockserver.openai import OPENAI_MOCK_SERVER_PORT, OpenAIMockServer
+
+CREDENTIALS = {
+    "openai_api_base": f"http://localhost:{OPENAI_MOCK_SERVER_PORT}",
+    "openai_api_key": "test",
+}
+FRAME_RATE = 16000
+
+
+def _tone_audio(words: int) -> io.BytesIO:
+    """
+    One 400 ms tone per word, 300 ms of silence after each, as the mock server expects
+    """
+    samples = array.array("h")
+    for word in range(words):
+        frequency = 200 + 20 * word
+        samples.extend(
+            int(8000 * math.sin(2 * math.pi * frequency * position / FRAME_RATE))
+            for position in range(FRAME_RATE * 4 // 10)
+        )
+        samples.extend([0] * (FRAME_RATE * 3 // 10))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(FRAME_RATE)
+        wav_file.writeframes(samples.tobytes())
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def long_audio_mode(monkeypatch):
+    monkeypatch.setattr(speech2text, "LONG_AUDIO_MIN_BYTES", 0)
+    monkeypatch.setattr(speech2text, "LONG_AUDIO_SEGMENT_MS", 8000)
+    monkeypatch.setattr(speech2text, "SILENCE_SEARCH_MS", 3000)
+
+
+def test_strip_overlap():
+    strip = OpenAISpeech2TextModel._strip_overlap
+    assert strip("see you at the Meeting.", "the meeting, tomorrow") == "tomorrow"
+    assert strip("hello world", "again") == "again"
+    assert strip("", "hello") == "hello"
+
+
+def test_split_audio_cuts_in_silence(long_audio_mode):
+    audio = OpenAISpeech2TextModel._load_audio(_tone_audio(30))
+    boundaries = OpenAISpeech2TextModel._split_audio(audio)
+
+    assert len(boundaries) > 2
+    assert boundaries[0][0] == 0 and boundaries[-1][1] == len(audio)
+    for (_, end), (next_start, _) in zip(boundaries, boundaries[1:]):
+        assert end - next_start == speech2text.LONG_AUDIO_OVERLAP_MS
+        # every cut lies in the 300 ms pause after a tone
+        assert end % 700 >= 400
+
+
+def test_long_audio_transcription_streams_in_order(long_audio_mode):
+    model = OpenAISpeech2TextModel.__new__(OpenAISpeech2TextModel)
+    expected = [f"w{index}" for index in range(40)]
+
+    with OpenAIMockServer():
+        pieces = list(
+            model._speech2text_invoke_streaming("whisper-1", CREDENTIALS, _tone_audio(40))
+        )
+        text = model._invoke("whisper-1", CREDENTIALS, _tone_audio(40))
+
+    assert len(pieces) > 2
+    assert re.findall(r"w\d+", "".join(pieces)) == expected
+    assert re.findall(r"w\d+", text) == expected
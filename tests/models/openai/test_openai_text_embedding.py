@@ -0,0 +1,114 @@
+import platform
+from decimal import Decimal
+
+import numpy as np
+import pytest
+import tiktoken
+from dify_plugin.entities.model.text_embedding import EmbeddingUsage
+
+from models.openai.models import token_counter
+from models.openai.models.text_embedding.text_embedding import (
+    OpenAITextEmbeddingModel,
+)
+from tests.models.__mockserver.openai import (
+    OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT,
+    OpenAIKeepAliveMockServer,
+    embedding_vector,
+)
+
+CREDENTIALS = {
+    "openai_api_base": f"http://localhost:{OPENAI_KEEP_ALIVE_MOCK_SERVER_PORT}",
+    "openai_api_key": "test",
+}
+CONTEXT_SIZE = 4
+MAX_CHUNKS = 2
+
+# one token per byte, so the test does not need to download tiktoken ranks
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+@pytest.fixture(autouse=True)
+def byte_encoding(monkeypatch):
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: BYTE_ENCODING)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: BYTE_ENCODING)
+    token_counter.get_encoding.cache_clear()
+    yield
+    token_counter.get_encoding.cache_clear()
+
+
+@pytest.fixture
+def model() -> OpenAITextEmbeddingModel:
+    # the openai client reads the platform on its first request, which forks `uname`;
+    # under gevent that hangs when it first happens in a batch worker thread
+    platform.platform()
+    model = OpenAITextEmbeddingModel.__new__(OpenAITextEmbeddingModel)
+    model._get_context_size = lambda model, credentials: CONTEXT_SIZE
+    model._get_max_chunks = lambda model, credentials: MAX_CHUNKS
+    model._calc_response_usage = lambda model, credentials, tokens: EmbeddingUsage(
+        tokens=tokens,
+        total_tokens=tokens,
+        unit_price=Decimal(0),
+        price_unit=Decimal(0),
+        total_price=Decimal(0),
+        currency="USD",
+        latency=0,
+    )
+    return model
+
+
+def _expected_embedding(text: str) -> list[float]:
+    tokens = list(text.encode())
+    if not tokens:
+        vector = np.asarray(embedding_vector(""))
+    else:
+        chunks = [tokens[index : index + CONTEXT_SIZE] for index in range(0, len(tokens), CONTEXT_SIZE)]
+        vectors = np.asarray([embedding_vector(chunk) for chunk in chunks], dtype=np.float32)
+        weights = np.asarray([len(chunk) for chunk in chunks], dtype=np.float64)
+        vector = (vectors * weights[:, None]).sum(axis=0) / weights.sum()
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_long_texts_are_weighted_averages_of_their_chunks(model):
+    texts = ["abcdefghij", "xyz", "0123456789abcdef"]
+    with OpenAIKeepAliveMockServer() as server:
+        result = model._invoke("text-embedding-3-small", CREDENTIALS, texts)
+
+    # 3 + 1 + 4 chunks in batches of MAX_CHUNKS
+    assert sum(len(request) for request in server.requests) == 8
+    assert len(server.requests) == 4
+    np.testing.assert_allclose(result.embeddings, [_expected_embedding(text) for text in texts], rtol=1e-6)
+    assert result.usage.tokens == 8
+
+
+def test_empty_texts_get_the_embedding_of_the_empty_string(model):
+    texts = ["", "abcdef", ""]
+    with OpenAIKeepAliveMockServer() as server:
+        result = model._invoke("text-embedding-3-small", CREDENTIALS, texts)
+
+    # one extra request for all empty texts
+    assert server.requests[-1] == ""
+    np.testing.assert_allclose(result.embeddings, [_expected_embedding(text) for text in texts], rtol=1e-6)
+
+    with OpenAIKeepAliveMockServer():
+        result = model._invoke("text-embedding-3-small", CREDENTIALS, ["", ""])
+    np.testing.assert_allclose(result.embeddings, [_expected_embedding("")] * 2, rtol=1e-6)
+
+
+def test_concurrent_batches_keep_text_order(model):
+    texts = [chr(ord("a") + index) * (index % 6 + 1) for index in range(20)]
+    first_token = ord("a")
+
+    def delay(request_body: dict) -> float:
+        # the batch holding the first text answers last
+        return 0.2 if request_body["input"][0][0] == first_token else 0
+
+    with OpenAIKeepAliveMockServer(embedding_delay=delay) as server:
+        result = model._invoke("text-embedding-3-small", CREDENTIALS, texts)
+
+    assert len(server.requests) > MAX_CHUNKS
+    np.testing.assert_allclose(result.embeddings, [_expected_embedding(text) for text in texts], rtol=1e-6)
@@ -0,0 +1,128 @@
+import pytest
+import tiktoken
+from dify_plugin.entities.model.message import (
+    AssistantPromptMessage,
+    PromptMessageTool,
+    SystemPromptMessage,
+    ToolPromptMessage,
+    UserPromptMessage,
+)
+
+from models.openai.models import token_counter
+from models.openai.models.llm.llm import OpenAILargeLanguageModel
+
+# byte-level BPE, so the test does not need to download tiktoken ranks
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+@pytest.fixture(autouse=True)
+def byte_encoding(monkeypatch):
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: BYTE_ENCODING)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: BYTE_ENCODING)
+    for cache in (token_counter.get_encoding, token_counter.constant_token_counts):
+        cache.cache_clear()
+    for cache in (
+        token_counter._message_token_cache,
+        token_counter._tool_token_cache,
+        token_counter._text_token_cache,
+    ):
+        cache.clear()
+    yield
+    token_counter.get_encoding.cache_clear()
+    token_counter.constant_token_counts.cache_clear()
+
+
+def _tools(count: int) -> list[PromptMessageTool]:
+    return [
+        PromptMessageTool(
+            name=f"tool_{index}",
+            description=f"looks up item {index} in the catalogue " * 5,
+            parameters={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "search terms"},
+                    "mode": {"type": "string", "enum": ["fast", "exact"]},
+                },
+                "required": ["query"],
+            },
+        )
+        for index in range(count)
+    ]
+
+
+def _history(rounds: int) -> list:
+    messages = [SystemPromptMessage(content="You are a careful assistant. " * 100)]
+    for index in range(rounds):
+        messages.append(UserPromptMessage(content=f"question {index} " * 40))
+        messages.append(
+            AssistantPromptMessage(
+                content="",
+                tool_calls=[
+                    AssistantPromptMessage.ToolCall(
+                        id=f"call_{index}",
+                        type="function",
+                        function=AssistantPromptMessage.ToolCall.ToolCallFunction(
+                            name="tool_1", arguments='{"query": "item"}'
+                        ),
+                    )
+                ],
+            )
+        )
+        messages.append(
+            ToolPromptMessage(
+                content=f"result {index} " * 80,
+                tool_call_id=f"call_{index}",
+                name="tool_1",
+            )
+        )
+    return messages
+
+
+def test_tool_count_uses_precomputed_constants():
+    tool = _tools(1)[0]
+    schema = {
+        "name": tool.name,
+        "description": tool.description,
+        "parameters": tool.parameters,
+    }
+    count = token_counter.num_tokens_for_tool(BYTE_ENCODING, schema)
+    token_counter._tool_token_cache.clear()
+    assert token_counter.num_tokens_for_tool(BYTE_ENCODING, schema) == count
+    assert len(token_counter._tool_token_cache) == 1
+
+
+def test_memoized_counts_match_cold_counts():
+    llm = OpenAILargeLanguageModel.__new__(OpenAILargeLanguageModel)
+    messages, tools = _history(10), _tools(10)
+    cold = llm._num_tokens_from_messages("gpt-4o", messages, tools)
+    assert llm._num_tokens_from_messages("gpt-4o", messages, tools) == cold
+
+    messages.append(UserPromptMessage(content="one more question"))
+    assert llm._num_tokens_from_messages("gpt-4o", messages, tools) > cold
+
+
+def test_warm_count_does_not_encode(monkeypatch):
+    llm = OpenAILargeLanguageModel.__new__(OpenAILargeLanguageModel)
+    messages, tools = _history(100), _tools(100)
+    encoded = []
+    encode = BYTE_ENCODING.encode
+
+    def counted_encode(text, *args, **kwargs):
+        encoded.append(text)
+        return encode(text, *args, **kwargs)
+
+    monkeypatch.setattr(BYTE_ENCODING, "encode", counted_encode)
+
+    cold = llm._num_tokens_from_messages("gpt-4o", messages, tools)
+    assert encoded
+    encoded.clear()
+
+    # every message and tool schema is served from the caches
+    warm = llm._num_tokens_from_messages("gpt-4o", messages, tools)
+    assert warm == cold
+    assert encoded == []
@@ -0,0 +1,56 @@
+from models.openai.models.tts.tts import OpenAIText2SpeechModel
+from tests.models.__mockserver.openai import (
+    ID3_TAG,
+    MP3_FRAME_SIZE,
+    OPENAI_MOCK_SERVER_PORT,
+    OpenAIMockServer,
+    speech_frames,
+)
+
+CREDENTIALS = {
+    "openai_api_base": f"http://localhost:{OPENAI_MOCK_SERVER_PORT}",
+    "openai_api_key": "test",
+}
+
+
+def test_strip_id3_tag_across_chunks():
+    frames = b"".join(speech_frames("Sentence 1 is here."))
+    stream = ID3_TAG + frames
+    chunks = [stream[index : index + 7] for index in range(0, len(stream), 7)]
+
+    stripped = OpenAIText2SpeechModel._strip_id3_tag(iter(chunks))
+    assert b"".join(stripped) == frames
+    assert b"".join(OpenAIText2SpeechModel._strip_id3_tag(iter([frames]))) == frames
+
+
+def test_sentences_are_streamed_in_order_with_early_first_byte():
+    model = OpenAIText2SpeechModel.__new__(OpenAIText2SpeechModel)
+    sentences = [f"Sentence {index} of a long text." for index in range(30)]
+    requested = []
+    fetch_sentence_audio = OpenAIText2SpeechModel._fetch_sentence_audio
+
+    def record_fetch(client, model, voice, sentence, chunks, cancelled):
+        requested.append(sentence)
+        fetch_sentence_audio(client, model, voice, sentence, chunks, cancelled)
+
+    model._fetch_sentence_audio = record_fetch
+
+    with OpenAIMockServer():
+        requested_at_first_byte = None
+        audio = b""
+        for chunk in model._iter_sentences_audio(
+            "tts-1", CREDENTIALS, sentences, "alloy", window=3
+        ):
+            if requested_at_first_byte is None:
+                requested_at_first_byte = len(requested)
+            audio += chunk
+
+    # the first audio is forwarded while only the head sentence and the window behind it are requested
+    assert requested_at_first_byte <= 1 + 3
+    assert requested == sentences
+    # one tag up front, then plain frames in sentence order
+    assert audio.startswith(ID3_TAG)
+    frames = audio[len(ID3_TAG) :]
+    expected = b"".join(b"".join(speech_frames(sentence)) for sentence in sentences)
+    assert frames == expected
+    assert len(frames) % MP3_FRAME_SIZE == 0
@@ -0,0 +1,74 @@
+import pytest
+
+from models.spark.models.llm._client import SparkLLMClient, connection_pool
+from tests.models.__mockserver.spark import SparkMockServer, answer_pieces
+
+
+@pytest.fixture(autouse=True)
+def clear_pool():
+    connection_pool.clear()
+    yield
+    connection_pool.clear()
+
+
+def make_client(server: SparkMockServer) -> SparkLLMClient:
+    client = SparkLLMClient(model="spark-lite", app_id="app", api_key="key", api_secret="secret")
+    client.api_base = server.api_base
+    return client
+
+
+def messages(text: str) -> list[dict]:
+    return [{"role": "user", "content": text}]
+
+
+def test_sequential_requests_reuse_one_connection():
+    with SparkMockServer() as server:
+        client = make_client(server)
+        answers = ["".join(client.chat(messages(f"question number {index}"), "user")) for index in range(5)]
+
+        assert answers == ["".join(answer_pieces(messages(f"question number {index}"))) for index in range(5)]
+        assert server.requests == 5
+        assert server.connections == 1
+        assert connection_pool.connects == 1
+
+
+def test_concurrent_requests_use_separate_connections():
+    with SparkMockServer() as server:
+        client = make_client(server)
+        first = client.chat(messages("a b c d"), "user")
+        second = client.chat(messages("e f g h"), "user")
+        first_pieces, second_pieces = [], []
+        for first_piece, second_piece in zip(first, second):
+            first_pieces.append(first_piece)
+            second_pieces.append(second_piece)
+
+        assert first_pieces == answer_pieces(messages("a b c d"))
+        assert second_pieces == answer_pieces(messages("e f g h"))
+        assert server.connections == 2
+
+        # both connections went back to the pool
+        list(client.chat(messages("i j"), "user"))
+        list(client.chat(messages("k l"), "user"))
+        assert server.connections == 2
+
+
+def test_server_closing_after_each_answer_disables_reuse():
+    with SparkMockServer(close_after_answer=True) as server:
+        client = make_client(server)
+        answers = ["".join(client.chat(messages(f"question {index}"), "user")) for index in range(3)]
+
+        assert answers == ["".join(answer_pieces(messages(f"question {index}"))) for index in range(3)]
+        assert server.requests == 3
+        # one reconnect after the pooled connection turned out closed, then no more reuse attempts
+        assert server.connections == 3
+
+
+def test_abandoned_stream_does_not_return_connection_to_pool():
+    with SparkMockServer() as server:
+        client = make_client(server)
+        stream = client.chat(messages("a b c d"), "user")
+        next(stream)
+        stream.close()
+
+        assert "".join(client.chat(messages("e f"), "user")) == "e f "
+        assert server.connections == 2
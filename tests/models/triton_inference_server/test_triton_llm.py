@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from dify_plugin.entities.model.message import UserPromptMessage
+from dify_plugin.errors.model import InvokeServerUnavailableError
+from models.triton_inference_server.models.llm.llm import TritonInferenceAILargeLanguageModel
+from tests.models.__mockserver.triton_inference_server import TritonMockServer, completion_tokens
+
+PROMPT = "one two three four five six seven eight"
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(
+        TritonInferenceAILargeLanguageModel,
+        "_get_num_tokens_by_gpt2",
+        lambda self, text: len(text.split()),
+    )
+    return TritonInferenceAILargeLanguageModel.__new__(TritonInferenceAILargeLanguageModel)
+
+
+def invoke(model, server, stream):
+    return model._generate(
+        model="fake-llm",
+        credentials={"server_url": server.url},
+        prompt_messages=[UserPromptMessage(content=PROMPT)],
+        model_parameters={"max_tokens": 6},
+        stream=stream,
+    )
+
+
+def test_stream_yields_tokens_as_they_are_generated(model):
+    release = threading.Event()
+    with TritonMockServer(hold_after_first_token=release) as server:
+        chunks = invoke(model, server, stream=True)
+        first = next(chunks)
+        # the server is still holding back the rest of the generation
+        assert server.sent_events == 1
+        release.set()
+        chunks = [first, *chunks]
+
+    tokens = completion_tokens(f"User: {PROMPT}", 6)
+    assert [chunk.delta.message.content for chunk in chunks[:-1]] == tokens
+    assert [chunk.delta.index for chunk in chunks] == list(range(len(tokens) + 1))
+    last = chunks[-1]
+    assert last.delta.finish_reason == "stop"
+    assert last.delta.usage.prompt_tokens == len(f"User: {PROMPT}".split())
+    assert last.delta.usage.completion_tokens == len(tokens)
+
+
+def test_blocking_generate_and_pooled_connection(model):
+    with TritonMockServer() as server:
+        results = [invoke(model, server, stream=False) for _ in range(3)]
+        list(invoke(model, server, stream=True))
+
+    assert all(result.message.content == "".join(completion_tokens(f"User: {PROMPT}", 6)) for result in results)
+    assert server.requests == 4
+    assert server.connections == 1
+
+
+def test_stream_error_event_is_raised(model):
+    with TritonMockServer(stream_error="out of memory") as server:
+        with pytest.raises(InvokeServerUnavailableError, match="out of memory"):
+            list(invoke(model, server, stream=True))
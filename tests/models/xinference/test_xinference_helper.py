@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from models.xinference.models import xinference_helper
+from models.xinference.models.xinference_helper import ModelMetadataCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class InlineThread:
+    """Runs the background refresh in the calling thread"""
+
+    def __init__(self, target, args, daemon):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(xinference_helper, "time", clock)
+    monkeypatch.setattr(xinference_helper, "Thread", InlineThread)
+    return clock
+
+
+def failing_loader(calls: list):
+    def loader():
+        calls.append(1)
+        raise RuntimeError("server down")
+
+    return loader
+
+
+def test_concurrent_misses_make_one_request():
+    cache = ModelMetadataCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "metadata"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get(("url", "uid", "key"), loader)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["metadata"] * 10
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 9
+
+
+def test_slow_server_does_not_block_other_keys():
+    cache = ModelMetadataCache()
+    slow_started = threading.Event()
+    release_slow = threading.Event()
+
+    def slow_loader():
+        slow_started.set()
+        release_slow.wait(timeout=5)
+
+    slow = threading.Thread(target=cache.get, args=(("slow", "uid", "key"), slow_loader))
+    slow.start()
+    assert slow_started.wait(timeout=5)
+
+    assert cache.get(("fast", "uid", "key"), lambda: "fast") == "fast"
+    # the slow load was still in progress while the other key was served
+    assert slow.is_alive()
+    release_slow.set()
+    slow.join()
+
+
+def test_refresh_ahead(clock):
+    cache = ModelMetadataCache(ttl=10, refresh_ahead=5)
+    key = ("url", "uid", "key")
+    assert cache.get(key, lambda: "v1") == "v1"
+
+    clock.now += 4
+    assert cache.get(key, lambda: "v2") == "v1"
+    assert cache.stats()["refreshes"] == 1
+
+    # inside the refresh window the cached value is served and refreshed in the background
+    clock.now += 2
+    assert cache.get(key, lambda: "v2") == "v1"
+    assert cache.get(key, lambda: "v3") == "v2"
+    assert cache.stats()["refreshes"] == 2
+
+
+def test_stale_value_is_served_for_one_more_ttl(clock):
+    cache = ModelMetadataCache(ttl=10, refresh_ahead=0, failure_backoff=0)
+    key = ("url", "uid", "key")
+    calls = []
+    assert cache.get(key, lambda: "v1") == "v1"
+
+    clock.now += 15
+    assert cache.get(key, failing_loader(calls)) == "v1"
+    assert cache.stats()["stale_hits"] == 1
+
+    clock.now += 10
+    with pytest.raises(RuntimeError):
+        cache.get(key, failing_loader(calls))
+    assert len(calls) == 2
+
+    with pytest.raises(RuntimeError):
+        cache.get(("url", "other", "key"), failing_loader(calls))
+
+
+def test_failed_refresh_backs_off(clock):
+    cache = ModelMetadataCache(ttl=10, refresh_ahead=5, failure_backoff=3)
+    key = ("url", "uid", "key")
+    calls = []
+    assert cache.get(key, lambda: "v1") == "v1"
+
+    clock.now += 6
+    for _ in range(5):
+        assert cache.get(key, failing_loader(calls)) == "v1"
+    assert len(calls) == 1
+    assert cache.stats()["refresh_failures"] == 1
+
+    clock.now += 3
+    assert cache.get(key, failing_loader(calls)) == "v1"
+    assert len(calls) == 2
+
+    # once expired, lookups during the backoff serve the stale value without a request
+    clock.now += 2
+    for _ in range(5):
+        assert cache.get(key, failing_loader(calls)) == "v1"
+    assert len(calls) == 2
+
+    clock.now += 1
+    assert cache.get(key, lambda: "v2") == "v2"
@@ -0,0 +1,4 @@
+# dify_plugin patches the standard library with gevent on import, the same way
+# main.py loads it first at runtime. Importing it here, before the tests import
+# boto3 and moto, keeps ssl from being patched after urllib3 has bound it.
+import dify_plugin  # noqa: F401
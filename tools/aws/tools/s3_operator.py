@@ -1,19 +1,67 @@
-from typing import Any, Union
+import codecs
+import concurrent.futures
+import hashlib
+import tempfile
+import threading
+from collections.abc import Generator
+from typing import IO, Any, Optional
 from urllib.parse import urlparse
 
 import boto3
-
-# from core.tools.entities.tool_entities import ToolInvokeMessage
-# from core.tools.tool.builtin_tool import BuiltinTool
-from collections.abc import Generator
-from typing import Any
+import httpx
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
+from dify_plugin.file.file import File
 
-class S3Operator(Tool):
-    s3_client: Any = None
+# uploads above the threshold are sent as multipart uploads with concurrent parts
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+)
+READ_CHUNK_SIZE = 1024 * 1024
+# files to upload are buffered in memory up to this size, larger ones spill to disk
+UPLOAD_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+MAX_CONCURRENT_READS = 8
+DEFAULT_MAX_KEYS = 100
+
+_clients: dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
 
+
+def get_s3_client(
+    aws_region: Optional[str], aws_access_key_id: Optional[str], aws_secret_access_key: Optional[str]
+) -> Any:
+    """
+    Return the S3 client for a region and credentials, shared by all tool invocations.
+    Without both keys the default credential chain is used.
+    """
+    if not (aws_access_key_id and aws_secret_access_key):
+        aws_access_key_id = aws_secret_access_key = None
+    key = (
+        aws_region or None,
+        aws_access_key_id,
+        hashlib.sha256(aws_secret_access_key.encode("utf-8")).hexdigest() if aws_secret_access_key else None,
+    )
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.client(
+                "s3",
+                region_name=aws_region or None,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                config=Config(max_pool_connections=32, retries={"mode": "standard"}),
+            )
+            _clients[key] = client
+        return client
+
+
+class S3Operator(Tool):
     def _invoke(
         self,
         tool_parameters: dict[str, Any],
@@ -21,23 +69,24 @@ class S3Operator(Tool):
         """
         invoke tools
         """
+        bucket = key = ""
         try:
-            # Initialize S3 client if not already done
-            if not self.s3_client:
-                aws_region = tool_parameters.get("aws_region")
-                if aws_region:
-                    self.s3_client = boto3.client("s3", region_name=aws_region)
-                else:
-                    self.s3_client = boto3.client("s3")
+            s3_client = get_s3_client(
+                tool_parameters.get("aws_region"),
+                tool_parameters.get("aws_access_key_id"),
+                tool_parameters.get("aws_secret_access_key"),
+            )
 
             # Parse S3 URI
             s3_uri = tool_parameters.get("s3_uri")
             if not s3_uri:
                 yield self.create_text_message("s3_uri parameter is required")
+                return
 
             parsed_uri = urlparse(s3_uri)
             if parsed_uri.scheme != "s3":
                 yield self.create_text_message("Invalid S3 URI format. Must start with 's3://'")
+                return
 
             bucket = parsed_uri.netloc
             # Remove leading slash from key
@@ -46,40 +95,210 @@ class S3Operator(Tool):
             operation_type = tool_parameters.get("operation_type", "read")
             generate_presign_url = tool_parameters.get("generate_presign_url", False)
             presign_expiry = int(tool_parameters.get("presign_expiry", 3600))  # default 1 hour
+            max_bytes = int(tool_parameters.get("max_bytes") or 0) or None
 
             if operation_type == "write":
+                file = tool_parameters.get("file")
                 text_content = tool_parameters.get("text_content")
-                if not text_content:
-                    yield self.create_text_message("text_content parameter is required for write operation")
-
-                # Write content to S3
-                self.s3_client.put_object(Bucket=bucket, Key=key, Body=text_content.encode("utf-8"))
+                if isinstance(file, File):
+                    if not key or key.endswith("/"):
+                        key += file.filename
+                    with self._spool_file(file) as body:
+                        s3_client.upload_fileobj(
+                            body,
+                            bucket,
+                            key,
+                            ExtraArgs={"ContentType": file.mime_type or "application/octet-stream"},
+                            Config=TRANSFER_CONFIG,
+                        )
+                elif text_content:
+                    # Write content to S3
+                    s3_client.put_object(Bucket=bucket, Key=key, Body=text_content.encode("utf-8"))
+                else:
+                    yield self.create_text_message("text_content or file parameter is required for write operation")
+                    return
                 result = f"s3://{bucket}/{key}"
 
                 # Generate presigned URL for the written object if requested
                 if generate_presign_url:
-                    result = self.s3_client.generate_presigned_url(
+                    result = s3_client.generate_presigned_url(
                         "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=presign_expiry
                     )
 
+            elif operation_type == "list":
+                yield self.create_json_message(
+                    {"objects": self._list_objects(s3_client, bucket, key, self._max_keys(tool_parameters))}
+                )
+                return
+
+            elif operation_type == "batch_read":
+                yield from self._batch_read(
+                    s3_client, bucket, key, self._max_keys(tool_parameters), max_bytes
+                )
+                return
+
             else:  # read operation
                 # Get object from S3
                 if generate_presign_url:
                     # Generate presigned URL if requested
-                    result = self.s3_client.generate_presigned_url(
+                    result = s3_client.generate_presigned_url(
                         "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=presign_expiry
                     )
-                else: 
-                    # Only for text
-                    response = self.s3_client.get_object(Bucket=bucket, Key=key)
-                    result = response["Body"].read().decode("utf-8")
+                else:
+                    content, content_type, partial = self._read_object(
+                        s3_client, bucket, key, tool_parameters.get("byte_range"), max_bytes
+                    )
+                    text = self._decode_text(content, partial)
+                    if text is None:
+                        yield self.create_blob_message(
+                            content, meta={"filename": key.rsplit("/", 1)[-1], "mime_type": content_type}
+                        )
+                        return
+                    result = text
 
-                # Generate presigned URL if requested
             yield self.create_text_message(text=result)
 
-        except self.s3_client.exceptions.NoSuchBucket:
-            yield self.create_text_message(f"Bucket '{bucket}' does not exist")
-        except self.s3_client.exceptions.NoSuchKey:
-            yield self.create_text_message(f"Object '{key}' does not exist in bucket '{bucket}'")
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code == "NoSuchBucket":
+                yield self.create_text_message(f"Bucket '{bucket}' does not exist")
+            elif code == "NoSuchKey":
+                yield self.create_text_message(f"Object '{key}' does not exist in bucket '{bucket}'")
+            else:
+                yield self.create_text_message(f"Exception: {str(e)}")
         except Exception as e:
             yield self.create_text_message(f"Exception: {str(e)}")
+
+    @staticmethod
+    def _max_keys(tool_parameters: dict[str, Any]) -> int:
+        return int(tool_parameters.get("max_keys") or DEFAULT_MAX_KEYS)
+
+    @staticmethod
+    def _spool_file(file: File) -> IO[bytes]:
+        """
+        Download a file into a spooled temporary file, so that large files are uploaded
+        from disk in parts instead of being held in memory
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+        with httpx.stream("GET", file.url, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(READ_CHUNK_SIZE):
+                spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    @staticmethod
+    def _read_object(
+        s3_client: Any, bucket: str, key: str, byte_range: Optional[str] = None, max_bytes: Optional[int] = None
+    ) -> tuple[bytes, str, bool]:
+        """
+        Read an object, or the byte range `start-end` of it, streaming the body and
+        stopping after max_bytes
+
+        :return: the content read, the content type of the object, and whether the
+            content is only a part of the object
+        """
+        kwargs = {"Bucket": bucket, "Key": key}
+        if byte_range:
+            kwargs["Range"] = f"bytes={byte_range}"
+        elif max_bytes:
+            # only ask for what will be read
+            kwargs["Range"] = f"bytes=0-{max_bytes - 1}"
+        try:
+            response = s3_client.get_object(**kwargs)
+        except ClientError as e:
+            # S3 rejects any range of an empty object
+            if max_bytes and not byte_range and e.response.get("Error", {}).get("Code") == "InvalidRange":
+                response = s3_client.get_object(Bucket=bucket, Key=key)
+            else:
+                raise
+        body = response["Body"]
+        chunks = []
+        size = 0
+        # ranged responses tell where the part lies, as "bytes 0-999/5000"
+        partial = False
+        content_range = response.get("ContentRange")
+        if content_range:
+            span, _, total = content_range.removeprefix("bytes ").partition("/")
+            start, _, end = span.partition("-")
+            partial = int(start) > 0 or (total.isdigit() and int(end) + 1 < int(total))
+        try:
+            for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+                if max_bytes and size + len(chunk) >= max_bytes:
+                    chunks.append(chunk[: max_bytes - size])
+                    # a byte range longer than max_bytes is cut here
+                    partial = partial or size + len(chunk) > max_bytes
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+        finally:
+            body.close()
+        return b"".join(chunks), response.get("ContentType", "application/octet-stream"), partial
+
+    @staticmethod
+    def _decode_text(content: bytes, partial: bool) -> Optional[str]:
+        """
+        Decode utf-8 text, or return None for binary content. A part of an object may
+        start and end inside a multi-byte character, those incomplete bytes are dropped.
+        """
+        if partial:
+            # continuation bytes of a character that started before the part
+            start = 0
+            while start < min(3, len(content)) and 0x80 <= content[start] <= 0xBF:
+                start += 1
+            content = content[start:]
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            # without final, an incomplete trailing sequence is held back instead of raising
+            return decoder.decode(content, final=not partial)
+        except UnicodeDecodeError:
+            return None
+
+    @staticmethod
+    def _list_objects(s3_client: Any, bucket: str, prefix: str, max_keys: int) -> list[dict[str, Any]]:
+        objects = []
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=bucket, Prefix=prefix, PaginationConfig={"MaxItems": max_keys, "PageSize": min(max_keys, 1000)}
+        ):
+            for item in page.get("Contents", []):
+                objects.append(
+                    {
+                        "key": item["Key"],
+                        "size": item["Size"],
+                        "last_modified": item["LastModified"].isoformat(),
+                    }
+                )
+        return objects
+
+    def _batch_read(
+        self, s3_client: Any, bucket: str, prefix: str, max_keys: int, max_bytes: Optional[int]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        Read the objects under a prefix concurrently, yielding them in key order. max_bytes
+        is the budget for all objects together; objects that do not fit are listed as skipped.
+        """
+        objects = [item for item in self._list_objects(s3_client, bucket, prefix, max_keys) if item["size"] > 0]
+        selected = []
+        skipped = []
+        remaining = max_bytes
+        for item in objects:
+            if remaining is not None and item["size"] > remaining:
+                skipped.append(item["key"])
+                continue
+            selected.append(item)
+            if remaining is not None:
+                remaining -= item["size"]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_READS) as executor:
+            results = executor.map(lambda item: self._read_object(s3_client, bucket, item["key"]), selected)
+            for item, (content, content_type, partial) in zip(selected, results):
+                text = self._decode_text(content, partial)
+                if text is None:
+                    yield self.create_blob_message(
+                        content, meta={"filename": item["key"].rsplit("/", 1)[-1], "mime_type": content_type}
+                    )
+                else:
+                    yield self.create_json_message({"key": item["key"], "content": text})
+        if skipped:
+            yield self.create_json_message({"skipped": skipped, "reason": "max_bytes exceeded"})
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+from dify_plugin.entities.tool import ToolInvokeMessage
+from dify_plugin.file.entities import FileType
+from dify_plugin.file.file import File
+from moto import mock_aws
+
+from tools import s3_operator
+from tools.s3_operator import S3Operator
+
+BUCKET = "test-bucket"
+REGION = "us-east-1"
+FILE_SERVER_PORT = 12349
+# mostly three byte characters, a byte budget rarely ends on a character boundary
+CJK_TEXT = "亚马逊云科技的对象存储服务。" * 200
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    # clients created outside of the mock would talk to AWS
+    monkeypatch.setattr(s3_operator, "_clients", {})
+    with mock_aws():
+        client = boto3.client("s3", region_name=REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+class FileServer:
+    """
+    Serves one payload over HTTP, standing in for the plugin daemon's file URLs
+    """
+
+    def __init__(self, payload: bytes):
+        payload_ = payload
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload_)))
+                self.end_headers()
+                self.wfile.write(payload_)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.url = f"http://localhost:{FILE_SERVER_PORT}/file"
+        self.server = ThreadingHTTPServer(("localhost", FILE_SERVER_PORT), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _invoke(**tool_parameters) -> list[ToolInvokeMessage]:
+    tool = S3Operator.__new__(S3Operator)
+    tool.response_type = ToolInvokeMessage
+    return list(tool._invoke({"aws_region": REGION, **tool_parameters}))
+
+
+def _text(messages: list[ToolInvokeMessage]) -> str:
+    [message] = messages
+    assert message.type == ToolInvokeMessage.MessageType.TEXT
+    return message.message.text
+
+
+def test_text_round_trip(s3):
+    assert _text(
+        _invoke(operation_type="write", s3_uri=f"s3://{BUCKET}/notes/a.txt", text_content="héllo wörld")
+    ) == f"s3://{BUCKET}/notes/a.txt"
+    assert _text(_invoke(operation_type="read", s3_uri=f"s3://{BUCKET}/notes/a.txt")) == "héllo wörld"
+
+
+def test_binary_object_is_returned_as_blob(s3):
+    s3.put_object(Bucket=BUCKET, Key="image.png", Body=b"\x89PNG\r\n\x1a\n\xff\xfe", ContentType="image/png")
+
+    [message] = _invoke(operation_type="read", s3_uri=f"s3://{BUCKET}/image.png")
+    assert message.type == ToolInvokeMessage.MessageType.BLOB
+    assert message.message.blob == b"\x89PNG\r\n\x1a\n\xff\xfe"
+    assert message.meta == {"filename": "image.png", "mime_type": "image/png"}
+
+
+def test_byte_range_and_max_bytes(s3):
+    s3.put_object(Bucket=BUCKET, Key="digits.txt", Body=b"0123456789" * 10)
+    uri = f"s3://{BUCKET}/digits.txt"
+
+    assert _text(_invoke(operation_type="read", s3_uri=uri, byte_range="10-14")) == "01234"
+    assert _text(_invoke(operation_type="read", s3_uri=uri, max_bytes=7)) == "0123456"
+    # max_bytes also caps an explicit range
+    assert _text(_invoke(operation_type="read", s3_uri=uri, byte_range="5-50", max_bytes=3)) == "567"
+    assert _text(_invoke(operation_type="read", s3_uri=uri, max_bytes=1000)) == "0123456789" * 10
+
+    s3.put_object(Bucket=BUCKET, Key="empty.txt", Body=b"")
+    assert _text(_invoke(operation_type="read", s3_uri=f"s3://{BUCKET}/empty.txt", max_bytes=10)) == ""
+
+
+def test_truncated_cjk_text_is_still_text(s3):
+    s3.put_object(Bucket=BUCKET, Key="cjk.txt", Body=CJK_TEXT.encode("utf-8"))
+    uri = f"s3://{BUCKET}/cjk.txt"
+
+    # 1000 bytes end inside the 334th character
+    assert _text(_invoke(operation_type="read", s3_uri=uri, max_bytes=1000)) == CJK_TEXT[:333]
+    # a range may also start inside a character
+    assert _text(_invoke(operation_type="read", s3_uri=uri, byte_range="1-10")) == CJK_TEXT[1:3]
+
+
+def test_multipart_upload_of_a_large_file(s3):
+    payload = hashlib.sha256(b"seed").digest() * (20 * 1024 * 1024 // 32)
+    with FileServer(payload) as server:
+        file = File(
+            url=server.url,
+            mime_type="application/octet-stream",
+            filename="large.bin",
+            extension=".bin",
+            size=len(payload),
+            type=FileType.DOCUMENT,
+        )
+        assert _text(_invoke(operation_type="write", s3_uri=f"s3://{BUCKET}/uploads/", file=file)) == (
+            f"s3://{BUCKET}/uploads/large.bin"
+        )
+
+    head = s3.head_object(Bucket=BUCKET, Key="uploads/large.bin")
+    assert head["ContentLength"] == len(payload)
+    assert head["ContentType"] == "application/octet-stream"
+    # 20 MiB in parts of 8 MiB
+    assert head["ETag"].strip('"').endswith("-3")
+    assert s3.get_object(Bucket=BUCKET, Key="uploads/large.bin")["Body"].read() == payload
+
+
+def test_list_objects_under_a_prefix(s3):
+    for key in ("docs/b.txt", "docs/a.txt", "docs/c.txt", "other/d.txt"):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=key.encode())
+
+    [message] = _invoke(operation_type="list", s3_uri=f"s3://{BUCKET}/docs/")
+    assert [item["key"] for item in message.message.json_object["objects"]] == [
+        "docs/a.txt",
+        "docs/b.txt",
+        "docs/c.txt",
+    ]
+    assert message.message.json_object["objects"][0]["size"] == len("docs/a.txt")
+
+    [message] = _invoke(operation_type="list", s3_uri=f"s3://{BUCKET}/docs/", max_keys=2)
+    assert len(message.message.json_object["objects"]) == 2
+
+
+def test_batch_read_within_a_budget(s3):
+    s3.put_object(Bucket=BUCKET, Key="batch/1.txt", Body=b"a" * 40)
+    s3.put_object(Bucket=BUCKET, Key="batch/2.txt", Body=b"b" * 50)
+    s3.put_object(Bucket=BUCKET, Key="batch/3.txt", Body=b"c" * 30)
+    s3.put_object(Bucket=BUCKET, Key="batch/4.bin", Body=b"\xff\x00")
+    s3.put_object(Bucket=BUCKET, Key="batch/5.txt", Body="中文".encode("utf-8"))
+
+    messages = _invoke(operation_type="batch_read", s3_uri=f"s3://{BUCKET}/batch/", max_bytes=80)
+
+    # objects are read in key order, those that do not fit the budget are skipped
+    assert [message.message.json_object for message in messages if message.type == ToolInvokeMessage.MessageType.JSON] == [
+        {"key": "batch/1.txt", "content": "a" * 40},
+        {"key": "batch/3.txt", "content": "c" * 30},
+        {"key": "batch/5.txt", "content": "中文"},
+        {"skipped": ["batch/2.txt"], "reason": "max_bytes exceeded"},
+    ]
+    [blob] = [message for message in messages if message.type == ToolInvokeMessage.MessageType.BLOB]
+    assert blob.message.blob == b"\xff\x00"
+
+
+def test_missing_bucket_and_key(s3):
+    assert _text(_invoke(operation_type="read", s3_uri=f"s3://{BUCKET}/missing.txt")) == (
+        f"Object 'missing.txt' does not exist in bucket '{BUCKET}'"
+    )
+    assert _text(_invoke(operation_type="read", s3_uri="s3://no-such-bucket/a.txt")) == (
+        "Bucket 'no-such-bucket' does not exist"
+    )
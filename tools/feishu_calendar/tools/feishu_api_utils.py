@@ -1,5 +1,8 @@
+import hashlib
 import json
-from typing import Any, Optional, cast
+import threading
+import time
+from typing import Any, Callable, Optional, cast
 
 import httpx
 
@@ -51,6 +54,78 @@ def convert_update_records(json_str):
     except Exception as e:
         raise ValueError(f"An error occurred while processing the data: {e}")
 
+
+# tokens are refreshed this long before they expire
+TOKEN_REFRESH_MARGIN = 5 * 60
+# used when the token response carries no expire, tenant access tokens live two hours
+DEFAULT_TOKEN_EXPIRE = 7200
+# error codes for a missing, invalid or expired tenant access token
+INVALID_TOKEN_CODES = {99991661, 99991663, 99991668}
+
+
+class TenantAccessTokenCache:
+    """
+    Process-wide cache of tenant access tokens, keyed by app id and a hash of the app secret.
+
+    A token is refreshed once it is within TOKEN_REFRESH_MARGIN of its expiry. Only one
+    caller per app fetches a new token; while it does, the others keep using the old
+    token if it is still valid, or wait for the new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: dict[tuple[str, str], tuple[str, float]] = {}
+        self._refresh_locks: dict[tuple[str, str], threading.Lock] = {}
+
+    @staticmethod
+    def _key(app_id: str, app_secret: str) -> tuple[str, str]:
+        return app_id, hashlib.sha256(app_secret.encode("utf-8")).hexdigest()
+
+    def get(self, app_id: str, app_secret: str, fetch: Callable[[], dict]) -> str:
+        key = self._key(app_id, app_secret)
+        with self._lock:
+            entry = self._tokens.get(key)
+            refresh_lock = self._refresh_locks.setdefault(key, threading.Lock())
+        now = time.monotonic()
+        if entry and entry[1] - TOKEN_REFRESH_MARGIN > now:
+            return entry[0]
+
+        still_valid = entry is not None and entry[1] > now
+        if not refresh_lock.acquire(blocking=not still_valid):
+            # another caller is refreshing, the current token can still be used meanwhile
+            return entry[0]
+        try:
+            with self._lock:
+                entry = self._tokens.get(key)
+            now = time.monotonic()
+            if entry and entry[1] - TOKEN_REFRESH_MARGIN > now:
+                return entry[0]
+            try:
+                res = fetch()
+            except Exception:
+                if entry and entry[1] > now:
+                    return entry[0]
+                raise
+            token = res.get("tenant_access_token", "")
+            expire = res.get("expire") or DEFAULT_TOKEN_EXPIRE
+            with self._lock:
+                self._tokens[key] = (token, now + expire)
+            return token
+        finally:
+            refresh_lock.release()
+
+    def invalidate(self, app_id: str, app_secret: str, token: str) -> None:
+        key = self._key(app_id, app_secret)
+        with self._lock:
+            entry = self._tokens.get(key)
+            # a concurrent refresh may already have replaced the rejected token
+            if entry and entry[0] == token:
+                del self._tokens[key]
+
+
+tenant_access_token_cache = TenantAccessTokenCache()
+
+
 class FeishuRequest:
     API_BASE_URL = "https://lark-plugin-api.solutionsuite.cn/lark-plugin"
 
@@ -60,8 +135,9 @@ class FeishuRequest:
 
     @property
     def tenant_access_token(self):
-        res = self.get_tenant_access_token(self.app_id, self.app_secret)
-        return res.get("tenant_access_token")
+        return tenant_access_token_cache.get(
+            self.app_id, self.app_secret, lambda: self.get_tenant_access_token(self.app_id, self.app_secret)
+        )
 
     def _send_request(
         self,
@@ -76,8 +152,14 @@ class FeishuRequest:
             "user-agent": "Dify",
         }
         if require_token:
-            headers["tenant-access-token"] = f"{self.tenant_access_token}"
+            token = self.tenant_access_token
+            headers["tenant-access-token"] = f"{token}"
         res = httpx.request(method=method, url=url, headers=headers, json=payload, params=params, timeout=30).json()
+        if require_token and res.get("code") in INVALID_TOKEN_CODES:
+            # the token was revoked or expired early, fetch a new one and retry once
+            tenant_access_token_cache.invalidate(self.app_id, self.app_secret, token)
+            headers["tenant-access-token"] = f"{self.tenant_access_token}"
+            res = httpx.request(method=method, url=url, headers=headers, json=payload, params=params, timeout=30).json()
         if res.get("code") != 0:
             raise Exception(res)
         return res
@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import Any, Generator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# requests in flight at the same time for one tool invocation
+MAX_CONCURRENT_REQUESTS = 8
+PER_PAGE = 100
+REQUEST_TIMEOUT = (10, 60)
+
+
+@lru_cache(maxsize=1)
+def get_session() -> requests.Session:
+    """
+    Session shared by all GitLab tools, so that connections are kept alive and reused by
+    concurrent requests. It is created on first use, after gevent has patched socket and threading.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def iter_pages(
+    url: str, headers: dict[str, str], params: Optional[dict[str, Any]], ssl_verify: bool
+) -> Generator[Any, None, None]:
+    """
+    Yield the items of a paginated GitLab list endpoint, following the `next` links of
+    both offset and keyset pagination
+    """
+    params = {"per_page": PER_PAGE, **(params or {})}
+    next_url: Optional[str] = url
+    while next_url:
+        response = get_session().get(
+            next_url, headers=headers, params=params, verify=ssl_verify, timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        yield from response.json()
+        next_url = response.links.get("next", {}).get("url")
+        # the next link carries all query parameters
+        params = None
@@ -1,10 +1,13 @@
+import concurrent.futures
 import json
 import urllib.parse
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Any, Generator
 import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
+from tools.gitlab_api_utils import MAX_CONCURRENT_REQUESTS, iter_pages
 
 
 class GitlabCommitsTool(Tool):
@@ -48,10 +51,15 @@ class GitlabCommitsTool(Tool):
         change_type: str,
         is_repository: bool,
         ssl_verify: bool,
-    ) -> list[dict[str, Any]]:
+    ) -> Generator[dict[str, Any], None, None]:
+        """
+        Yield the changes of the commits in the time range, in commit order.
+
+        Diffs are fetched by a bounded pool while the commit list is still being paged
+        through; results are yielded as soon as the diffs of all earlier commits are in.
+        """
         domain = site_url
         headers = {"PRIVATE-TOKEN": access_token}
-        results = []
         try:
             encoded_repository = urllib.parse.quote(repository, safe="")
             commits_url = f"{domain}/api/v4/projects/{encoded_repository}/repository/commits"
@@ -60,56 +68,72 @@ class GitlabCommitsTool(Tool):
                 params["ref_name"] = branch
             if employee:
                 params["author"] = employee
-            commits_response = requests.get(commits_url, headers=headers, params=params, verify=ssl_verify)
-            commits_response.raise_for_status()
-            commits = commits_response.json()
-            for commit in commits:
-                commit_sha = commit["id"]
-                author_name = commit["author_name"]
-                diff_url = f"{domain}/api/v4/projects/{encoded_repository}/repository/commits/{commit_sha}/diff"
-                diff_response = requests.get(diff_url, headers=headers, verify=ssl_verify) 
-                diff_response.raise_for_status()
-                diffs = diff_response.json()
-                for diff in diffs:
-                    added_lines = diff["diff"].count("\n+")
-                    removed_lines = diff["diff"].count("\n-")
-                    total_changes = added_lines + removed_lines
-                    if change_type == "new":
-                        if added_lines > 1:
-                            final_code = "".join(
-                                [
-                                    line[1:]
-                                    for line in diff["diff"].split("\n")
-                                    if line.startswith("+") and (not line.startswith("+++"))
-                                ]
-                            )
-                            results.append(
-                                {
-                                    "diff_url": diff_url,
-                                    "commit_sha": commit_sha,
-                                    "author_name": author_name,
-                                    "diff": final_code,
-                                }
-                            )
-                    elif total_changes > 1:
-                        final_code = "".join(
-                            [
-                                line[1:]
-                                for line in diff["diff"].split("\n")
-                                if (line.startswith("+") or line.startswith("-"))
-                                and (not line.startswith("+++"))
-                                and (not line.startswith("---"))
-                            ]
-                        )
-                        final_code_escaped = json.dumps(final_code)[1:-1]
-                        results.append(
-                            {
-                                "diff_url": diff_url,
-                                "commit_sha": commit_sha,
-                                "author_name": author_name,
-                                "diff": final_code_escaped,
-                            }
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+                pending: deque[concurrent.futures.Future] = deque()
+                try:
+                    for commit in iter_pages(commits_url, headers, params, ssl_verify):
+                        diff_url = f"{domain}/api/v4/projects/{encoded_repository}/repository/commits/{commit['id']}/diff"
+                        pending.append(
+                            executor.submit(self._fetch_commit_changes, commit, diff_url, headers, change_type, ssl_verify)
                         )
+                        # keep a bounded number of diffs ahead of the consumer
+                        while len(pending) > MAX_CONCURRENT_REQUESTS * 2 or (pending and pending[0].done()):
+                            yield from pending.popleft().result()
+                    while pending:
+                        yield from pending.popleft().result()
+                finally:
+                    for future in pending:
+                        future.cancel()
         except requests.RequestException as e:
             print(f"Error fetching data from GitLab: {e}")
+
+    def _fetch_commit_changes(
+        self, commit: dict[str, Any], diff_url: str, headers: dict[str, str], change_type: str, ssl_verify: bool
+    ) -> list[dict[str, Any]]:
+        results = []
+        for diff in iter_pages(diff_url, headers, None, ssl_verify):
+            added_lines, removed_lines, added_code, changed_code = self._classify_diff(diff["diff"])
+            if change_type == "new":
+                if added_lines > 1:
+                    final_code = added_code
+                else:
+                    continue
+            elif added_lines + removed_lines > 1:
+                final_code = json.dumps(changed_code)[1:-1]
+            else:
+                continue
+            results.append(
+                {
+                    "diff_url": diff_url,
+                    "commit_sha": commit["id"],
+                    "author_name": commit["author_name"],
+                    "diff": final_code,
+                }
+            )
         return results
+
+    @staticmethod
+    def _classify_diff(diff: str) -> tuple[int, int, str, str]:
+        """
+        Classify the lines of a diff in one pass
+
+        :return: number of added and removed lines, the added code and the changed code,
+            both without the leading +/- and the file headers
+        """
+        added_lines = 0
+        removed_lines = 0
+        added_code = []
+        changed_code = []
+        for line in diff.split("\n"):
+            if line.startswith("+"):
+                if line.startswith("+++"):
+                    continue
+                added_lines += 1
+                added_code.append(line[1:])
+                changed_code.append(line[1:])
+            elif line.startswith("-"):
+                if line.startswith("---"):
+                    continue
+                removed_lines += 1
+                changed_code.append(line[1:])
+        return added_lines, removed_lines, "".join(added_code), "".join(changed_code)
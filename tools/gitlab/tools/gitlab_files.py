@@ -1,8 +1,16 @@
+import concurrent.futures
+import tempfile
 import urllib.parse
+import zipfile
 from typing import Any, Union, Generator
 import requests
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
+from tools.gitlab_api_utils import MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT, get_session, iter_pages
+
+# archives up to this size are kept in memory while they are read
+ARCHIVE_SPOOL_MAX_SIZE = 32 * 1024 * 1024
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
 
 
 class GitlabFilesTool(Tool):
@@ -13,6 +21,7 @@ class GitlabFilesTool(Tool):
         repository = tool_parameters.get("repository", "")
         branch = tool_parameters.get("branch", "")
         path = tool_parameters.get("path", "")
+        mode = tool_parameters.get("mode", "files")
         if not project and (not repository):
             yield self.create_text_message("Either project or repository is required")
         if not branch:
@@ -26,64 +35,128 @@ class GitlabFilesTool(Tool):
         if "site_url" not in self.runtime.credentials or not self.runtime.credentials.get("site_url"):
             site_url = "https://gitlab.com"
         ssl_verify = self.runtime.credentials.get("ssl_verify", True)
-        result = []
         if repository:
-            result = self.fetch_files(site_url, access_token, repository, branch, path, True, ssl_verify)
+            result = self.fetch_files(site_url, access_token, repository, branch, path, True, ssl_verify, mode)
         else:
-            project_id = self.get_project_id(site_url, access_token, repository)
-            if project_id:
-                result = self.fetch_files(site_url, access_token, project, branch, path, False, ssl_verify)
+            result = self.fetch_files(site_url, access_token, project, branch, path, False, ssl_verify, mode)
 
         for item in result:
             yield self.create_json_message(item)
 
     def fetch_files(
-        self, site_url: str, access_token: str, identifier: str, branch: str, path: str, is_repository: bool, ssl_verify: bool
-    ) -> list[dict[str, Any]]:
+        self,
+        site_url: str,
+        access_token: str,
+        identifier: str,
+        branch: str,
+        path: str,
+        is_repository: bool,
+        ssl_verify: bool,
+        mode: str = "files",
+    ) -> Generator[dict[str, Any], None, None]:
+        """
+        Yield the files below path as they are downloaded.
+
+        In files mode the whole tree is listed with recursive, paginated requests and the
+        blobs are downloaded concurrently over the shared session. In archive mode the
+        directory is downloaded as one zip archive instead, which is faster for large trees.
+        """
         domain = site_url
         headers = {"PRIVATE-TOKEN": access_token}
-        results = []
-        tree_url = None
         try:
             if is_repository:
-                encoded_identifier = urllib.parse.quote(identifier, safe="")
-                tree_url = f"{domain}/api/v4/projects/{encoded_identifier}/repository/tree?path={path}&ref={branch}"
+                project_url = f"{domain}/api/v4/projects/{urllib.parse.quote(identifier, safe='')}"
             else:
-                project_id = self.get_project_id(site_url, access_token, identifier)
-                if project_id:
-                    tree_url = f"{domain}/api/v4/projects/{project_id}/repository/tree?path={path}&ref={branch}"
-            if tree_url:
-                response = requests.get(tree_url, headers=headers, verify=ssl_verify)
-                response.raise_for_status()
-                items = response.json()
-                for item in items:
-                    item_path = item["path"]
-                    if item["type"] == "tree":
-                        results.extend(
-                            self.fetch_files(site_url, access_token, identifier, branch, item_path, is_repository, ssl_verify)
-                        )
-                    else:
-                        encoded_item_path = urllib.parse.quote(item_path, safe="")
-                        if is_repository:
-                            file_url = f"{domain}/api/v4/projects/{encoded_identifier}/repository/files/{encoded_item_path}/raw?ref={branch}"
-                        else:
-                            file_url = f"{domain}/api/v4/projects/{project_id}/repository/files{encoded_item_path}/raw?ref={branch}"
-                        file_response = requests.get(file_url, headers=headers, verify=ssl_verify)
-                        file_response.raise_for_status()
-                        file_content = file_response.text
-                        results.append({"path": item_path, "branch": branch, "content": file_content})
+                project_id = self.get_project_id(site_url, access_token, identifier, ssl_verify)
+                if not project_id:
+                    return
+                project_url = f"{domain}/api/v4/projects/{project_id}"
+
+            if mode == "archive":
+                yield from self._fetch_archive(project_url, headers, branch, path, ssl_verify)
+                return
+
+            tree = iter_pages(
+                f"{project_url}/repository/tree",
+                headers,
+                {"path": path, "ref": branch, "recursive": "true"},
+                ssl_verify,
+            )
+            blob_paths = [item["path"] for item in tree if item["type"] == "blob"]
+            if not blob_paths:
+                # the path is a file rather than a directory
+                blob_paths = [path]
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+                futures = [
+                    executor.submit(self._fetch_file, project_url, headers, branch, item_path, ssl_verify)
+                    for item_path in blob_paths
+                ]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        file = future.result()
+                        if file is not None:
+                            yield file
+                finally:
+                    for future in futures:
+                        future.cancel()
         except requests.RequestException as e:
             print(f"Error fetching data from GitLab: {e}")
-        return results
 
-    def get_project_id(self, site_url: str, access_token: str, project_name: str) -> Union[str, None]:
+    def _fetch_file(
+        self, project_url: str, headers: dict[str, str], branch: str, item_path: str, ssl_verify: bool
+    ) -> Union[dict[str, Any], None]:
+        encoded_item_path = urllib.parse.quote(item_path, safe="")
+        file_response = get_session().get(
+            f"{project_url}/repository/files/{encoded_item_path}/raw",
+            headers=headers,
+            params={"ref": branch},
+            verify=ssl_verify,
+            timeout=REQUEST_TIMEOUT,
+        )
+        if file_response.status_code == 404:
+            return None
+        file_response.raise_for_status()
+        return {"path": item_path, "branch": branch, "content": file_response.text}
+
+    def _fetch_archive(
+        self, project_url: str, headers: dict[str, str], branch: str, path: str, ssl_verify: bool
+    ) -> Generator[dict[str, Any], None, None]:
+        params = {"sha": branch}
+        if path and path != "/":
+            params["path"] = path
+        with get_session().get(
+            f"{project_url}/repository/archive.zip",
+            headers=headers,
+            params=params,
+            verify=ssl_verify,
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_MAX_SIZE) as archive_file:
+                for chunk in response.iter_content(chunk_size=ARCHIVE_CHUNK_SIZE):
+                    archive_file.write(chunk)
+                archive_file.seek(0)
+                with zipfile.ZipFile(archive_file) as archive:
+                    for entry in archive.infolist():
+                        if entry.is_dir():
+                            continue
+                        # entries are nested in a directory named after the project and commit
+                        item_path = entry.filename.split("/", 1)[-1]
+                        yield {
+                            "path": item_path,
+                            "branch": branch,
+                            "content": archive.read(entry).decode("utf-8", errors="replace"),
+                        }
+
+    def get_project_id(
+        self, site_url: str, access_token: str, project_name: str, ssl_verify: bool = True
+    ) -> Union[str, None]:
         headers = {"PRIVATE-TOKEN": access_token}
         try:
-            url = f"{site_url}/api/v4/projects?search={project_name}"
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            projects = response.json()
-            for project in projects:
+            url = f"{site_url}/api/v4/projects"
+            for project in iter_pages(url, headers, {"search": project_name}, ssl_verify):
                 if project["name"] == project_name:
                     return project["id"]
         except requests.RequestException as e:
@@ -1,8 +1,10 @@
 import base64
-import io
+import concurrent.futures
 import json
 import logging
 import os
+import re
+import tempfile
 import time
 import zipfile
 from collections.abc import Generator
@@ -20,6 +22,16 @@ from yarl import URL
 
 logger = logging.getLogger(__name__)
 
+# result archives up to this size are kept in memory, larger ones spill to a temporary file
+ZIP_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+ZIP_CHUNK_SIZE = 1024 * 1024
+MAX_CONCURRENT_UPLOADS = 4
+# parse results are polled with exponential backoff, small documents are often done within seconds
+POLL_INITIAL_INTERVAL = 1
+POLL_MAX_INTERVAL = 10
+POLL_BACKOFF_FACTOR = 1.5
+POLL_TIMEOUT = 600
+
 
 @dataclass
 class Credentials:
@@ -158,12 +170,25 @@ class MineruTool(Tool):
             yield self.create_json_message({"content_list": content_list})
 
     def _parser_file_remote(self, credentials: Credentials, tool_parameters: Dict[str, Any]):
-        """Parse files by remote server."""
-        file = tool_parameters.get("file")
-        if not file:
+        """
+        Parse files by remote server.
+
+        All files are submitted in one batch, and the results of each file are yielded as
+        soon as it is parsed.
+        """
+        files = tool_parameters.get("file_list") or []
+        if tool_parameters.get("file"):
+            files = [tool_parameters["file"]]
+        if not isinstance(files, list):
+            files = [files]
+        if not files:
             logger.error("No file provided for file parsing")
             raise ValueError("File is required")
-        self._validate_file_type(file.filename)
+        for file in files:
+            if not isinstance(file, File):
+                logger.error("No file provided for file parsing")
+                raise ValueError("File is required")
+            self._validate_file_type(file.filename)
 
         header = self._get_headers(credentials)
 
@@ -175,7 +200,8 @@ class MineruTool(Tool):
             "layout_model": tool_parameters.get("layout_model", "doclayout_yolo"),
             "extra_formats": json.loads(tool_parameters.get("extra_formats", "[]")),
             "files": [
-                {"name": file.filename, "is_ocr": tool_parameters.get("enable_ocr", False)}
+                {"name": file.filename, "is_ocr": tool_parameters.get("enable_ocr", False), "data_id": str(index)}
+                for index, file in enumerate(files)
             ]
         }
         task_url = self._build_api_url(credentials.base_url, "api/v4/file-urls/batch")
@@ -192,107 +218,163 @@ class MineruTool(Tool):
             batch_id = result["data"]["batch_id"]
             urls = result["data"]["file_urls"]
 
-            res_upload = put(urls[0], data=file.blob)
-            if res_upload.status_code == 200:
-                logger.info(f"{urls[0]} upload success")
-            else:
-                logger.error(f"{urls[0]} upload failed")
-                raise Exception(f"{urls[0]} upload failed")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS) as executor:
+                list(executor.map(self._upload_file, urls, files))
 
-            extract_result = self._poll_get_parse_result(credentials, batch_id)
+            for extract_result in self._poll_get_parse_result(credentials, batch_id, len(files)):
+                if extract_result.get("state") == "failed":
+                    reason = f"Parse of {extract_result.get('file_name')} failed, reason: {extract_result.get('err_msg')}"
+                    if len(files) == 1:
+                        raise Exception(reason)
+                    yield self.create_text_message(reason)
+                    continue
+                yield from self._download_and_extract_zip(extract_result.get("full_zip_url"))
+                yield self.create_variable_message("full_zip_url", extract_result.get("full_zip_url"))
+        else:
+            logger.error('apply upload url failed,reason:{}'.format(result.get("msg")))
+            raise Exception('apply upload url failed,reason:{}'.format(result.get("msg")))
 
-            yield from self._download_and_extract_zip(extract_result.get("full_zip_url"))
-            yield self.create_variable_message("full_zip_url", extract_result.get("full_zip_url"))
+    @staticmethod
+    def _upload_file(url: str, file: File) -> None:
+        res_upload = put(url, data=file.blob)
+        if res_upload.status_code == 200:
+            logger.info(f"{url} upload success")
         else:
-            logger.error('apply upload url failed,reason:{}'.format(result.msg))
-            raise Exception('apply upload url failed,reason:{}'.format(result.msg))
+            logger.error(f"{url} upload failed")
+            raise Exception(f"{url} upload failed")
 
-    def _poll_get_parse_result(self, credentials: Credentials, batch_id: str) -> Dict[str, Any]:
-        """poll get parser result."""
+    def _poll_get_parse_result(
+            self,
+            credentials: Credentials,
+            batch_id: str,
+            file_count: int = 1
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Poll the batch until every file is done or failed, yielding each file's result once
+        it reaches one of these states. The interval starts short and grows exponentially.
+        """
         url = self._build_api_url(credentials.base_url, f"api/v4/extract-results/batch/{batch_id}")
         headers = self._get_headers(credentials)
-        max_retries = 50
-        retry_interval = 5
+        deadline = time.monotonic() + POLL_TIMEOUT
+        interval = POLL_INITIAL_INTERVAL
+        finished = set()
 
-        for _ in range(max_retries):
+        while True:
             response = get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json().get("data", {})
-                extract_result = data.get("extract_result", {})[0]
-                if extract_result.get("state") == "done":
-                    logger.info("Parse completed successfully")
-                    return extract_result
-                if extract_result.get("state") == "failed":
-                    logger.error(f"Parse failed, reason: {extract_result.get('err_msg')}")
-                    raise Exception(f"Parse failed, reason: {extract_result.get('err_msg')}")
-                logger.info(f"Parse in progress, state: {extract_result.get('state')}")
-            else:
+            if response.status_code != 200:
                 logger.warning(f"Failed to get parse result, status: {response.status_code}")
                 raise Exception(f"Failed to get parse result, status: {response.status_code}")
 
-            time.sleep(retry_interval)
-
-        logger.error("Polling timeout reached without getting completed result")
-        raise TimeoutError("Parse operation timed out")
+            data = response.json().get("data", {})
+            for index, extract_result in enumerate(data.get("extract_result", [])):
+                key = extract_result.get("data_id") or extract_result.get("file_name") or index
+                state = extract_result.get("state")
+                if key in finished or state not in ("done", "failed"):
+                    continue
+                finished.add(key)
+                if state == "done":
+                    logger.info(f"Parse of {extract_result.get('file_name')} completed successfully")
+                else:
+                    logger.error(f"Parse of {extract_result.get('file_name')} failed, "
+                                 f"reason: {extract_result.get('err_msg')}")
+                yield extract_result
+            if len(finished) >= file_count:
+                return
+
+            if time.monotonic() + interval > deadline:
+                logger.error("Polling timeout reached without getting completed result")
+                raise TimeoutError("Parse operation timed out")
+            logger.info(f"Parse in progress, {len(finished)}/{file_count} files finished")
+            time.sleep(interval)
+            interval = min(interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
 
     def _download_and_extract_zip(self, url: str) -> Generator[ToolInvokeMessage, None, None]:
-        """Download and extract zip file from URL."""
-        response = httpx.get(url)
-        response.raise_for_status()
+        """
+        Download the result archive to a spooled temporary file and extract it entry by entry.
 
+        Images are read and uploaded by a bounded pool while the other entries are processed.
+        """
         content = ZipContent()
 
-        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
-            for file_info in zip_file.infolist():
-                if file_info.is_dir():
-                    continue
-
-                file_name = file_info.filename.lower()
-                with zip_file.open(file_info) as f:
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE) as archive:
+            with httpx.stream("GET", url) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes(ZIP_CHUNK_SIZE):
+                    archive.write(chunk)
+            archive.seek(0)
+
+            with zipfile.ZipFile(archive) as zip_file, concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_UPLOADS
+            ) as executor:
+                image_uploads = []
+                for file_info in zip_file.infolist():
+                    if file_info.is_dir():
+                        continue
+
+                    file_name = file_info.filename.lower()
                     if file_name.startswith("images/") and file_name.endswith(('.png', '.jpg', '.jpeg')):
-                        image_bytes = f.read()
-                        upload_file_res = self._process_image(image_bytes, file_info)
-                        content.images.append(upload_file_res)
-                        if not upload_file_res.preview_url:
-                            base_name = os.path.basename(file_info.filename)
-                            yield self.create_blob_message(image_bytes,
-                                                           meta={"filename": base_name, "mime_type": "image/jpeg"})
-                    elif file_name.endswith(".md"):
-                        content.md_content = f.read().decode('utf-8')
-                    elif file_name.endswith('.json') and file_name != "layout.json":
-                        content.content_list.append(json.loads(f.read().decode('utf-8')))
-                    elif file_name.endswith('.html'):
-                        content.html_content = f.read().decode('utf-8')
-                        yield self.create_blob_message(content.html_content,
-                                                       meta={"filename": file_name, "mime_type": "text/html"})
-                    elif file_name.endswith('.docx'):
-                        content.docx_content = f.read()
-                        yield self.create_blob_message(content.docx_content,
-                                                       meta={"filename": file_name, "mime_type": "application/msword"})
-                    elif file_name.endswith('.tex'):
-                        content.latex_content = f.read().decode('utf-8')
-                        yield self.create_blob_message(content.latex_content,
-                                                       meta={"filename": file_name, "mime_type": "application/x-tex"})
+                        # the worker reads the image itself, so only images being uploaded are in memory
+                        image_uploads.append((file_info, executor.submit(self._process_image, zip_file, file_info)))
+                        continue
+                    with zip_file.open(file_info) as f:
+                        if file_name.endswith(".md"):
+                            content.md_content = f.read().decode('utf-8')
+                        elif file_name.endswith('.json') and file_name != "layout.json":
+                            content.content_list.append(json.loads(f.read().decode('utf-8')))
+                        elif file_name.endswith('.html'):
+                            content.html_content = f.read().decode('utf-8')
+                            yield self.create_blob_message(content.html_content,
+                                                           meta={"filename": file_name, "mime_type": "text/html"})
+                        elif file_name.endswith('.docx'):
+                            content.docx_content = f.read()
+                            yield self.create_blob_message(content.docx_content,
+                                                           meta={"filename": file_name, "mime_type": "application/msword"})
+                        elif file_name.endswith('.tex'):
+                            content.latex_content = f.read().decode('utf-8')
+                            yield self.create_blob_message(content.latex_content,
+                                                           meta={"filename": file_name, "mime_type": "application/x-tex"})
+
+                for file_info, upload in image_uploads:
+                    upload_file_res, image_bytes = upload.result()
+                    content.images.append(upload_file_res)
+                    if image_bytes is not None:
+                        base_name = os.path.basename(file_info.filename)
+                        yield self.create_blob_message(image_bytes,
+                                                       meta={"filename": base_name, "mime_type": "image/jpeg"})
+
         yield self.create_json_message({"content_list": content.content_list})
         content.md_content = self._replace_md_img_path(content.md_content, content.images)
         yield self.create_text_message(content.md_content)
         yield self.create_variable_message("images", content.images)
 
-    def _process_image(self, image_bytes: bytes, file_info: zipfile.ZipInfo) -> UploadFileResponse:
-        """Process an image file from the zip archive."""
+    def _process_image(
+            self,
+            zip_file: zipfile.ZipFile,
+            file_info: zipfile.ZipInfo
+    ) -> tuple[UploadFileResponse, Optional[bytes]]:
+        """
+        Upload an image file from the zip archive.
+
+        The image bytes are only returned when the upload has no preview url, in which case
+        the image is sent as a blob message instead.
+        """
+        image_bytes = zip_file.read(file_info)
         base_name = os.path.basename(file_info.filename)
-        return self.session.file.upload(
+        upload_file_res = self.session.file.upload(
             base_name,
             image_bytes,
             "image/jpeg"
         )
+        return upload_file_res, None if upload_file_res.preview_url else image_bytes
 
     @staticmethod
     def _replace_md_img_path(md_content: str, images: list[UploadFileResponse]) -> str:
-        for image in images:
-            if image.preview_url:
-                md_content = md_content.replace("images/" + image.name, image.preview_url)
-        return md_content
+        image_urls = {"images/" + image.name: image.preview_url for image in images if image.preview_url}
+        if not image_urls:
+            return md_content
+        # one pass over the markdown, longer paths first so that no path matches a prefix of another
+        pattern = re.compile("|".join(re.escape(path) for path in sorted(image_urls, key=len, reverse=True)))
+        return pattern.sub(lambda match: image_urls[match.group(0)], md_content)
 
     @staticmethod
     def _validate_file_type(filename: str) -> str:
@@ -4,8 +4,63 @@ This module provides a unified interface for interacting with the Notion API
 """
 
 import requests
+import threading
 import time
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, Generator, List, Optional, Union
+
+from requests.adapters import HTTPAdapter
+
+# Notion allows an average of three requests per second for each integration
+REQUESTS_PER_SECOND = 3
+REQUEST_TIMEOUT = 30
+
+
+@lru_cache(maxsize=1)
+def get_session() -> requests.Session:
+    """
+    Session shared by all Notion tools, so that connections are kept alive between requests.
+    It is created on first use, after gevent has patched socket and threading.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=8))
+    return session
+
+
+class RateLimiter:
+    """
+    Spaces out the requests made with one integration token across all threads.
+    A Retry-After from Notion pauses every request using the token.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(integration_token: str) -> RateLimiter:
+    with _rate_limiters_lock:
+        if integration_token not in _rate_limiters:
+            _rate_limiters[integration_token] = RateLimiter(REQUESTS_PER_SECOND)
+        return _rate_limiters[integration_token]
+
 
 class NotionClient:
     """
@@ -29,6 +84,7 @@ class NotionClient:
             "Notion-Version": self.API_VERSION,
             "Content-Type": "application/json"
         }
+        self.rate_limiter = get_rate_limiter(integration_token)
         
     def _make_request(self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None, 
                      json_data: Optional[Dict[str, Any]] = None, max_retries: int = 3) -> Dict[str, Any]:
@@ -50,18 +106,20 @@ class NotionClient:
         
         while retries <= max_retries:
             try:
-                response = requests.request(
+                self.rate_limiter.acquire()
+                response = get_session().request(
                     method=method,
                     url=url,
                     headers=self.headers,
                     params=params,
-                    json=json_data
+                    json=json_data,
+                    timeout=REQUEST_TIMEOUT
                 )
                 
                 # Handle rate limiting
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 1))
-                    time.sleep(retry_after)
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    self.rate_limiter.pause(retry_after)
                     retries += 1
                     continue
                     
@@ -210,6 +268,24 @@ class NotionClient:
             
         return self._make_request("get", f"/blocks/{block_id}/children", params=params)
     
+    def iter_block_children(self, block_id: str) -> Generator[Dict[str, Any], None, None]:
+        """
+        Yield all children blocks of a block, following the pagination cursor.
+        
+        Args:
+            block_id: The ID of the block to retrieve children from
+            
+        Returns:
+            Generator of block objects
+        """
+        start_cursor = None
+        while True:
+            data = self.retrieve_block_children(block_id, start_cursor=start_cursor)
+            yield from data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            start_cursor = data["next_cursor"]
+    
     def append_block_children(self, block_id: str, children: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Append children blocks to a block.
@@ -0,0 +1,236 @@
+"""
+Page content engine for the Notion tools
+Loads the full block tree of a page and renders it to markdown
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from tools.notion_client import NotionClient
+
+# requests in flight for one page, the client's rate limiter spaces them out
+MAX_CONCURRENT_REQUESTS = 3
+# file URLs in blocks are signed for an hour, cached content must not outlive them
+PAGE_CACHE_TTL = 50 * 60
+PAGE_CACHE_MAX_SIZE = 128
+# the children of these blocks are separate pages and databases
+SKIPPED_CHILDREN_TYPES = {"child_page", "child_database"}
+
+
+class PageContentCache:
+    """
+    Block trees of pages, valid while the page's last_edited_time is unchanged.
+    Notion does not update the timestamps of parent blocks when a nested block changes,
+    so subtrees are validated through the page they belong to.
+    """
+
+    def __init__(self, ttl: float = PAGE_CACHE_TTL, max_size: int = PAGE_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[str, float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], last_edited_time: str) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            cached_edited_time, expires, blocks = entry
+            if cached_edited_time != last_edited_time or expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return blocks
+
+    def set(self, key: Tuple[str, str], last_edited_time: str, blocks: List[Dict[str, Any]]):
+        with self.lock:
+            self.entries[key] = (last_edited_time, time.monotonic() + self.ttl, blocks)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+page_content_cache = PageContentCache()
+
+
+def _has_descendants(block: Dict[str, Any]) -> bool:
+    return block.get("has_children", False) and block.get("type") not in SKIPPED_CHILDREN_TYPES
+
+
+class PageContentLoader:
+    """
+    Loads the block tree of a page breadth-first with a bounded pool of workers.
+    Every block gets a "children" list with its own children blocks.
+    """
+
+    def __init__(self, client: NotionClient):
+        self.client = client
+
+    def _load_children(self, block: Dict[str, Any]) -> List[Dict[str, Any]]:
+        block["children"] = list(self.client.iter_block_children(block["id"]))
+        return block["children"]
+
+    def iter_blocks(
+        self, page_id: str, last_edited_time: Optional[str] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Yield the top level blocks of a page in order, each as soon as its whole subtree is loaded.
+
+        Args:
+            page_id: The ID of the page
+            last_edited_time: The page's last_edited_time, used to reuse a cached tree
+
+        Returns:
+            Generator of top level blocks with nested children
+        """
+        cache_key = (self.client.integration_token, page_id.replace("-", ""))
+        if last_edited_time:
+            cached = page_content_cache.get(cache_key, last_edited_time)
+            if cached is not None:
+                yield from cached
+                return
+
+        roots = []
+        # outstanding children requests below each top level block
+        pending: List[int] = []
+        root_of: Dict[Future, int] = {}
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+
+            def submit(block: Dict[str, Any], root: int):
+                root_of[executor.submit(self._load_children, block)] = root
+                pending[root] += 1
+
+            try:
+                for block in self.client.iter_block_children(page_id):
+                    roots.append(block)
+                    pending.append(0)
+                    if _has_descendants(block):
+                        submit(block, len(roots) - 1)
+
+                next_root = 0
+                while next_root < len(roots):
+                    if pending[next_root] == 0:
+                        yield roots[next_root]
+                        next_root += 1
+                        continue
+                    # the pool works through the queue in submission order, which is breadth-first
+                    done, _ = wait(root_of, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        root = root_of.pop(future)
+                        pending[root] -= 1
+                        for child in future.result():
+                            if _has_descendants(child):
+                                submit(child, root)
+            finally:
+                for future in root_of:
+                    future.cancel()
+
+        if last_edited_time:
+            page_content_cache.set(cache_key, last_edited_time, roots)
+
+
+def _rich_text_to_markdown(rich_text: List[Dict[str, Any]]) -> str:
+    parts = []
+    for text in rich_text:
+        content = text.get("plain_text", "")
+        annotations = text.get("annotations", {})
+        if content.strip():
+            if annotations.get("code"):
+                content = f"`{content}`"
+            if annotations.get("bold"):
+                content = f"**{content}**"
+            if annotations.get("italic"):
+                content = f"*{content}*"
+            if annotations.get("strikethrough"):
+                content = f"~~{content}~~"
+            if text.get("href"):
+                content = f"[{content}]({text['href']})"
+        parts.append(content)
+    return "".join(parts)
+
+
+def _file_url(data: Dict[str, Any]) -> str:
+    return data.get(data.get("type", ""), {}).get("url", "")
+
+
+def render_markdown(block: Dict[str, Any], depth: int = 0) -> str:
+    """
+    Render a block and its loaded children to markdown.
+
+    Args:
+        block: The block object with an optional "children" list
+        depth: Nesting level, used to indent nested list items
+
+    Returns:
+        Markdown text ending with a newline, or an empty string for unsupported blocks
+    """
+    block_type = block.get("type", "")
+    data = block.get(block_type, {})
+    text = _rich_text_to_markdown(data.get("rich_text", []))
+    indent = "    " * depth
+    children = block.get("children", [])
+
+    if block_type == "paragraph":
+        line = text
+    elif block_type in ("heading_1", "heading_2", "heading_3"):
+        line = f"{'#' * int(block_type[-1])} {text}"
+    elif block_type == "bulleted_list_item":
+        line = f"- {text}"
+    elif block_type == "numbered_list_item":
+        line = f"1. {text}"
+    elif block_type == "to_do":
+        line = f"- [{'x' if data.get('checked') else ' '}] {text}"
+    elif block_type == "toggle":
+        line = f"- {text}"
+    elif block_type == "quote":
+        line = "\n".join(f"> {part}" for part in text.split("\n"))
+    elif block_type == "callout":
+        emoji = (data.get("icon") or {}).get("emoji")
+        line = f"> {emoji} {text}" if emoji else f"> {text}"
+    elif block_type == "code":
+        code = "".join(text.get("plain_text", "") for text in data.get("rich_text", []))
+        line = f"```{data.get('language', '')}\n{code}\n```"
+    elif block_type == "equation":
+        line = f"$$\n{data.get('expression', '')}\n$$"
+    elif block_type == "divider":
+        line = "---"
+    elif block_type in ("image", "video", "file", "pdf"):
+        caption = _rich_text_to_markdown(data.get("caption", []))
+        prefix = "!" if block_type == "image" else ""
+        line = f"{prefix}[{caption or block_type}]({_file_url(data)})"
+    elif block_type in ("bookmark", "embed", "link_preview"):
+        line = f"[{data.get('url', '')}]({data.get('url', '')})"
+    elif block_type == "child_page":
+        line = f"[{data.get('title', 'Untitled')}](https://notion.so/{block.get('id', '').replace('-', '')})"
+    elif block_type == "child_database":
+        line = f"**{data.get('title', 'Untitled')}**"
+    elif block_type == "table":
+        rows = [
+            "| " + " | ".join(_rich_text_to_markdown(cell) for cell in row.get("table_row", {}).get("cells", [])) + " |"
+            for row in children
+        ]
+        if rows:
+            separator = "| " + " | ".join("---" for _ in range(data.get("table_width", 1))) + " |"
+            rows.insert(1, separator)
+        return "".join(f"{indent}{row}\n" for row in rows) + "\n"
+    elif block_type in ("column_list", "column", "synced_block"):
+        # layout blocks only group their children
+        return "".join(render_markdown(child, depth) for child in children)
+    else:
+        return ""
+
+    lines = "".join(f"{indent}{part}\n" for part in line.split("\n"))
+    if block_type in ("quote", "callout"):
+        # children of quotes and callouts stay inside the quote
+        nested = "".join(render_markdown(child) for child in children)
+        return lines + "".join(f"{indent}> {part}\n" for part in nested.splitlines() if part) + "\n"
+    if block_type in ("bulleted_list_item", "numbered_list_item", "to_do", "toggle"):
+        nested = "".join(render_markdown(child, depth + 1) for child in children)
+        # a blank line after top level items keeps a following paragraph out of the list
+        return lines + nested + ("\n" if depth == 0 else "")
+    # indenting the children of other blocks would turn them into code blocks
+    return lines + "\n" + "".join(render_markdown(child, depth) for child in children)
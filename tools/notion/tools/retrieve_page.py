@@ -6,6 +6,7 @@ from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
 from tools.notion_client import NotionClient
+from tools.notion_page_content import PageContentLoader, render_markdown
 
 class RetrievePageTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
@@ -34,23 +35,32 @@ class RetrievePageTool(Tool):
                 
                 # Format the page data
                 formatted_page = self._format_page_data(client, page_data)
+                title = formatted_page.get("title", "Untitled")
+                yield self.create_text_message(f"Retrieved page: {title}\n\n")
                 
-                # Retrieve page content if requested
+                # Retrieve page content if requested, rendering each top level block
+                # as soon as its subtree has been loaded
                 if include_content:
+                    blocks = []
+                    markdown = []
                     try:
-                        blocks_data = client.retrieve_block_children(page_id)
-                        blocks = blocks_data.get("results", [])
-                        formatted_page["content"] = self._format_blocks(blocks)
+                        loader = PageContentLoader(client)
+                        for block in loader.iter_blocks(page_id, page_data.get("last_edited_time")):
+                            blocks.append(block)
+                            block_markdown = render_markdown(block)
+                            if block_markdown:
+                                markdown.append(block_markdown)
+                                yield self.create_text_message(block_markdown)
                     except requests.HTTPError as e:
                         # If we can't get the content, just return the page data
                         formatted_page["content_error"] = str(e)
+                    formatted_page["content"] = self._format_blocks(blocks)
+                    formatted_page["markdown"] = "".join(markdown)
                 
                 # Format URL
                 formatted_page["url"] = client.format_page_url(page_id)
                 
                 # Return results
-                title = formatted_page.get("title", "Untitled")
-                yield self.create_text_message(f"Retrieved page: {title}")
                 yield self.create_json_message(formatted_page)
                 
             except requests.HTTPError as e:
@@ -186,6 +196,9 @@ class RetrievePageTool(Tool):
                 # For unsupported block types, just include the type
                 formatted_block["text"] = f"<{block_type} block>"
             
+            if block.get("children"):
+                formatted_block["children"] = self._format_blocks(block["children"])
+            
             formatted_blocks.append(formatted_block)
             
         return formatted_blocks 
\ No newline at end of file
@@ -1,11 +1,10 @@
-import asyncio
 from collections.abc import Generator
 from typing import Any
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
-from .utils import OneDriveClient
+from .utils import get_onedrive_client, run_async
 
 
 class DeleteFileByIdTool(Tool):
@@ -15,9 +14,9 @@ class DeleteFileByIdTool(Tool):
             yield self.create_text_message("File ID is required.")
             yield self.create_json_message({"error": "File ID is required."})
             return
-        client = OneDriveClient(self.runtime.credentials)
+        client = get_onedrive_client(self.runtime.credentials)
         try:
-            _ = asyncio.run(client.delete_file_by_id(file_id))
+            _ = run_async(client.delete_file_by_id(file_id))
             yield self.create_json_message({"success": True, "file_id": file_id})
         except Exception as e:
             yield self.create_json_message({"error": str(e)})
@@ -1,4 +1,3 @@
-import asyncio
 from collections.abc import Generator
 from typing import Any
 
@@ -7,7 +6,7 @@ from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from msgraph.generated.models.drive_item import DriveItem
 
-from .utils import OneDriveClient
+from .utils import OneDriveClient, get_onedrive_client, run_async
 
 
 class GetFileByIdTool(Tool):
@@ -21,10 +20,10 @@ class GetFileByIdTool(Tool):
             yield self.create_json_message({"error": "File ID is required."})
             return
 
-        client: OneDriveClient = OneDriveClient(self.runtime.credentials)
+        client: OneDriveClient = get_onedrive_client(self.runtime.credentials)
 
         try:
-            file: DriveItem = asyncio.run(client.get_file_by_id(file_id))
+            file: DriveItem = run_async(client.get_file_by_id(file_id))
 
             if not file:
                 yield self.create_text_message("File not found.")
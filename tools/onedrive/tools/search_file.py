@@ -1,16 +1,15 @@
-import asyncio
 from collections.abc import Generator
 from typing import Any
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
-from tools.utils import OneDriveClient
+from tools.utils import get_onedrive_client, run_async
 
 
 class SearchFileTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
-        client = OneDriveClient(self.runtime.credentials)
+        client = get_onedrive_client(self.runtime.credentials)
         query = tool_parameters.get("query")
         limit = tool_parameters.get("limit", 10)
 
@@ -19,7 +18,7 @@ class SearchFileTool(Tool):
             yield self.create_json_message({"error": "Query parameter is required."})
             return
 
-        files = asyncio.run(client.search_file(query)).value
+        files = run_async(client.search_file(query)).value
         if len(files) > limit:
             files = files[:limit]
 
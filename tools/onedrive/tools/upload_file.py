@@ -1,4 +1,3 @@
-import asyncio
 from collections.abc import Generator
 from typing import Any
 
@@ -7,7 +6,7 @@ from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin.file.file import File
 from kiota_abstractions.api_error import APIError
 
-from .utils import OneDriveClient
+from .utils import SIMPLE_UPLOAD_MAX_SIZE, get_onedrive_client, run_async
 
 
 class UploadFileTool(Tool):
@@ -20,20 +19,28 @@ class UploadFileTool(Tool):
             yield self.create_json_message({"error": "File is required."})
             return
 
-        file_content = file.blob
         original_file_name = file.filename
 
         file_name = custom_file_name if custom_file_name else original_file_name
 
-        if not file_content:
+        # large files are streamed into an upload session instead of being loaded into memory
+        stream_upload = bool(file.size and file.size > SIMPLE_UPLOAD_MAX_SIZE)
+        file_content = None if stream_upload else file.blob
+
+        if not stream_upload and not file_content:
             yield self.create_text_message("File content is empty.")
             yield self.create_json_message({"error": "File content is empty."})
             return
 
-        client = OneDriveClient(self.runtime.credentials)
+        client = get_onedrive_client(self.runtime.credentials)
 
         try:
-            uploaded_file = asyncio.run(client.upload_file(file_name, file_content))
+            if stream_upload:
+                uploaded_file = run_async(
+                    client.upload_file_from_url(file_name, file.url, file.size)
+                )
+            else:
+                uploaded_file = run_async(client.upload_file(file_name, file_content))
 
             if uploaded_file:
                 file_info = {
@@ -1,8 +1,87 @@
-from typing import Any
+import asyncio
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Coroutine
+from typing import Any, Optional, TypeVar
 
+import httpx
 from azure.core.credentials import AccessToken, TokenCredential
+from kiota_serialization_json.json_parse_node_factory import JsonParseNodeFactory
+from msgraph.generated.drives.item.items.item.create_upload_session.create_upload_session_post_request_body import (
+    CreateUploadSessionPostRequestBody,
+)
+from msgraph.generated.models.drive_item import DriveItem
+from msgraph.generated.models.drive_item_uploadable_properties import (
+    DriveItemUploadableProperties,
+)
 from msgraph.graph_service_client import GraphServiceClient
 
+T = TypeVar("T")
+
+# Graph rejects simple uploads larger than 4 MB
+SIMPLE_UPLOAD_MAX_SIZE = 4 * 1024 * 1024
+# upload session fragments must be a multiple of 320 KiB
+UPLOAD_CHUNK_SIZE = 32 * 320 * 1024
+MAX_CHUNK_RETRIES = 5
+RETRY_BACKOFF_BASE = 1
+RESUMABLE_STATUS_CODES = {416, 429, 500, 502, 503, 504}
+MAX_CACHED_CLIENTS = 32
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_http_client: Optional[httpx.AsyncClient] = None
+_clients: "OrderedDict[str, OneDriveClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="onedrive-event-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine on the event loop shared by all OneDrive tools and wait for its result.
+    The Graph clients and their connection pools are bound to this loop, so they can be
+    reused across invocations instead of being rebuilt by `asyncio.run` on every call.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    Client for upload session fragments and file downloads. Upload URLs are pre-authenticated,
+    so it must not send the Graph authorization header.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(60, connect=10))
+    return _http_client
+
+
+def get_onedrive_client(credentials: dict[str, Any]) -> "OneDriveClient":
+    """
+    Return the client for an access token, creating it on first use. Clients keep their
+    Graph connections and the id of the user's drive for as long as the token is in use.
+    """
+    access_token = credentials.get("access_token")
+    with _clients_lock:
+        client = _clients.get(access_token)
+        if client is None:
+            client = OneDriveClient(credentials)
+            _clients[access_token] = client
+            if len(_clients) > MAX_CACHED_CLIENTS:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(access_token)
+        return client
+
 
 class MockCredential(TokenCredential):
     token: AccessToken = None
@@ -24,16 +103,22 @@ class OneDriveClient:
             ),
             scopes=["Files.Read.All"],
         )
+        self._drive_id: Optional[str] = None
 
     def get_client(self) -> GraphServiceClient:
         return self.client
 
+    async def get_drive_id(self) -> str:
+        # the user's drive does not change for a token, so it is looked up once
+        if self._drive_id is None:
+            drive = await self.client.me.drive.get()
+            self._drive_id = drive.id
+        return self._drive_id
+
     async def get_file_by_id(self, file_id: str):
-        drive = (
-            await self.client.me.drive.get()
-        )  # Assuming you want to get the user's drive
+        drive_id = await self.get_drive_id()
         return (
-            await self.client.drives.by_drive_id(drive.id)
+            await self.client.drives.by_drive_id(drive_id)
             .items.by_drive_item_id(file_id)
             .get()
         )
@@ -42,23 +127,186 @@ class OneDriveClient:
         return await self.client.drives.by_drive_id(drive_id).get()
 
     async def delete_file_by_id(self, file_id: str):
-        drive = await self.client.me.drive.get()
-        await self.client.drives.by_drive_id(drive.id).items.by_drive_item_id(
+        drive_id = await self.get_drive_id()
+        await self.client.drives.by_drive_id(drive_id).items.by_drive_item_id(
             file_id
         ).delete()
 
     async def search_file(self, query: str):
-        drive = await self.client.me.drive.get()
+        drive_id = await self.get_drive_id()
 
-        return await self.client.drives.by_drive_id(drive.id).search_with_q(query).get()
+        return await self.client.drives.by_drive_id(drive_id).search_with_q(query).get()
 
     async def upload_file(self, file_name: str, file_content: bytes):
-        drive = await self.client.me.drive.get()
+        if len(file_content) > SIMPLE_UPLOAD_MAX_SIZE:
+            return await self.upload_large_file(
+                file_name, _iter_bytes(file_content), len(file_content)
+            )
+
+        drive_id = await self.get_drive_id()
 
         response = (
-            await self.client.drives.by_drive_id(drive.id)
+            await self.client.drives.by_drive_id(drive_id)
             .items.by_drive_item_id(f"root:/{file_name}:")
             .content.put(file_content)
         )
 
         return response
+
+    async def upload_file_from_url(
+        self, file_name: str, file_url: str, file_size: int
+    ) -> DriveItem:
+        """
+        Upload a file streamed from a URL, without holding all of it in memory
+        """
+        return await self.upload_large_file(
+            file_name, _iter_url(file_url), file_size
+        )
+
+    async def upload_large_file(
+        self, file_name: str, content: AsyncIterator[bytes], file_size: int
+    ) -> DriveItem:
+        """
+        Upload a file through an upload session, in fragments of UPLOAD_CHUNK_SIZE.
+        Fragments are retried and resumed from the range the session still expects.
+        """
+        drive_id = await self.get_drive_id()
+        session = await (
+            self.client.drives.by_drive_id(drive_id)
+            .items.by_drive_item_id(f"root:/{file_name}:")
+            .create_upload_session.post(
+                CreateUploadSessionPostRequestBody(
+                    item=DriveItemUploadableProperties(
+                        additional_data={
+                            "@microsoft.graph.conflictBehavior": "replace"
+                        }
+                    )
+                )
+            )
+        )
+        try:
+            return await _upload_chunks(
+                session.upload_url, _rechunk(content), file_size
+            )
+        except BaseException:
+            # cancel the session so that the uploaded fragments are released
+            try:
+                await _get_http_client().delete(session.upload_url)
+            except httpx.HTTPError:
+                pass
+            raise
+
+
+async def _iter_bytes(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+async def _iter_url(url: str) -> AsyncIterator[bytes]:
+    async with _get_http_client().stream("GET", url) as response:
+        response.raise_for_status()
+        async for piece in response.aiter_bytes():
+            yield piece
+
+
+async def _rechunk(pieces: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for piece in pieces:
+        buffer += piece
+        while len(buffer) >= UPLOAD_CHUNK_SIZE:
+            yield bytes(buffer[:UPLOAD_CHUNK_SIZE])
+            del buffer[:UPLOAD_CHUNK_SIZE]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _upload_chunks(
+    upload_url: str, chunks: AsyncIterator[bytes], file_size: int
+) -> DriveItem:
+    """
+    Send the fragments of an upload session. Graph only accepts fragments in order,
+    so the next fragment is read from the source while the current one is uploaded.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def read_ahead():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    reader = asyncio.create_task(read_ahead())
+    offset = 0
+    response = None
+    try:
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            response = await _upload_chunk(upload_url, chunk, offset, file_size)
+            offset += len(chunk)
+    finally:
+        reader.cancel()
+
+    if offset != file_size:
+        raise ValueError(f"Expected {file_size} bytes but read {offset} bytes")
+    if response is None:
+        raise ValueError("Upload session did not return the uploaded file")
+    return (
+        JsonParseNodeFactory()
+        .get_root_parse_node("application/json", response.content)
+        .get_object_value(DriveItem)
+    )
+
+
+async def _upload_chunk(
+    upload_url: str, chunk: bytes, offset: int, file_size: int
+) -> Optional[httpx.Response]:
+    """
+    Upload one fragment, resuming it after a failure from the first byte the session
+    is missing. Returns the final response once the last fragment completes the file.
+    """
+    client = _get_http_client()
+    end = offset + len(chunk)
+    start = offset
+    for attempt in range(MAX_CHUNK_RETRIES + 1):
+        delay = RETRY_BACKOFF_BASE * 2**attempt
+        try:
+            response = await client.put(
+                upload_url,
+                content=chunk[start - offset :],
+                headers={"Content-Range": f"bytes {start}-{end - 1}/{file_size}"},
+            )
+            if response.status_code in (200, 201):
+                return response
+            if response.status_code == 202:
+                return None
+            if response.status_code not in RESUMABLE_STATUS_CODES:
+                response.raise_for_status()
+            if response.headers.get("Retry-After", "").isdigit():
+                delay = int(response.headers["Retry-After"])
+        except httpx.TransportError:
+            if attempt == MAX_CHUNK_RETRIES:
+                raise
+        if attempt == MAX_CHUNK_RETRIES:
+            response.raise_for_status()
+        await asyncio.sleep(delay)
+
+        start = await _next_expected_offset(upload_url, start)
+        if start >= end:
+            return None
+        start = max(start, offset)
+    return None
+
+
+async def _next_expected_offset(upload_url: str, default: int) -> int:
+    try:
+        response = await _get_http_client().get(upload_url)
+        response.raise_for_status()
+        ranges = response.json().get("nextExpectedRanges") or []
+    except (httpx.HTTPError, ValueError):
+        return default
+    if not ranges:
+        return default
+    return int(ranges[0].split("-")[0])
@@ -1,13 +1,76 @@
 import json
+import threading
 import time
 import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Any, Generator
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Any, Generator, Optional
 from pydantic import BaseModel, Field
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin import Tool
 
+# parsed articles are kept for a day, PubMed records rarely change
+ARTICLE_CACHE_TTL = 24 * 60 * 60
+ARTICLE_CACHE_MAX_SIZE = 2048
+
+
+class RateLimiter:
+    """
+    Spaces out requests shared by all threads of the process, NCBI allows 3 requests
+    per second without an API key and 10 with one.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+rate_limiters = {False: RateLimiter(3), True: RateLimiter(10)}
+
+
+class ArticleCache:
+    """
+    Parsed articles keyed by PMID, expiring after `ttl` seconds
+    """
+
+    def __init__(self, ttl: float = ARTICLE_CACHE_TTL, max_size: int = ARTICLE_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._articles: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+
+    def get(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._articles.get(uid)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._articles[uid]
+                return None
+            self._articles.move_to_end(uid)
+            return entry[0]
+
+    def set(self, uid: str, article: dict):
+        with self._lock:
+            self._articles[uid] = (article, time.monotonic() + self.ttl)
+            self._articles.move_to_end(uid)
+            while len(self._articles) > self.max_size:
+                self._articles.popitem(last=False)
+
+
+article_cache = ArticleCache()
+
 
 class PubMedAPIWrapper(BaseModel):
     """
@@ -36,6 +99,7 @@ class PubMedAPIWrapper(BaseModel):
     doc_content_chars_max: int = 2000
     load_all_available_meta: bool = False
     email: str = "your_email@example.com"
+    api_key: Optional[str] = None
 
     def run(self, query: str) -> str:
         """
@@ -56,56 +120,93 @@ class PubMedAPIWrapper(BaseModel):
         """
         Search PubMed for documents matching the query.
         Return a list of dictionaries containing the document metadata.
+
+        Articles that are not cached are fetched with a single efetch request.
         """
         url = (
                 self.base_url_esearch
                 + "db=pubmed&term="
                 + str({urllib.parse.quote(query)})
                 + f"&retmode=json&retmax={self.top_k_results}&usehistory=y"
+                + self._auth_params()
         )
-        result = urllib.request.urlopen(url)
-        text = result.read().decode("utf-8")
-        json_text = json.loads(text)
-        articles = []
+        with self._urlopen(url) as result:
+            json_text = json.load(result)
         webenv = json_text["esearchresult"]["webenv"]
-        for uid in json_text["esearchresult"]["idlist"]:
-            article = self.retrieve_article(uid, webenv)
-            articles.append(article)
-        return articles
+        uids = json_text["esearchresult"]["idlist"]
+
+        articles = {uid: article_cache.get(uid) for uid in uids}
+        missing = [uid for uid, article in articles.items() if article is None]
+        if missing:
+            articles.update(self.retrieve_articles(missing, webenv))
+        return [articles[uid] for uid in uids if articles.get(uid) is not None]
 
     def retrieve_article(self, uid: str, webenv: str) -> dict:
-        url = self.base_url_efetch + "db=pubmed&retmode=xml&id=" + uid + "&webenv=" + webenv
+        return self.retrieve_articles([uid], webenv).get(uid, {"uid": uid, "title": "", "summary": "", "pub_date": ""})
+
+    def retrieve_articles(self, uids: list[str], webenv: str) -> dict[str, dict]:
+        """
+        Fetch the articles of a list of PMIDs in one efetch request, parsing the XML
+        as it streams in
+        """
+        url = (
+            self.base_url_efetch
+            + "db=pubmed&retmode=xml&id="
+            + ",".join(uids)
+            + "&webenv="
+            + webenv
+            + self._auth_params()
+        )
+        articles = {}
+        with self._urlopen(url) as result:
+            for _, element in ET.iterparse(result, events=("end",)):
+                if element.tag != "PubmedArticle":
+                    continue
+                article = self._parse_article(element)
+                element.clear()
+                articles[article["uid"]] = article
+                article_cache.set(article["uid"], article)
+        return articles
+
+    @staticmethod
+    def _parse_article(element: ET.Element) -> dict:
+        def text(found: Optional[ET.Element]) -> str:
+            return "".join(found.itertext()).strip() if found is not None else ""
+
+        pub_date = element.find(".//PubDate")
+        return {
+            "uid": text(element.find("MedlineCitation/PMID")),
+            "title": text(element.find(".//ArticleTitle")),
+            # structured abstracts come in several labelled sections
+            "summary": "\n".join(text(part) for part in element.iterfind(".//Abstract/AbstractText")),
+            "pub_date": " ".join(text(part) for part in pub_date) if pub_date is not None else "",
+        }
+
+    def _auth_params(self) -> str:
+        return "&api_key=" + urllib.parse.quote(self.api_key) if self.api_key else ""
+
+    def _urlopen(self, url: str):
+        """
+        Open url within NCBI's rate limit, backing off on 429 with a delay that starts
+        from `sleep_time` again for every request
+        """
+        rate_limiter = rate_limiters[bool(self.api_key)]
+        sleep_time = self.sleep_time
         retry = 0
         while True:
+            rate_limiter.wait()
             try:
-                result = urllib.request.urlopen(url)
-                break
+                return urllib.request.urlopen(url)
             except urllib.error.HTTPError as e:
                 if e.code == 429 and retry < self.max_retry:
-                    print(f"Too Many Requests, waiting for {self.sleep_time:.2f} seconds...")
-                    time.sleep(self.sleep_time)
-                    self.sleep_time *= 2
+                    retry_after = e.headers.get("Retry-After") if e.headers else None
+                    wait_time = float(retry_after) if retry_after and retry_after.isdigit() else sleep_time
+                    print(f"Too Many Requests, waiting for {wait_time:.2f} seconds...")
+                    time.sleep(wait_time)
+                    sleep_time *= 2
                     retry += 1
                 else:
                     raise e
-        xml_text = result.read().decode("utf-8")
-        title = ""
-        if "<ArticleTitle>" in xml_text and "</ArticleTitle>" in xml_text:
-            start_tag = "<ArticleTitle>"
-            end_tag = "</ArticleTitle>"
-            title = xml_text[xml_text.index(start_tag) + len(start_tag): xml_text.index(end_tag)]
-        abstract = ""
-        if "<AbstractText>" in xml_text and "</AbstractText>" in xml_text:
-            start_tag = "<AbstractText>"
-            end_tag = "</AbstractText>"
-            abstract = xml_text[xml_text.index(start_tag) + len(start_tag): xml_text.index(end_tag)]
-        pub_date = ""
-        if "<PubDate>" in xml_text and "</PubDate>" in xml_text:
-            start_tag = "<PubDate>"
-            end_tag = "</PubDate>"
-            pub_date = xml_text[xml_text.index(start_tag) + len(start_tag): xml_text.index(end_tag)]
-        article = {"uid": uid, "title": title, "summary": abstract, "pub_date": pub_date}
-        return article
 
 
 class PubmedQueryRun(BaseModel):
@@ -142,6 +243,8 @@ class PubMedSearchTool(Tool):
         query = tool_parameters.get("query", "")
         if not query:
             yield self.create_text_message("Please input query")
-        tool = PubmedQueryRun(args_schema=PubMedInput)
+        # with an NCBI API key the higher rate limit applies
+        api_key = self.runtime.credentials.get("ncbi_api_key") if self.runtime and self.runtime.credentials else None
+        tool = PubmedQueryRun(args_schema=PubMedInput, api_wrapper=PubMedAPIWrapper(api_key=api_key or None))
         result = tool._run(query)
         yield self.create_text_message(self.session.model.summary.invoke(text=result, instruction=""))